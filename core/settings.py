@@ -135,3 +135,41 @@ CELERY_TASK_TRACK_STARTED = True
 ERP_DATA_PATH = BASE_DIR / 'erp_data.json'
 ESHOP_API_BASE_URL = os.environ.get('ESHOP_API_BASE_URL', 'https://api.fake-taxi-eshop.cz/v1')
 ESHOP_API_KEY = os.environ.get('ESHOP_API_KEY', 'symma-secret-token')
+ESHOP_RATE_LIMITER = os.environ.get('ESHOP_RATE_LIMITER', 'fixed')  # 'fixed', 'smooth', 'adaptive' (per process) or 'redis' (global)
+ESHOP_RATE_BURST = int(os.environ.get('ESHOP_RATE_BURST', 1))  # back-to-back requests allowed by 'smooth' / 'adaptive' / 'redis'
+ESHOP_RATE_FLOOR = float(os.environ.get('ESHOP_RATE_FLOOR', 1))  # req/s lower bound for 'adaptive'
+ESHOP_RATE_CEILING = float(os.environ.get('ESHOP_RATE_CEILING', 10))  # req/s upper bound for 'adaptive'
+ESHOP_RATE_LIMIT_REDIS_URL = os.environ.get('ESHOP_RATE_LIMIT_REDIS_URL', CELERY_BROKER_URL)
+ESHOP_BATCH_SIZE = int(os.environ.get('ESHOP_BATCH_SIZE', 1))  # products per bulk request; 1 = one request per product
+ESHOP_CONNECT_TIMEOUT = float(os.environ.get('ESHOP_CONNECT_TIMEOUT', 5))  # seconds
+ESHOP_READ_TIMEOUT = float(os.environ.get('ESHOP_READ_TIMEOUT', 30))  # seconds
+ESHOP_RETRY_STATUSES = [int(code) for code in os.environ.get('ESHOP_RETRY_STATUSES', '502,503,504').split(',') if code]
+ESHOP_RETRY_BUDGET = float(os.environ.get('ESHOP_RETRY_BUDGET', 60))  # seconds from first attempt after which no retry starts
+ESHOP_CIRCUIT_FAILURES = int(os.environ.get('ESHOP_CIRCUIT_FAILURES', 5))  # consecutive failed attempts that open the circuit; 0 = off
+ESHOP_CIRCUIT_RESET = float(os.environ.get('ESHOP_CIRCUIT_RESET', 30))  # seconds before a probe request is let through
+
+# Sync tuning
+SYNC_CHUNK_SIZE = int(os.environ.get('SYNC_CHUNK_SIZE', 2000))  # SKUs per prefetch query and per DB flush
+SYNC_WORKERS = int(os.environ.get('SYNC_WORKERS', 1))  # concurrent eshop API requests in flight
+SYNC_ENGINE = os.environ.get('SYNC_ENGINE', 'threads')  # 'threads' (requests) or 'asyncio' (httpx)
+SYNC_SHARDS = int(os.environ.get('SYNC_SHARDS', 4))  # subtasks dispatched by sync_products_fanout_task
+SYNC_SKIP_UNCHANGED_EXPORT = os.environ.get('SYNC_SKIP_UNCHANGED_EXPORT', 'true').lower() == 'true'
+SYNC_TRANSFORM_WORKERS = int(os.environ.get('SYNC_TRANSFORM_WORKERS', 1))  # processes for the transform/hash stage
+SYNC_HASH_ALGORITHM = os.environ.get('SYNC_HASH_ALGORITHM', 'blake2b')  # see integrator.hashing.HASH_ALGORITHMS
+SYNC_RETRY_BASE_DELAY = float(os.environ.get('SYNC_RETRY_BASE_DELAY', 15))  # seconds before the first re-send of a failed SKU
+SYNC_RETRY_MAX_DELAY = float(os.environ.get('SYNC_RETRY_MAX_DELAY', 3600))  # cap of the doubling re-send delay
+SYNC_RETRY_MAX_ATTEMPTS = int(os.environ.get('SYNC_RETRY_MAX_ATTEMPTS', 8))  # failed sends before the SKU waits for a full run
+SYNC_RETRY_BATCH_SIZE = int(os.environ.get('SYNC_RETRY_BATCH_SIZE', 1000))  # failed SKUs re-sent per retry task run
+SYNC_RETRY_INTERVAL = float(os.environ.get('SYNC_RETRY_INTERVAL', 30))  # seconds between scheduled retry task runs
+SYNC_DELETE_MISSING = os.environ.get('SYNC_DELETE_MISSING', 'true').lower() == 'true'  # delete SKUs that left the export
+SYNC_DELETE_MAX_RATIO = float(os.environ.get('SYNC_DELETE_MAX_RATIO', 0.05))  # max share of tracked SKUs one run may delete
+SYNC_LOCK_ENABLED = os.environ.get('SYNC_LOCK_ENABLED', 'true').lower() == 'true'  # single-flight lock around sync runs
+SYNC_LOCK_TTL = float(os.environ.get('SYNC_LOCK_TTL', 60))  # seconds a lock outlives a crashed worker; renewed every TTL/3
+SYNC_LOCK_REDIS_URL = os.environ.get('SYNC_LOCK_REDIS_URL', CELERY_BROKER_URL)
+
+CELERY_BEAT_SCHEDULE = {
+    'retry-failed-syncs': {
+        'task': 'integrator.retry_failed_syncs',
+        'schedule': SYNC_RETRY_INTERVAL,
+    },
+}
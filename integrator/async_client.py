@@ -0,0 +1,148 @@
+import asyncio
+import logging
+
+import httpx
+from django.conf import settings
+
+from .circuit_breaker import CircuitBreaker
+from .eshop_client import (
+    BaseEshopClient,
+    RequestAttempts,
+    RetryPolicy,
+    as_updates,
+    batch_request_body,
+    merge_updates,
+)
+from .rate_limit import AsyncRateLimiter, build_rate_limiter
+from .timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 100  # pooled keep-alive connections per client
+
+
+class AsyncEshopClient(BaseEshopClient):
+    """
+    Native asyncio eshop client with the same POST/PATCH, retry, timeout and
+    429 semantics as EshopClient, backed by a pooled httpx.AsyncClient.
+
+    Use as an async context manager (or call aclose()) so pooled connections
+    are released.
+    """
+
+    # httpx.TransportError covers connect/read timeouts and network errors.
+    RETRY_EXCEPTIONS = (httpx.TransportError,)
+    # Sent but unanswered; a POST is not repeated after these (see RequestAttempts).
+    AMBIGUOUS_EXCEPTIONS = (httpx.ReadTimeout,)
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        rate_limiter: AsyncRateLimiter = None,
+        transport=None,
+        retry_policy: RetryPolicy = None,
+        retry_exceptions: tuple = None,
+        circuit_breaker: CircuitBreaker = None,
+        base_url: str = None,
+        timer: StageTimer = None,
+    ):
+        super().__init__(
+            rate_limiter or build_rate_limiter(asynchronous=True),
+            retry_policy, retry_exceptions, circuit_breaker, base_url, timer,
+        )
+        self._client = httpx.AsyncClient(
+            headers={'X-Api-Key': settings.ESHOP_API_KEY},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(settings.ESHOP_READ_TIMEOUT, connect=settings.ESHOP_CONNECT_TIMEOUT),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def send_product(self, product: dict, is_new: bool, fields=None) -> httpx.Response:
+        """Send a product to the eshop API (see EshopClient.send_product)."""
+        method, url, body = self._upsert_request(product, is_new, fields)
+        try:
+            return await self._request_with_retry(method, url, json=body)
+        except httpx.HTTPStatusError as exc:
+            if not self._is_conflicting_create(product, is_new, exc):
+                raise
+        return await self.send_product(product, is_new=False)
+
+    async def send_products(self, batch: list) -> list:
+        """Upsert many products with one bulk request (see EshopClient.send_products)."""
+        response = await self._request_with_retry('POST', self._batch_url(), json=batch_request_body(batch))
+        outcomes, conflicts = self._read_batch(batch, response)
+        if not conflicts:
+            return outcomes
+        return merge_updates(outcomes, conflicts, await self.send_products(as_updates(batch, conflicts)))
+
+    async def _request_with_retry(self, method: str, url: str, **kwargs) -> httpx.Response:
+        attempts = RequestAttempts(self, method, url)
+        while True:
+            attempts.start()
+            try:
+                with attempts.rate_limit_wait():
+                    await self._rate_limiter.acquire()
+                with attempts.round_trip():
+                    response = await self._client.request(method, url, **kwargs)
+            except self._retry_exceptions as exc:
+                wait = attempts.failed(exc)
+                if wait is None:
+                    raise
+            except BaseException:
+                attempts.aborted()
+                raise
+            else:
+                wait = attempts.answered(response)
+                if wait is None:
+                    return response
+            await asyncio.sleep(wait)
+
+
+async def send_all_async(client: AsyncEshopClient, jobs: list, max_in_flight: int, batch_size: int = 1) -> list:
+    """
+    Async driver for the sync loop: send (product, hash, is_new, fields) jobs
+    concurrently and return [(job, exception_or_None), ...] in completion order.
+
+    At most `max_in_flight` requests are awaited at a time; the client's
+    AsyncRateLimiter keeps the global req/s budget. With batch_size > 1 the
+    jobs go out in bulk requests of up to that many products.
+    """
+    semaphore = asyncio.Semaphore(max_in_flight)
+    outcomes = []
+
+    async def send(job):
+        product, _, is_new, fields = job
+        async with semaphore:
+            try:
+                await client.send_product(product, is_new=is_new, fields=fields)
+            except Exception as exc:
+                outcomes.append((job, exc))
+            else:
+                outcomes.append((job, None))
+
+    async def send_batch(batch):
+        async with semaphore:
+            try:
+                results = await client.send_products([(p, is_new, fields) for p, _, is_new, fields in batch])
+            except Exception as exc:
+                results = [exc] * len(batch)
+        outcomes.extend(zip(batch, results))
+
+    if batch_size > 1:
+        batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+        await asyncio.gather(*(send_batch(batch) for batch in batches))
+    else:
+        await asyncio.gather(*(send(job) for job in jobs))
+    return outcomes
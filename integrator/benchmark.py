@@ -0,0 +1,238 @@
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from itertools import islice
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.test.utils import override_settings
+
+from .hashing import field_digests, get_hasher
+from .mock_eshop import MockEshopConfig, MockEshopServer
+from .models import ProductSyncState
+from .rate_limit import BaseRateLimiter, build_rate_limiter
+from .synthetic import ExportSpec, write_export
+from .tasks import _sync_products
+from .timing import STAGES, StageTimer
+from .transformer import load_and_transform, transform_and_hash
+
+BENCHMARK_SIZES = (10_000, 100_000, 1_000_000)
+SEED_BATCH_SIZE = 5000  # ProductSyncState rows per bulk_create while preparing the sync run
+CHANGED_RATE = 0.1  # share of products missing from the seeded sync state, i.e. sent by the run
+CLIENT_LIMIT = 10_000  # at most this many products are sent per run; per-request cost does not depend on the size
+
+
+@dataclass(frozen=True)
+class StageResult:
+    size: int
+    stage: str
+    items: int
+    seconds: float
+    peak_memory: Optional[int]  # peak bytes allocated by Python (tracemalloc); None if not measured
+    errors: int = 0  # items that failed (only the sync run against a faulty server fails)
+    timings: Optional[dict] = None  # per-stage seconds of the sync run (see integrator.timing)
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds else float('inf')
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), 'throughput': round(self.throughput, 1)}
+
+
+class _Stopwatch:
+    """Accumulates the time spent inside `with stopwatch:` blocks."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.perf_counter() - self._start
+
+
+class _Unlimited(BaseRateLimiter):
+    def acquire(self):
+        pass
+
+
+class _AsyncUnlimited(BaseRateLimiter):
+    async def acquire(self):
+        pass
+
+
+def _load_and_transform_stage(path):
+    watch = _Stopwatch()
+    with watch:
+        items = sum(1 for _ in load_and_transform(path))
+    return items, watch.seconds
+
+
+def _hash_stage(path, algorithm: str):
+    """Content hash and per-field digests, as computed for every product of a run."""
+    hasher = get_hasher(algorithm)
+    watch = _Stopwatch()
+    items = 0
+    for product in load_and_transform(path):
+        with watch:
+            hasher(product)
+            field_digests(product)
+        items += 1
+    return items, watch.seconds
+
+
+def _sync_stage(path, algorithm: str, eshop_url: str = None):
+    """
+    One run of the real sync pipeline (tasks._sync_products) over the export.
+
+    Everything a run does is included – transform and hash, the delta check,
+    the eshop requests and the sync state writes – and timed by the run's
+    own StageTimer. Without `eshop_url` the requests go to an in-process
+    MockEshopServer (a fresh catalogue per call) and nothing limits the
+    rate; with it they go to that server through the configured rate
+    limiter, as in a real run. The run's changes are rolled back.
+    """
+    asynchronous = settings.SYNC_ENGINE == 'asyncio'
+    if eshop_url is None:
+        with MockEshopServer(MockEshopConfig(api_key=settings.ESHOP_API_KEY, rate_limit=0)) as server:
+            return _sync_stage_run(path, algorithm, server.url, _AsyncUnlimited() if asynchronous else _Unlimited())
+    return _sync_stage_run(path, algorithm, eshop_url, build_rate_limiter(asynchronous=asynchronous))
+
+
+def _sync_stage_run(path, algorithm: str, eshop_url: str, rate_limiter):
+    timer = StageTimer()
+    with override_settings(ESHOP_API_BASE_URL=eshop_url, SYNC_HASH_ALGORITHM=algorithm), transaction.atomic():
+        result = _sync_products(
+            transform_and_hash(path, workers=settings.SYNC_TRANSFORM_WORKERS, algorithm=algorithm, timer=timer),
+            timer=timer,
+            rate_limiter=rate_limiter,
+        )
+        transaction.set_rollback(True)
+    timings = timer.as_dict()
+    items = result['sent'] + result['skipped'] + result['errors']
+    return items, timings.pop('total'), result['errors'], timings
+
+
+def _seed_sync_states(path, algorithm: str, seed: int, limit: int):
+    """
+    Store an up-to-date sync state for every valid product except CHANGED_RATE
+    of them (at most `limit`), which the run then sends as new.
+    """
+    hasher = get_hasher(algorithm)
+    rng = random.Random(seed)
+    missing = 0
+    for chunk in _batches(load_and_transform(path), SEED_BATCH_SIZE):
+        states = []
+        for product in chunk:
+            if missing < limit and rng.random() < CHANGED_RATE:
+                missing += 1
+                continue
+            states.append(ProductSyncState(
+                sku=product['sku'],
+                content_hash=hasher(product),
+                hash_algorithm=algorithm,
+                field_hashes=field_digests(product),
+                synced_as_new=False,
+            ))
+        ProductSyncState.objects.bulk_create(states, ignore_conflicts=True)
+
+
+def _batches(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def _quiet_logs():
+    """Silence per-product warnings; otherwise the benchmark measures the log handler."""
+    integrator_logger = logging.getLogger('integrator')
+    previous_level = integrator_logger.level
+    integrator_logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        integrator_logger.setLevel(previous_level)
+
+
+def _measure(size: int, stage: str, run, memory: bool) -> StageResult:
+    """Time `run` (returning (items, seconds[, errors, timings])); with `memory` repeat it under tracemalloc."""
+    items, seconds, *details = run()
+    peak = None
+    if memory:
+        # A separate pass, so tracing overhead does not distort the timing.
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return StageResult(size, stage, items, seconds, peak, *details)
+
+
+def run_benchmark(
+    sizes=BENCHMARK_SIZES,
+    spec: ExportSpec = ExportSpec(),
+    algorithm: str = 'blake2b',
+    memory: bool = True,
+    client_limit: int = CLIENT_LIMIT,
+    on_result=None,
+    eshop_url: str = None,
+) -> list[StageResult]:
+    """
+    Benchmark the sync on synthetic exports of the given sizes.
+
+    For each size an export is generated from `spec` into a temporary
+    directory and measured: load_and_transform, hashing (content hash with
+    `algorithm` and field digests) and a whole sync run (see _sync_stage)
+    whose result carries the run's per-stage timings. For the run the sync
+    state is seeded so that CHANGED_RATE of the products, at most
+    `client_limit`, are new and sent to the eshop – an in-process
+    MockEshopServer or, with `eshop_url`, that server – while the rest are
+    unchanged; the seed is rolled back afterwards. `on_result` is called
+    with every StageResult as soon as it is known.
+    """
+    results = []
+
+    def record(result: StageResult):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    with _quiet_logs():
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / f'erp_{size}.json'
+                write_export(path, replace(spec, products=size))
+
+                record(_measure(size, 'load_and_transform', lambda: _load_and_transform_stage(path), memory))
+                record(_measure(size, f'hash ({algorithm})', lambda: _hash_stage(path, algorithm), memory))
+                with transaction.atomic():
+                    _seed_sync_states(path, algorithm, spec.seed, client_limit)
+                    record(_measure(size, 'sync run', lambda: _sync_stage(path, algorithm, eshop_url), memory))
+                    transaction.set_rollback(True)
+    return results
+
+
+def format_result(result: StageResult) -> str:
+    peak = '-' if result.peak_memory is None else f'{result.peak_memory / 2 ** 20:.1f} MiB'
+    line = (
+        f'{result.size:>10,} {result.stage:<20} {result.items:>10,} '
+        f'{result.seconds:>9.2f}s {result.throughput:>12,.0f}/s {peak:>12}'
+    )
+    if result.errors:
+        line = f'{line}  ({result.errors:,} failed)'
+    if result.timings:
+        line += '\n' + ' ' * 11 + ', '.join(
+            f'{stage} {result.timings[stage]:.3f}s' for stage in STAGES if result.timings.get(stage)
+        )
+    return line
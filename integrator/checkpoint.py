@@ -0,0 +1,46 @@
+import logging
+import os
+
+from django.utils import timezone
+
+from .models import SyncRun
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE_STATUSES = ('running', 'aborted: circuit open')
+
+
+def start_run(path, scope: str) -> SyncRun:
+    """
+    Return the SyncRun to continue for `scope`, creating one if needed.
+
+    The latest unfinished run of the scope is resumed when it was reading the
+    same export (path, size and mtime all match). Otherwise it is marked
+    'superseded' – its checkpoint refers to a different file – and a new run
+    starts from the beginning.
+    """
+    stat = os.stat(path)
+    unfinished = SyncRun.objects.filter(scope=scope, status__in=RESUMABLE_STATUSES)
+    last = unfinished.order_by('-started_at', '-pk').first()
+
+    if last is not None and (last.path, last.size, last.mtime_ns) == (str(path), stat.st_size, stat.st_mtime_ns):
+        logger.info("Resuming %s sync run #%d after %d products.", scope, last.pk, last.position)
+        return last
+
+    if last is not None:
+        unfinished.update(status='superseded', finished_at=timezone.now())
+    return SyncRun.objects.create(scope=scope, path=str(path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+def save_checkpoint(run: SyncRun, position: int, sent: int, skipped: int, errors: int):
+    """Record that the first `position` products of the run are fully processed."""
+    run.position, run.sent, run.skipped, run.errors = position, sent, skipped, errors
+    run.save(update_fields=['position', 'sent', 'skipped', 'errors', 'updated_at'])
+
+
+def finish_run(run: SyncRun, status: str):
+    """Close the run; 'aborted: circuit open' runs stay resumable."""
+    run.status = status
+    if status not in RESUMABLE_STATUSES:
+        run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at', 'updated_at'])
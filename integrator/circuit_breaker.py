@@ -0,0 +1,79 @@
+import logging
+import time
+from threading import Lock
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(RuntimeError):
+    """The eshop API is considered down; the request was not sent."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker (thread-safe, also usable from asyncio).
+
+    While closed, every request goes through; `failure_threshold` failed
+    attempts in a row open the circuit. While open, before_request() raises
+    CircuitOpenError immediately. Once `reset_timeout` seconds have passed,
+    exactly one probe request is let through (half-open): its success closes
+    the circuit, its failure opens it for another `reset_timeout`.
+    A failure_threshold of 0 disables the breaker.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self._threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = None
+        self._lock = Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self._state == OPEN
+
+    def before_request(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                self._state = HALF_OPEN
+                logger.info("Eshop circuit half-open – sending a probe request.")
+                return
+            raise CircuitOpenError("Eshop API circuit is open – request not sent.")
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("Eshop circuit closed – API is responding again.")
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if not self._threshold:
+                return
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self._threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                logger.error(
+                    "Eshop circuit opened after %d consecutive failures; failing fast for %.0fs.",
+                    self._failures, self._reset_timeout,
+                )
+
+
+def build_circuit_breaker() -> CircuitBreaker:
+    """CircuitBreaker configured by ESHOP_CIRCUIT_FAILURES and ESHOP_CIRCUIT_RESET."""
+    return CircuitBreaker(settings.ESHOP_CIRCUIT_FAILURES, settings.ESHOP_CIRCUIT_RESET)
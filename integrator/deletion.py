@@ -0,0 +1,134 @@
+import logging
+from typing import Optional
+
+from django.conf import settings
+
+from .circuit_breaker import CircuitOpenError
+from .eshop_client import EshopClient
+from .models import FailedSync, ProductSyncState
+from .rate_limit import BaseRateLimiter
+from .timing import DB_LOOKUP, DB_WRITE, StageTimer
+
+logger = logging.getLogger(__name__)
+
+SCAN_CHUNK_SIZE = 10000  # tracked SKUs fetched per database round trip
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def find_missing_skus(model, export_skus: set):
+    """
+    Return (SKUs of `model` absent from the export, number of SKUs of `model`).
+
+    The model's SKUs are streamed from the database and probed against the
+    in-memory export set (a hash anti-join), so neither side is ever sent to
+    the database as a huge IN list.
+    """
+    missing = []
+    tracked = 0
+    for sku in model.objects.values_list('sku', flat=True).iterator(chunk_size=SCAN_CHUNK_SIZE):
+        tracked += 1
+        if sku not in export_skus:
+            missing.append(sku)
+    return missing, tracked
+
+
+def _remove(client: EshopClient, skus: list, batch_size: int) -> tuple[list, int, bool]:
+    """
+    Delete `skus` from the eshop.
+
+    Returns (removed SKUs, number of failures, circuit_open); the SKUs after
+    the circuit opened are neither removed nor counted as failures.
+    """
+    removed = []
+    errors = 0
+    try:
+        if batch_size > 1:
+            for batch in _chunks(skus, batch_size):
+                try:
+                    outcomes = client.remove_products(batch)
+                except CircuitOpenError:
+                    raise
+                except Exception as exc:
+                    outcomes = [exc] * len(batch)
+                for sku, error in zip(batch, outcomes):
+                    if error is None:
+                        removed.append(sku)
+                    else:
+                        errors += 1
+                        logger.error("Failed to remove SKU %s from the eshop: %s", sku, error)
+        else:
+            for sku in skus:
+                try:
+                    client.remove_product(sku)
+                except CircuitOpenError:
+                    raise
+                except Exception as exc:
+                    errors += 1
+                    logger.error("Failed to remove SKU %s from the eshop: %s", sku, exc)
+                else:
+                    removed.append(sku)
+    except CircuitOpenError:
+        return removed, errors, True
+    return removed, errors, False
+
+
+def sync_deletions(
+    export_skus: set,
+    timer: Optional[StageTimer] = None,
+    rate_limiter: Optional[BaseRateLimiter] = None,
+) -> dict:
+    """
+    Remove products that are tracked in ProductSyncState but no longer exported.
+
+    `export_skus` must hold every SKU of the export (valid or not), so a
+    product with a temporarily invalid price is not deleted. If more than
+    SYNC_DELETE_MAX_RATIO of the tracked SKUs are missing, nothing is deleted
+    – a truncated or half-written export must not wipe the catalogue – and
+    {'deletion_blocked': <missing count>} is returned. Otherwise the missing
+    products are deleted from the eshop (in bulk requests of ESHOP_BATCH_SIZE
+    when above 1) paced by `rate_limiter` – pass the sync run's so the
+    deletions stay within its budget; by default the client builds one with
+    the full budget – their sync state is dropped, and {'deleted': n,
+    'errors': n} is returned; the key 'circuit_open' is added if the eshop
+    circuit opened meanwhile. FailedSync rows of SKUs that left the export
+    are dropped as well. The scan, the database writes and the eshop
+    requests are timed into `timer`.
+    """
+    timer = timer or StageTimer()
+    with timer.measure(DB_LOOKUP):
+        missing, tracked = find_missing_skus(ProductSyncState, export_skus)
+    if len(missing) > settings.SYNC_DELETE_MAX_RATIO * tracked:
+        logger.error(
+            "%d of %d tracked SKUs are missing from the ERP export – above the %.0f%% safety "
+            "threshold (SYNC_DELETE_MAX_RATIO), nothing deleted.",
+            len(missing), tracked, settings.SYNC_DELETE_MAX_RATIO * 100,
+        )
+        return {'deletion_blocked': len(missing)}
+
+    with timer.measure(DB_LOOKUP):
+        stale_failures, _ = find_missing_skus(FailedSync, export_skus)
+    with timer.measure(DB_WRITE):
+        for chunk in _chunks(stale_failures, settings.SYNC_CHUNK_SIZE):
+            FailedSync.objects.filter(sku__in=chunk).delete()
+
+    result = {'deleted': 0, 'errors': 0}
+    if not missing:
+        return result
+
+    logger.info("Removing %d SKUs that are no longer in the ERP export.", len(missing))
+    client = EshopClient(rate_limiter=rate_limiter, timer=timer)
+    for chunk in _chunks(missing, settings.SYNC_CHUNK_SIZE):
+        removed, errors, circuit_open = _remove(client, chunk, settings.ESHOP_BATCH_SIZE)
+        with timer.measure(DB_WRITE):
+            ProductSyncState.objects.filter(sku__in=removed).delete()
+        result['deleted'] += len(removed)
+        result['errors'] += errors
+        if circuit_open:
+            logger.error("Eshop API circuit open – stopping the removal of missing SKUs.")
+            result['circuit_open'] = True
+            break
+    return result
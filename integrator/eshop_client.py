@@ -1,104 +1,462 @@
 import logging
+import random
 import time
-from threading import Lock
+from contextlib import contextmanager
+from dataclasses import dataclass
 
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .circuit_breaker import CircuitBreaker, build_circuit_breaker
+from .metrics import observe_rate_limit_wait, observe_request
+from .rate_limit import RateLimiter, build_rate_limiter
+from .timing import HTTP, RATE_LIMIT_WAIT, RETRY_SLEEP, THROTTLE_SLEEP, StageTimer
 
 logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 3
-RATE_LIMIT = 5  # requests per second
+DEFAULT_POOL_SIZE = 10  # HTTP connections kept alive per client
+BATCH_PATH = '/products/batch/'
+CONFLICT = 409  # a create for a SKU the eshop already has
+
+BACKOFF_BASE = 1.0  # seconds; upper bound of the first jittered wait
+BACKOFF_CAP = 30.0  # seconds; upper bound of any jittered wait
 
 
-class RateLimiter:
+@dataclass(frozen=True)
+class RetryPolicy:
     """
-    Fixed-window rate limiter (thread-safe).
-
-    Allows up to `rate` requests per 1-second window.
-    The window starts on the first request. While tokens remain, requests
-    proceed immediately. When the bucket is empty, the limiter sleeps until
-    the current window expires, then opens a fresh window with a full bucket.
-    If no requests arrive before a window expires, the next request simply
-    starts a new window.
+    When and how long the eshop clients wait before repeating a request.
+
+    429 and the `statuses` (transient 5xx by default) are retried, as are the
+    client's transport errors (connection failures, timeouts). A Retry-After
+    header is honoured; otherwise the wait is full-jitter exponential backoff,
+    uniform in [0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1))], so
+    workers that failed together do not retry together. No retry is started
+    after `max_attempts` attempts or if it would begin more than `budget`
+    seconds after the first one.
     """
 
-    def __init__(self, rate: int):
-        self._rate = rate
-        self._tokens = rate
-        self._window_start = None   # window starts lazily on first request
-        self._lock = Lock()
+    max_attempts: int = MAX_RETRIES
+    statuses: frozenset = frozenset({502, 503, 504})
+    budget: float = 60.0
 
-    def acquire(self):
-        with self._lock:
-            now = time.monotonic()
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
 
-            # Start a new window if there is none yet, or the current one expired.
-            if self._window_start is None or (now - self._window_start) >= 1.0:
-                self._window_start = now
-                self._tokens = self._rate
+    def next_wait(self, attempt: int, deadline: float, retry_after: float = None):
+        """Seconds to wait before the next attempt, or None when retries are exhausted."""
+        if attempt >= self.max_attempts:
+            return None
+        wait = retry_after if retry_after is not None else self.backoff(attempt)
+        if time.monotonic() + wait > deadline:
+            return None
+        return wait
 
-            if self._tokens > 0:
-                self._tokens -= 1
-            else:
-                # Wait until the end of the current window, then open a new one.
-                wait = 1.0 - (now - self._window_start)
-                if wait > 0:
-                    time.sleep(wait)
-                self._window_start = time.monotonic()
-                self._tokens = self._rate - 1   # consume 1 token for this request
 
+def build_retry_policy() -> RetryPolicy:
+    """RetryPolicy configured by ESHOP_RETRY_STATUSES and ESHOP_RETRY_BUDGET."""
+    return RetryPolicy(
+        statuses=frozenset(settings.ESHOP_RETRY_STATUSES),
+        budget=settings.ESHOP_RETRY_BUDGET,
+    )
 
-class EshopClient:
-    def __init__(self):
-        self._base_url = settings.ESHOP_API_BASE_URL.rstrip('/')
-        self._session = requests.Session()
-        self._session.headers.update({'X-Api-Key': settings.ESHOP_API_KEY})
-        self._rate_limiter = RateLimiter(RATE_LIMIT)
-
-    def send_product(self, product: dict, is_new: bool) -> requests.Response:
-        """Send a product to the eshop API. POST for new, PATCH for existing."""
-        sku = product['sku']
-        if is_new:
-            url = f"{self._base_url}/products/"
-            method = 'POST'
+
+class RequestAttempts:
+    """
+    The attempts of one eshop request, shared by EshopClient and AsyncEshopClient.
+
+    The clients only wait for the rate limiter, send the request and sleep;
+    everything else happens here: the circuit breaker, metrics and timer are
+    updated, and failed() / answered() decide whether and how long to wait
+    before the next attempt (None: the request is over). A transport error
+    is not retried for a POST if the eshop may already have applied it (the
+    client's AMBIGUOUS_EXCEPTIONS): POST creates products, also inside bulk
+    requests, and is not idempotent. Such a product is updated on the next
+    send instead (see EshopClient.send_product).
+    """
+
+    def __init__(self, client, method: str, url: str):
+        self._client = client
+        self._policy = client.retry_policy
+        self._method = method
+        self._url = url
+        self._deadline = time.monotonic() + self._policy.budget
+        self._round_trip = None
+        self.attempt = 0
+
+    def start(self):
+        """Begin the next attempt; raises CircuitOpenError while the eshop is considered down."""
+        self.attempt += 1
+        self._client.circuit_breaker.before_request()
+
+    @contextmanager
+    def rate_limit_wait(self):
+        with self._client.timer.measure(RATE_LIMIT_WAIT) as waited:
+            yield
+        observe_rate_limit_wait(waited.seconds)
+
+    @contextmanager
+    def round_trip(self):
+        with self._client.timer.measure(HTTP) as self._round_trip:
+            yield
+
+    def failed(self, exc: Exception):
+        """Seconds to wait after a retryable transport error, or None to re-raise it."""
+        breaker = self._client.circuit_breaker
+        observe_request(self._method, 'error', self._round_trip.seconds)
+        breaker.record_failure()
+        if breaker.is_open or self._is_ambiguous(exc):
+            return None
+        wait = self._policy.next_wait(self.attempt, self._deadline)
+        if wait is not None:
+            logger.warning(
+                "%s %s failed: %r (attempt %d/%d). Waiting %.1fs before retry.",
+                self._method, self._url, exc, self.attempt, self._policy.max_attempts, wait,
+            )
+            self._client.timer.add(RETRY_SLEEP, wait)
+        return wait
+
+    def aborted(self):
+        """
+        The attempt ended with any other exception (a broken response body, a
+        cancelled task); it must still end a half-open probe, or the circuit
+        would never close again.
+        """
+        self._client.circuit_breaker.record_failure()
+
+    def answered(self, response):
+        """
+        Seconds to wait before repeating a request the eshop answered, or None
+        once `response` is final: an error status is then raised (as the
+        client's HTTP error), a success is reported to the rate limiter.
+        """
+        breaker = self._client.circuit_breaker
+        rate_limiter = self._client.rate_limiter
+        status = response.status_code
+        observe_request(self._method, status, self._round_trip.seconds)
+        if status >= 500:
+            breaker.record_failure()
         else:
-            url = f"{self._base_url}/products/{sku}/"
-            method = 'PATCH'
+            breaker.record_success()
 
-        return self._request_with_retry(method, url, json=product)
+        if status == 429:
+            retry_after = parse_retry_after(response.headers)
+            rate_limiter.on_throttle(retry_after)
+            wait = self._policy.next_wait(self.attempt, self._deadline, retry_after)
+            if wait is None:
+                raise RuntimeError(
+                    f"API request {self._method} {self._url} failed after {self.attempt} retries "
+                    f"due to rate limiting."
+                )
+            logger.warning(
+                "429 Too Many Requests (attempt %d/%d). Waiting %.1fs before retry.",
+                self.attempt, self._policy.max_attempts, wait,
+            )
+            self._client.timer.add(THROTTLE_SLEEP, wait)
+            return wait
 
-    def _request_with_retry(self, method: str, url: str, **kwargs) -> requests.Response:
-        backoff = 1.0
-        for attempt in range(1, MAX_RETRIES + 1):
-            self._rate_limiter.acquire()
-            response = self._session.request(method, url, **kwargs)
-
-            if response.status_code == 429:
-                retry_after = self._parse_retry_after(response)
-                wait = retry_after if retry_after is not None else backoff
+        if status in self._policy.statuses and not breaker.is_open:
+            wait = self._policy.next_wait(self.attempt, self._deadline, parse_retry_after(response.headers))
+            if wait is not None:
                 logger.warning(
-                    "429 Too Many Requests (attempt %d/%d). Waiting %.1fs before retry.",
-                    attempt, MAX_RETRIES, wait,
+                    "%d from %s %s (attempt %d/%d). Waiting %.1fs before retry.",
+                    status, self._method, self._url, self.attempt, self._policy.max_attempts, wait,
                 )
-                time.sleep(wait)
-                backoff *= 2
-                continue
+                self._client.timer.add(RETRY_SLEEP, wait)
+                return wait
 
-            response.raise_for_status()
-            return response
+        response.raise_for_status()
+        rate_limiter.on_success()
+        return None
+
+    def _is_ambiguous(self, exc: Exception) -> bool:
+        return self._method == 'POST' and isinstance(exc, self._client.AMBIGUOUS_EXCEPTIONS)
+
+
+def parse_retry_after(headers):
+    """Return float seconds from a Retry-After header, or None if absent/invalid."""
+    header = headers.get('Retry-After')
+    if header is None:
+        return None
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        return None
+
+
+class BatchItemError(RuntimeError):
+    """The eshop rejected one product of an otherwise successful bulk request."""
+
+    def __init__(self, sku: str, status: int, detail=None):
+        super().__init__(f"Eshop rejected SKU {sku} in batch (status {status}): {detail}")
+        self.sku = sku
+        self.status = status
+        self.detail = detail
+
+
+def build_operation(product: dict, is_new: bool, fields=None) -> tuple[str, str, dict]:
+    """
+    Return (method, path, body) upserting one product.
+
+    POST for new products, PATCH for existing ones. `fields` limits a PATCH
+    body to those keys of `product`; the whole product is sent when it is
+    None (and always for POST).
+    """
+    if is_new:
+        return 'POST', '/products/', product
+    body = product if fields is None else {field: product[field] for field in fields}
+    return 'PATCH', f"/products/{product['sku']}/", body
+
+
+def batch_request_body(batch: list) -> dict:
+    """Bulk request body for (product, is_new, fields) items."""
+    operations = []
+    for product, is_new, fields in batch:
+        method, path, body = build_operation(product, is_new, fields)
+        operations.append({'method': method, 'path': path, 'body': body})
+    return {'operations': operations}
+
+
+def build_removal(sku: str) -> tuple[str, str]:
+    """Return (method, path) deleting one product from the eshop."""
+    return 'DELETE', f"/products/{sku}/"
+
+
+def removal_request_body(skus: list) -> dict:
+    """Bulk request body deleting `skus`."""
+    operations = []
+    for sku in skus:
+        method, path = build_removal(sku)
+        operations.append({'method': method, 'path': path})
+    return {'operations': operations}
+
+
+def parse_batch_results(batch: list, payload) -> list:
+    """
+    Map a bulk response onto the (product, is_new, fields) items sent.
+
+    The eshop answers {"results": [{"status": 201}, {"status": 422,
+    "error": "..."}, ...]} in request order. Returns one entry per item:
+    None if it was accepted, otherwise a BatchItemError.
+    """
+    return _batch_outcomes([product['sku'] for product, _, _ in batch], payload)
 
-        raise RuntimeError(
-            f"API request {method} {url} failed after {MAX_RETRIES} retries due to rate limiting."
+
+def conflicting_creates(batch: list, outcomes: list) -> list:
+    """
+    Indexes of the creates in `batch` that the eshop rejected with 409.
+
+    The product already exists there – typically created by an earlier
+    attempt whose response was lost – so it is updated instead.
+    """
+    return [
+        i for i, ((_, is_new, _), outcome) in enumerate(zip(batch, outcomes))
+        if is_new and isinstance(outcome, BatchItemError) and outcome.status == CONFLICT
+    ]
+
+
+def _batch_outcomes(skus: list, payload, also_ok: frozenset = frozenset()) -> list:
+    """Per-SKU outcomes of a bulk response; 2xx and `also_ok` statuses count as accepted."""
+    results = payload.get('results') if isinstance(payload, dict) else None
+    if not isinstance(results, list) or len(results) != len(skus):
+        raise RuntimeError(f"Malformed batch response for {len(skus)} products: {payload!r:.200}")
+
+    outcomes = []
+    for sku, result in zip(skus, results):
+        status = result.get('status') if isinstance(result, dict) else None
+        if isinstance(status, int) and (200 <= status < 300 or status in also_ok):
+            outcomes.append(None)
+        else:
+            detail = result.get('error') if isinstance(result, dict) else result
+            outcomes.append(BatchItemError(sku, status, detail))
+    return outcomes
+
+
+class BaseEshopClient:
+    """
+    What EshopClient and AsyncEshopClient have in common: configuration,
+    request building and the reading of the eshop's answers. The subclasses
+    only send the requests and wait (see RequestAttempts).
+    """
+
+    # Transport errors worth retrying and those after which the eshop may
+    # already have applied the request (see RequestAttempts); set by subclasses.
+    RETRY_EXCEPTIONS = ()
+    AMBIGUOUS_EXCEPTIONS = ()
+
+    def __init__(
+        self,
+        rate_limiter,
+        retry_policy: RetryPolicy = None,
+        retry_exceptions: tuple = None,
+        circuit_breaker: CircuitBreaker = None,
+        base_url: str = None,
+        timer: StageTimer = None,
+    ):
+        self._base_url = (base_url or settings.ESHOP_API_BASE_URL).rstrip('/')
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy or build_retry_policy()
+        self._retry_exceptions = retry_exceptions or self.RETRY_EXCEPTIONS
+        self._circuit_breaker = circuit_breaker or build_circuit_breaker()
+        self._timer = timer or StageTimer()
+
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    @property
+    def retry_policy(self):
+        return self._retry_policy
+
+    @property
+    def circuit_breaker(self):
+        return self._circuit_breaker
+
+    @property
+    def timer(self):
+        return self._timer
+
+    def _upsert_request(self, product: dict, is_new: bool, fields=None) -> tuple[str, str, dict]:
+        """(method, url, body) of send_product (see build_operation)."""
+        method, path, body = build_operation(product, is_new, fields)
+        return method, f"{self._base_url}{path}", body
+
+    def _batch_url(self) -> str:
+        return f"{self._base_url}{BATCH_PATH}"
+
+    def _is_conflicting_create(self, product: dict, is_new: bool, exc: Exception) -> bool:
+        """Whether the failed send of `product` was a create rejected with 409, to be repeated as an update."""
+        response = getattr(exc, 'response', None)
+        if not is_new or response is None or response.status_code != CONFLICT:
+            return False
+        logger.info("SKU %s already exists in the eshop – updating it instead.", product['sku'])
+        return True
+
+    def _read_batch(self, batch: list, response) -> tuple[list, list]:
+        """
+        Return (outcomes, conflicts) of a bulk upsert: one outcome per item
+        (see parse_batch_results) and the indexes of the creates rejected with
+        409, which are sent again as updates (see merge_updates).
+        """
+        outcomes = parse_batch_results(batch, response.json())
+        conflicts = conflicting_creates(batch, outcomes)
+        if conflicts:
+            logger.info("%d SKUs already exist in the eshop – updating them instead.", len(conflicts))
+        return outcomes, conflicts
+
+
+def as_updates(batch: list, indexes: list) -> list:
+    """The items of `batch` at `indexes` as whole-product updates."""
+    return [(batch[i][0], False, None) for i in indexes]
+
+
+def merge_updates(outcomes: list, indexes: list, updates: list) -> list:
+    """Replace the outcomes at `indexes` by those of the repeated `updates`; returns `outcomes`."""
+    for i, outcome in zip(indexes, updates):
+        outcomes[i] = outcome
+    return outcomes
+
+
+class EshopClient(BaseEshopClient):
+    # Transport errors worth retrying: refused/reset connections and timeouts.
+    RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+    # Errors after which the eshop may already have applied the request (it was
+    # sent, only the answer is missing); a POST is not repeated after them.
+    AMBIGUOUS_EXCEPTIONS = (requests.ReadTimeout,)
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        rate_limiter: RateLimiter = None,
+        retry_policy: RetryPolicy = None,
+        retry_exceptions: tuple = None,
+        circuit_breaker: CircuitBreaker = None,
+        base_url: str = None,
+        timer: StageTimer = None,
+    ):
+        super().__init__(
+            rate_limiter or build_rate_limiter(), retry_policy, retry_exceptions, circuit_breaker, base_url, timer,
         )
+        self._session = requests.Session()
+        # One keep-alive connection per concurrent caller; the session is shared across threads.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers.update({'X-Api-Key': settings.ESHOP_API_KEY})
+        # Without a timeout a stalled connection would block the sync forever.
+        self._timeout = (settings.ESHOP_CONNECT_TIMEOUT, settings.ESHOP_READ_TIMEOUT)
 
-    @staticmethod
-    def _parse_retry_after(response: requests.Response):
-        """Return float seconds from Retry-After header, or None if absent/invalid."""
-        header = response.headers.get('Retry-After')
-        if header is None:
-            return None
+    def send_product(self, product: dict, is_new: bool, fields=None) -> requests.Response:
+        """
+        Send a product to the eshop API (see build_operation).
+
+        A create answered with 409 (the SKU already exists) is repeated as a
+        PATCH of the whole product.
+        """
+        method, url, body = self._upsert_request(product, is_new, fields)
         try:
-            return float(header)
-        except (TypeError, ValueError):
-            return None
+            return self._request_with_retry(method, url, json=body)
+        except requests.HTTPError as exc:
+            if not self._is_conflicting_create(product, is_new, exc):
+                raise
+        return self.send_product(product, is_new=False)
+
+    def send_products(self, batch: list) -> list:
+        """
+        Upsert many products with a single bulk request.
+
+        `batch` holds (product, is_new, fields) items. Rate limiting, 429
+        retries and errors apply to the request as a whole, exactly as in
+        send_product. Returns one entry per item, in order: None if the eshop
+        accepted it, otherwise a BatchItemError. Creates rejected with 409
+        are sent again as updates in one more bulk request.
+        """
+        response = self._request_with_retry('POST', self._batch_url(), json=batch_request_body(batch))
+        outcomes, conflicts = self._read_batch(batch, response)
+        if not conflicts:
+            return outcomes
+        return merge_updates(outcomes, conflicts, self.send_products(as_updates(batch, conflicts)))
+
+    def remove_product(self, sku: str):
+        """Delete a product from the eshop; one that is already gone (404) counts as removed."""
+        method, path = build_removal(sku)
+        try:
+            self._request_with_retry(method, f"{self._base_url}{path}")
+        except requests.HTTPError as exc:
+            if exc.response is None or exc.response.status_code != 404:
+                raise
+            logger.info("SKU %s was already gone from the eshop.", sku)
+
+    def remove_products(self, skus: list) -> list:
+        """
+        Delete many products with a single bulk request.
+
+        Returns one entry per SKU, in order: None if it was deleted (or was
+        already gone), otherwise a BatchItemError.
+        """
+        response = self._request_with_retry('POST', self._batch_url(), json=removal_request_body(skus))
+        return _batch_outcomes(skus, response.json(), also_ok=frozenset({404}))
+
+    def _request_with_retry(self, method: str, url: str, **kwargs) -> requests.Response:
+        attempts = RequestAttempts(self, method, url)
+        while True:
+            attempts.start()
+            try:
+                with attempts.rate_limit_wait():
+                    self._rate_limiter.acquire()
+                with attempts.round_trip():
+                    response = self._session.request(method, url, timeout=self._timeout, **kwargs)
+            except self._retry_exceptions as exc:
+                wait = attempts.failed(exc)
+                if wait is None:
+                    raise
+            except BaseException:
+                attempts.aborted()
+                raise
+            else:
+                wait = attempts.answered(response)
+                if wait is None:
+                    return response
+            time.sleep(wait)
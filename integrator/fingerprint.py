@@ -0,0 +1,71 @@
+import hashlib
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from .models import ErpExportFingerprint
+
+logger = logging.getLogger(__name__)
+
+DIGEST_BLOCK_SIZE = 1024 * 1024  # bytes read per digest update
+
+
+@dataclass(frozen=True)
+class ExportFingerprint:
+    path: str
+    size: int
+    mtime_ns: int
+    digest: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        """JSON-serialisable form, e.g. for passing through Celery."""
+        return asdict(self)
+
+
+def file_digest(path) -> str:
+    """BLAKE2b-128 digest of the file contents, read in 1 MiB blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while block := f.read(DIGEST_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_export(path) -> tuple[bool, ExportFingerprint]:
+    """
+    Compare the export at `path` with the last successfully synced one.
+
+    Returns (unchanged, fingerprint). Matching size and mtime are trusted
+    without reading the file. Otherwise the contents are hashed, so a file
+    that was only touched or rewritten with the same bytes still counts as
+    unchanged. The returned fingerprint is what record_export() should store
+    once the run succeeds.
+    """
+    stat = os.stat(path)
+    current = ExportFingerprint(path=str(path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    last = ErpExportFingerprint.objects.filter(path=current.path).first()
+
+    if last is not None and last.size == current.size and last.mtime_ns == current.mtime_ns:
+        return True, ExportFingerprint(current.path, current.size, current.mtime_ns, last.digest)
+
+    current = ExportFingerprint(current.path, current.size, current.mtime_ns, file_digest(path))
+    if last is not None and last.size == current.size and last.digest == current.digest:
+        # Same bytes, new mtime: remember the new mtime so the next check is stat-only.
+        record_export(current)
+        return True, current
+
+    return False, current
+
+
+def record_export(fingerprint: ExportFingerprint):
+    """Remember `fingerprint` as the last export that was fully synced."""
+    ErpExportFingerprint.objects.update_or_create(
+        path=fingerprint.path,
+        defaults={
+            'size': fingerprint.size,
+            'mtime_ns': fingerprint.mtime_ns,
+            'digest': fingerprint.digest,
+        },
+    )
+    logger.debug("Recorded ERP export fingerprint %s.", fingerprint)
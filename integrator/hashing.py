@@ -0,0 +1,86 @@
+import hashlib
+import json
+from typing import Callable
+
+LEGACY_ALGORITHM = 'sha256'  # algorithm of every content_hash stored before hash_algorithm existed
+
+# Fields of the transformed product that may change between syncs (the SKU
+# identifies the product and is never PATCHed), in the order their digests
+# are packed into ProductSyncState.field_hashes.
+DIFF_FIELDS = ('title', 'price', 'stock', 'color')
+FIELD_DIGEST_SIZE = 8  # bytes per field digest
+
+
+def canonical_bytes(product: dict) -> bytes:
+    """
+    Canonical encoding of the fixed five-field eshop payload.
+
+    Strings are length-prefixed and the numeric fields are separated by '|',
+    so the encoding is unambiguous without the cost of generic sorted JSON.
+    """
+    sku = str(product['sku'])
+    title = str(product['title'])
+    color = str(product['color'])
+    price = float(product['price'])
+    stock = product['stock']
+    return f"{len(sku)}:{sku}{len(title)}:{title}{price!r}|{stock}|{len(color)}:{color}".encode('utf-8')
+
+
+def sha256_json_hash(product: dict) -> bytes:
+    """Legacy hash: SHA-256 of sorted JSON (works for any dict), 32 raw bytes."""
+    serialized = json.dumps(product, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode('utf-8')).digest()
+
+
+def blake2b_hash(product: dict) -> bytes:
+    """BLAKE2b-128 of the canonical payload encoding, 16 raw bytes."""
+    return hashlib.blake2b(canonical_bytes(product), digest_size=16).digest()
+
+
+def field_digests(product: dict) -> bytes:
+    """Concatenated per-field BLAKE2b digests of DIFF_FIELDS, FIELD_DIGEST_SIZE bytes each."""
+    values = (
+        str(product['title']),
+        repr(float(product['price'])),
+        str(product['stock']),
+        str(product['color']),
+    )
+    return b''.join(
+        hashlib.blake2b(value.encode('utf-8'), digest_size=FIELD_DIGEST_SIZE).digest()
+        for value in values
+    )
+
+
+def changed_fields(old_digests: bytes, new_digests: bytes):
+    """
+    Return the DIFF_FIELDS whose digests differ, or None if that is unknown.
+
+    None (send the full payload) is returned when no usable digests were
+    stored, e.g. for rows synced before field digests existed, or when the
+    digests agree although the content hash changed.
+    """
+    if len(old_digests) != len(new_digests):
+        return None
+    changed = [
+        field
+        for i, field in enumerate(DIFF_FIELDS)
+        if old_digests[i * FIELD_DIGEST_SIZE:(i + 1) * FIELD_DIGEST_SIZE]
+        != new_digests[i * FIELD_DIGEST_SIZE:(i + 1) * FIELD_DIGEST_SIZE]
+    ]
+    return changed or None
+
+
+HASH_ALGORITHMS: dict[str, Callable[[dict], bytes]] = {
+    'sha256': sha256_json_hash,
+    'blake2b': blake2b_hash,
+}
+
+
+def get_hasher(algorithm: str) -> Callable[[dict], bytes]:
+    """Return the hash function registered under `algorithm`."""
+    try:
+        return HASH_ALGORITHMS[algorithm]
+    except KeyError:
+        raise ValueError(
+            f"Unknown hash algorithm {algorithm!r}; choose one of {', '.join(HASH_ALGORITHMS)}."
+        ) from None
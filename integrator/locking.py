@@ -0,0 +1,189 @@
+import logging
+import uuid
+from contextlib import contextmanager
+from threading import Event, Thread
+from typing import Optional
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = 'integrator:lock:'
+
+# The release and renew scripts act only if the key still holds our token,
+# so a lock that expired and was taken over by another run is never released
+# or extended. The join script also takes the lock if it has expired meanwhile.
+#   KEYS[1] – lock key
+#   ARGV[1] – owner token
+#   ARGV[2] – new TTL in ms (renew and join only)
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+JOIN_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+
+class RedisLock:
+    """
+    Non-blocking distributed mutex in Redis, kept alive by a heartbeat.
+
+    acquire() sets the key with a random owner token and a TTL of `ttl`
+    seconds, then a daemon thread extends the TTL every ttl/3 seconds until
+    release(). If the process dies, the heartbeat stops with it and the lock
+    expires after at most `ttl` seconds.
+
+    A lock held by a run that spans several tasks is shared through its
+    owner `token`: each task join()s it, which keeps it alive while that
+    task works, and detach()es without releasing it.
+
+    If Redis is unreachable the lock is treated as acquired (with a warning),
+    like the Redis rate limiter falls back to local pacing: a sync run is not
+    blocked by an outage of the lock store.
+    """
+
+    def __init__(self, client, name: str, ttl: float, token: str = None):
+        self._client = client
+        self._key = LOCK_PREFIX + name
+        self._token = token or uuid.uuid4().hex
+        self._ttl_ms = int(ttl * 1000)
+        self._interval = ttl / 3
+        self._stop = Event()
+        self._heartbeat = None
+        self._release = client.register_script(RELEASE_SCRIPT)
+        self._renew = client.register_script(RENEW_SCRIPT)
+        self._join = client.register_script(JOIN_SCRIPT)
+
+    @property
+    def key(self) -> str:
+        return self._key
+
+    @property
+    def token(self) -> str:
+        return self._token
+
+    def acquire(self) -> bool:
+        """Take the lock if it is free; return False if another owner holds it."""
+        try:
+            if not self._client.set(self._key, self._token, nx=True, px=self._ttl_ms):
+                return False
+        except redis.RedisError as exc:
+            logger.warning("Redis lock %s unavailable (%s) – running without it.", self._key, exc)
+            return True
+        self._start_heartbeat()
+        return True
+
+    def join(self) -> bool:
+        """Share the lock held under our token (taking it if it has expired); False if another owner holds it."""
+        try:
+            if not self._join(keys=[self._key], args=[self._token, self._ttl_ms]):
+                return False
+        except redis.RedisError as exc:
+            logger.warning("Redis lock %s unavailable (%s) – running without it.", self._key, exc)
+            return True
+        self._start_heartbeat()
+        return True
+
+    def detach(self):
+        """Stop keeping the lock alive but leave it held, for the next task of the run to join."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+
+    def release(self):
+        self.detach()
+        try:
+            self._release(keys=[self._key], args=[self._token])
+        except redis.RedisError as exc:
+            logger.warning("Could not release Redis lock %s (%s); it expires on its own.", self._key, exc)
+
+    def _start_heartbeat(self):
+        self._heartbeat = Thread(target=self._keep_alive, name=f'heartbeat {self._key}', daemon=True)
+        self._heartbeat.start()
+
+    def _keep_alive(self):
+        while not self._stop.wait(self._interval):
+            try:
+                renewed = self._renew(keys=[self._key], args=[self._token, self._ttl_ms])
+            except redis.RedisError as exc:
+                logger.warning("Could not renew Redis lock %s (%s).", self._key, exc)
+                continue
+            if not renewed:
+                logger.error("Redis lock %s was lost; another run may start concurrently.", self._key)
+                return
+
+
+def _sync_lock(name: str, token: str = None) -> RedisLock:
+    return RedisLock(redis.Redis.from_url(settings.SYNC_LOCK_REDIS_URL), name, settings.SYNC_LOCK_TTL, token)
+
+
+@contextmanager
+def single_flight(name: str, token: str = None):
+    """
+    Hold the `name` lock for the duration of the block.
+
+    Yields True when this caller got the lock and False when another run
+    already holds it; the caller should then return without doing any work.
+    With the `token` of acquire_run_lock() the caller joins that run's lock
+    instead: it is kept alive during the block and left held afterwards.
+    Controlled by SYNC_LOCK_ENABLED, SYNC_LOCK_TTL and SYNC_LOCK_REDIS_URL.
+    """
+    if not settings.SYNC_LOCK_ENABLED:
+        yield True
+        return
+
+    lock = _sync_lock(name, token)
+    if not (lock.join() if token else lock.acquire()):
+        logger.info("Another run holds %s – not starting.", lock.key)
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if token:
+            lock.detach()
+        else:
+            lock.release()
+
+
+def acquire_run_lock(name: str) -> Optional[str]:
+    """
+    Take the `name` lock for a run carried out by other tasks; return its token, or None if it is held.
+
+    Nothing keeps the lock alive from here: the tasks doing the work join it
+    with single_flight(name, token) and the last one calls release_run_lock().
+    If that never happens (a task of the run crashed), it expires after
+    SYNC_LOCK_TTL seconds.
+    """
+    if not settings.SYNC_LOCK_ENABLED:
+        return uuid.uuid4().hex
+    lock = _sync_lock(name)
+    if not lock.acquire():
+        logger.info("Another run holds %s – not starting.", lock.key)
+        return None
+    lock.detach()
+    return lock.token
+
+
+def release_run_lock(name: str, token: str):
+    """Release a lock taken by acquire_run_lock(), unless it has expired and been taken over."""
+    if settings.SYNC_LOCK_ENABLED:
+        _sync_lock(name, token).release()
@@ -0,0 +1,43 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from integrator.benchmark import BENCHMARK_SIZES, CLIENT_LIMIT, format_result, run_benchmark
+from integrator.synthetic import ExportSpec
+
+
+class Command(BaseCommand):
+    help = "Measure per-stage throughput and peak memory of the sync on synthetic exports."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(BENCHMARK_SIZES),
+                            help="Export sizes (distinct SKUs) to benchmark.")
+        parser.add_argument('--warehouses', type=int, default=ExportSpec.warehouses)
+        parser.add_argument('--seed', type=int, default=ExportSpec.seed)
+        parser.add_argument('--algorithm', default=settings.SYNC_HASH_ALGORITHM,
+                            help="Content hash algorithm (see integrator.hashing.HASH_ALGORITHMS).")
+        parser.add_argument('--client-limit', type=int, default=CLIENT_LIMIT,
+                            help="At most this many products are sent to the eshop in the sync run.")
+        parser.add_argument('--eshop-url',
+                            help="Sync to this API (e.g. run_mock_eshop) instead of an in-process mock eshop.")
+        parser.add_argument('--no-memory', action='store_true',
+                            help="Skip the tracemalloc pass (halves the run time).")
+        parser.add_argument('--json', dest='json_path', help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'products':>10} {'stage':<20} {'items':>10} {'time':>10} {'throughput':>14} {'peak memory':>12}"
+        )
+        results = run_benchmark(
+            sizes=options['sizes'],
+            spec=ExportSpec(warehouses=options['warehouses'], seed=options['seed']),
+            algorithm=options['algorithm'],
+            memory=not options['no_memory'],
+            client_limit=options['client_limit'],
+            on_result=lambda result: self.stdout.write(format_result(result)),
+            eshop_url=options['eshop_url'],
+        )
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump([result.as_dict() for result in results], f, indent=2)
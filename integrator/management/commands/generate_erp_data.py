@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from integrator.synthetic import ExportSpec, write_export
+
+
+class Command(BaseCommand):
+    help = "Write a seeded synthetic ERP export (same arguments, same file)."
+
+    def add_arguments(self, parser):
+        defaults = ExportSpec()
+        parser.add_argument('path', help="Output JSON file.")
+        parser.add_argument('--products', type=int, default=defaults.products, help="Distinct SKUs.")
+        parser.add_argument('--warehouses', type=int, default=defaults.warehouses,
+                            help="Maximum warehouses per SKU.")
+        parser.add_argument('--duplicate-rate', type=float, default=defaults.duplicate_rate,
+                            help="Extra rows repeating a recent SKU, as a share of the products.")
+        parser.add_argument('--invalid-price-rate', type=float, default=defaults.invalid_price_rate,
+                            help="Share of products with a null or negative price.")
+        parser.add_argument('--na-stock-rate', type=float, default=defaults.na_stock_rate,
+                            help='Share of stock values that are "N/A".')
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+
+    def handle(self, *args, **options):
+        spec = ExportSpec(
+            products=options['products'],
+            warehouses=options['warehouses'],
+            duplicate_rate=options['duplicate_rate'],
+            invalid_price_rate=options['invalid_price_rate'],
+            na_stock_rate=options['na_stock_rate'],
+            seed=options['seed'],
+        )
+        rows = write_export(options['path'], spec)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} rows ({spec.products} SKUs) to {options['path']}."))
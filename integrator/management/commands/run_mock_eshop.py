@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from integrator.mock_eshop import LATENCY_DISTRIBUTIONS, MockEshopConfig, MockEshopServer
+
+
+class Command(BaseCommand):
+    help = "Serve a local mock of the eshop API with configurable latency, rate limit and faults."
+
+    def add_arguments(self, parser):
+        defaults = MockEshopConfig()
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--api-key', default=defaults.api_key)
+        parser.add_argument('--latency', type=float, default=defaults.latency, help="Mean latency in seconds.")
+        parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS,
+                            default=defaults.latency_distribution)
+        parser.add_argument('--latency-sigma', type=float, default=defaults.latency_sigma,
+                            help="Shape of the lognormal distribution.")
+        parser.add_argument('--rate-limit', type=float, default=defaults.rate_limit,
+                            help="Requests per second before 429; 0 = unlimited.")
+        parser.add_argument('--no-retry-after', action='store_true', help="Send 429 without Retry-After.")
+        parser.add_argument('--error-rate', type=float, default=defaults.error_rate,
+                            help="Share of requests answered with a 5xx.")
+        parser.add_argument('--error-statuses', type=int, nargs='+', default=list(defaults.error_statuses))
+        parser.add_argument('--drop-rate', type=float, default=defaults.drop_rate,
+                            help="Share of connections closed without a response.")
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        config = MockEshopConfig(
+            api_key=options['api_key'],
+            latency=options['latency'],
+            latency_distribution=options['latency_distribution'],
+            latency_sigma=options['latency_sigma'],
+            rate_limit=options['rate_limit'],
+            retry_after=not options['no_retry_after'],
+            error_rate=options['error_rate'],
+            error_statuses=tuple(options['error_statuses']),
+            drop_rate=options['drop_rate'],
+            seed=options['seed'],
+        )
+        server = MockEshopServer(config, host=options['host'], port=options['port'])
+        self.stdout.write(f"Mock eshop API listening on {server.url} (Ctrl+C to stop).")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            for (method, status), count in sorted(server.eshop.stats.items(), key=str):
+                self.stdout.write(f"{method} {status}: {count}")
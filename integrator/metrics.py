@@ -0,0 +1,93 @@
+import os
+
+from django.dispatch import receiver
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from .signals import sync_finished
+from .timing import STAGES
+
+# With PROMETHEUS_MULTIPROC_DIR set (before prometheus_client is imported),
+# every process – each Celery worker child, the web server – writes its
+# samples to files in that directory and /metrics sums them up.
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+RUN_DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, float('inf'))
+
+PRODUCTS = Counter(
+    'integrator_products', 'Products processed by sync runs, by outcome (sent, skipped, failed, deleted).',
+    ['scope', 'outcome'],
+)
+SYNC_RUNS = Counter('integrator_sync_runs', 'Finished sync runs by final status.', ['scope', 'status'])
+RUN_DURATION = Histogram(
+    'integrator_sync_run_duration_seconds', 'Wall-clock duration of sync runs that did any work.',
+    ['scope'], buckets=RUN_DURATION_BUCKETS,
+)
+STAGE_SECONDS = Counter('integrator_stage_seconds', 'Time spent per sync stage (see integrator.timing).', ['stage'])
+LAST_SUCCESS = Gauge(
+    'integrator_last_successful_run_timestamp_seconds', 'Unix time of the last run that finished without errors.',
+    ['scope'], multiprocess_mode='max',
+)
+LEARNED_RATE = Gauge(
+    'integrator_eshop_learned_rate', 'Request rate (req/s) currently learned by the adaptive rate limiter.',
+    ['scope'], multiprocess_mode='mostrecent',
+)
+HTTP_DURATION = Histogram(
+    'integrator_eshop_request_duration_seconds', 'Eshop API round trips by method and status ("error": no response).',
+    ['method', 'status'],
+)
+THROTTLED = Counter('integrator_eshop_throttled_requests', 'Eshop API requests answered with 429.')
+RATE_LIMIT_WAIT = Histogram(
+    'integrator_rate_limit_wait_seconds', 'Time a request waited in the client-side rate limiter.',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, float('inf')),
+)
+
+SUCCESSFUL_STATUSES = ('completed', 'unchanged')
+
+
+def observe_request(method: str, status, seconds: float):
+    """Record one eshop round trip; `status` is the HTTP status or 'error' for a transport failure."""
+    HTTP_DURATION.labels(method, str(status)).observe(seconds)
+    if status == 429:
+        THROTTLED.inc()
+
+
+def observe_rate_limit_wait(seconds: float):
+    RATE_LIMIT_WAIT.observe(seconds)
+
+
+def observe_learned_rate(scope: str, rate: float):
+    """Record the rate an adaptive limiter has just moved to; see AdaptiveRateLimiter."""
+    LEARNED_RATE.labels(scope).set(rate)
+
+
+@receiver(sync_finished)
+def record_run(sender, scope: str, result: dict, **kwargs):
+    """Turn a finished sync run (see integrator.signals) into run, product, rate and stage metrics."""
+    SYNC_RUNS.labels(scope, result['status']).inc()
+    for outcome, key in (('sent', 'sent'), ('skipped', 'skipped'), ('failed', 'errors'), ('deleted', 'deleted')):
+        if result.get(key):
+            PRODUCTS.labels(scope, outcome).inc(result[key])
+
+    if 'rate_limit' in result:
+        # The final value; the limiter updates it during the run. For a sharded run it
+        # is the sum over the shards, which report under their own 'shard i/N' scope.
+        LEARNED_RATE.labels(scope).set(result['rate_limit'])
+
+    timings = result.get('timings')
+    if timings:
+        RUN_DURATION.labels(scope).observe(timings['total'])
+        for stage in STAGES:
+            if timings.get(stage):
+                STAGE_SECONDS.labels(stage).inc(timings[stage])
+
+    if result['status'] in SUCCESSFUL_STATUSES and not result.get('errors') and 'deletion_blocked' not in result:
+        LAST_SUCCESS.labels(scope).set_to_current_time()
+
+
+def exposition() -> bytes:
+    """Current metrics in the Prometheus text format, summed over all processes in multiprocess mode."""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
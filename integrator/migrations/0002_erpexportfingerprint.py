@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ErpExportFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('mtime_ns', models.BigIntegerField()),
+                ('digest', models.CharField(max_length=32)),
+                ('processed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrator', '0002_erpexportfingerprint'),
+    ]
+
+    operations = [
+        # Existing rows were all hashed with the legacy SHA-256-of-JSON algorithm.
+        migrations.AddField(
+            model_name='productsyncstate',
+            name='hash_algorithm',
+            field=models.CharField(default='sha256', max_length=16),
+        ),
+    ]
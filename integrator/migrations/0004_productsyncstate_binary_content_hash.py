@@ -0,0 +1,69 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def hex_to_bytes(apps, schema_editor):
+    ProductSyncState = apps.get_model('integrator', 'ProductSyncState')
+    batch = []
+    for state in ProductSyncState.objects.only('id', 'content_hash').iterator(chunk_size=BATCH_SIZE):
+        try:
+            state.content_digest = bytes.fromhex(state.content_hash)
+        except ValueError:
+            # Not a digest we produced; an empty value never matches, so the SKU is re-sent once.
+            state.content_digest = b''
+        batch.append(state)
+        if len(batch) >= BATCH_SIZE:
+            ProductSyncState.objects.bulk_update(batch, ['content_digest'])
+            batch.clear()
+    if batch:
+        ProductSyncState.objects.bulk_update(batch, ['content_digest'])
+
+
+def bytes_to_hex(apps, schema_editor):
+    ProductSyncState = apps.get_model('integrator', 'ProductSyncState')
+    batch = []
+    for state in ProductSyncState.objects.only('id', 'content_digest').iterator(chunk_size=BATCH_SIZE):
+        state.content_hash = bytes(state.content_digest).hex()
+        batch.append(state)
+        if len(batch) >= BATCH_SIZE:
+            ProductSyncState.objects.bulk_update(batch, ['content_hash'])
+            batch.clear()
+    if batch:
+        ProductSyncState.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrator', '0003_productsyncstate_hash_algorithm'),
+    ]
+
+    operations = [
+        # Hex text (64 chars) -> raw digest bytes, converted in place.
+        migrations.AddField(
+            model_name='productsyncstate',
+            name='content_digest',
+            field=models.BinaryField(default=b'', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='productsyncstate',
+            name='content_hash',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.RunPython(hex_to_bytes, bytes_to_hex),
+        migrations.RemoveField(
+            model_name='productsyncstate',
+            name='content_hash',
+        ),
+        migrations.RenameField(
+            model_name='productsyncstate',
+            old_name='content_digest',
+            new_name='content_hash',
+        ),
+        migrations.AlterField(
+            model_name='productsyncstate',
+            name='content_hash',
+            field=models.BinaryField(max_length=32),
+        ),
+    ]
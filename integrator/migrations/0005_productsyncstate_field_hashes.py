@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrator', '0004_productsyncstate_binary_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsyncstate',
+            name='field_hashes',
+            field=models.BinaryField(default=b'', max_length=32),
+        ),
+    ]
@@ -0,0 +1,250 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_PATH = re.compile(r'^/products/(?P<sku>[^/]+)/$')
+LATENCY_DISTRIBUTIONS = ('constant', 'uniform', 'exponential', 'lognormal')
+SHUTDOWN_POLL_INTERVAL = 0.05  # seconds; how quickly a background server notices shutdown()
+
+
+@dataclass(frozen=True)
+class MockEshopConfig:
+    """
+    Behaviour of the mock eshop API.
+
+    Latency: every request waits a delay drawn from `latency_distribution`
+    with mean `latency` seconds – 'constant', 'uniform' (0 to 2 * mean),
+    'exponential' or 'lognormal' (median `latency`, shape `latency_sigma`).
+    Rate limit: more than `rate_limit` requests in one 1-second window get a
+    429 (0 disables the limit); with `retry_after` the response says how many
+    seconds remain in the window. Faults: `error_rate` of the requests that
+    pass the limit answer with a random status from `error_statuses`, and
+    `drop_rate` of them are dropped – the connection closes without a response.
+    """
+
+    api_key: str = 'symma-secret-token'
+    latency: float = 0.0
+    latency_distribution: str = 'constant'
+    latency_sigma: float = 0.5
+    rate_limit: float = 5
+    retry_after: bool = True
+    error_rate: float = 0.0
+    error_statuses: tuple = (500, 502, 503)
+    drop_rate: float = 0.0
+    seed: int = None
+
+    def __post_init__(self):
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution {self.latency_distribution!r}; "
+                f"choose one of {', '.join(LATENCY_DISTRIBUTIONS)}."
+            )
+
+
+class MockEshop:
+    """In-memory state and fault injection shared by all handler threads."""
+
+    def __init__(self, config: MockEshopConfig):
+        self.config = config
+        self.products = {}
+        # (method, status) -> responses, ('DROP', method) -> dropped connections,
+        # ('ABORT', method) -> responses the client was no longer there to receive
+        self.stats = Counter()
+        self._random = random.Random(config.seed)
+        self._window_start = None
+        self._window_count = 0
+        self._lock = Lock()
+
+    def record(self, *key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def latency(self) -> float:
+        config = self.config
+        if config.latency <= 0:
+            return 0.0
+        with self._lock:
+            if config.latency_distribution == 'uniform':
+                return self._random.uniform(0, 2 * config.latency)
+            if config.latency_distribution == 'exponential':
+                return self._random.expovariate(1 / config.latency)
+            if config.latency_distribution == 'lognormal':
+                return self._random.lognormvariate(0, config.latency_sigma) * config.latency
+        return config.latency
+
+    def admit(self):
+        """Count the request against the rate limit; return None or the seconds left in the window."""
+        if not self.config.rate_limit:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if self._window_start is None or now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            if self._window_count <= self.config.rate_limit:
+                return None
+            return 1.0 - (now - self._window_start)
+
+    def fault(self):
+        """Return 'drop', an error status to answer with, or None for a normal response."""
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.config.drop_rate:
+                return 'drop'
+            if roll < self.config.drop_rate + self.config.error_rate:
+                return self._random.choice(self.config.error_statuses)
+        return None
+
+    def apply(self, method: str, path: str, body) -> tuple[int, dict]:
+        """Execute one product operation; return (status, response body)."""
+        if method == 'POST' and path == '/products/':
+            if not isinstance(body, dict) or 'sku' not in body:
+                return 422, {'error': 'sku is required'}
+            with self._lock:
+                if body['sku'] in self.products:
+                    return 409, {'error': f"SKU {body['sku']} already exists"}
+                self.products[body['sku']] = body
+            return 201, body
+
+        match = PRODUCT_PATH.match(path)
+        if match is None or method not in ('PATCH', 'DELETE'):
+            return 404, {'error': f'{method} {path} not found'}
+        sku = match['sku']
+        with self._lock:
+            if sku not in self.products:
+                return 404, {'error': f'SKU {sku} not found'}
+            if method == 'DELETE':
+                del self.products[sku]
+                return 204, {}
+            self.products[sku] = {**self.products[sku], **(body or {})}
+            return 200, self.products[sku]
+
+    def apply_batch(self, body) -> tuple[int, dict]:
+        operations = body.get('operations') if isinstance(body, dict) else None
+        if not isinstance(operations, list):
+            return 422, {'error': 'operations must be a list'}
+        results = []
+        for operation in operations:
+            status, payload = self.apply(operation.get('method'), operation.get('path'), operation.get('body'))
+            result = {'status': status}
+            if status >= 400:
+                result['error'] = payload.get('error')
+            results.append(result)
+        return 200, {'results': results}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    # Headers and body are written separately; with Nagle's algorithm the body
+    # would wait for the client's delayed ACK (~40 ms per response).
+    disable_nagle_algorithm = True
+    server: 'MockEshopServer'
+
+    def do_POST(self):
+        self._handle()
+
+    def do_PATCH(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _handle(self):
+        eshop = self.server.eshop
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+
+        time.sleep(eshop.latency())
+
+        if self.headers.get('X-Api-Key') != eshop.config.api_key:
+            return self._respond(401, {'error': 'invalid API key'})
+
+        wait = eshop.admit()
+        if wait is not None:
+            headers = {'Retry-After': f'{wait:.3f}'} if eshop.config.retry_after else {}
+            return self._respond(429, {'error': 'rate limit exceeded'}, headers)
+
+        fault = eshop.fault()
+        if fault == 'drop':
+            eshop.record('DROP', self.command)
+            self.close_connection = True
+            return
+        if fault is not None:
+            return self._respond(fault, {'error': 'injected failure'})
+
+        try:
+            body = json.loads(raw) if raw else None
+        except json.JSONDecodeError:
+            return self._respond(400, {'error': 'invalid JSON'})
+        if self.command == 'POST' and self.path.endswith('/products/batch/'):
+            status, payload = eshop.apply_batch(body)
+        else:
+            status, payload = eshop.apply(self.command, self._product_path(), body)
+        self._respond(status, payload)
+
+    def _product_path(self) -> str:
+        """Request path relative to the API root, e.g. /v1/products/X/ -> /products/X/."""
+        index = self.path.find('/products/')
+        return self.path[index:] if index >= 0 else self.path
+
+    def _respond(self, status: int, payload: dict, headers: dict = None):
+        self.server.eshop.record(self.command, status)
+        data = json.dumps(payload).encode('utf-8') if status != 204 else b''
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. read timeout) before the answer was ready.
+            self.server.eshop.record('ABORT', self.command)
+            self.close_connection = True
+
+
+class MockEshopServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the eshop API on a real socket.
+
+    Serves POST /products/, PATCH and DELETE /products/{sku}/ and POST
+    /products/batch/ (optionally under a prefix such as /v1) from an
+    in-memory catalogue, with the latency, rate limit and faults of `config`.
+    Use as a context manager to serve from a background thread; `url` is the
+    base URL to put in ESHOP_API_BASE_URL. Port 0 picks a free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: MockEshopConfig = MockEshopConfig(), host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.eshop = MockEshop(config)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread = Thread(target=self.serve_forever, args=(SHUTDOWN_POLL_INTERVAL,), name='mock-eshop', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
@@ -3,9 +3,75 @@ from django.db import models
 
 class ProductSyncState(models.Model):
     sku = models.CharField(max_length=50, unique=True)
-    content_hash = models.CharField(max_length=64)
+    content_hash = models.BinaryField(max_length=32)  # raw digest, 16 B for blake2b
+    # Name of the integrator.hashing algorithm that produced content_hash.
+    hash_algorithm = models.CharField(max_length=16, default='sha256')
+    # Per-field digests (integrator.hashing.field_digests) of the last synced payload.
+    field_hashes = models.BinaryField(max_length=32, default=b'')
     last_synced_at = models.DateTimeField(auto_now=True)
     synced_as_new = models.BooleanField(default=True)
 
     def __str__(self):
-        return f"{self.sku} (hash={self.content_hash[:8]}...)"
+        return f"{self.sku} (hash={bytes(self.content_hash).hex()[:8]}...)"
+
+
+class ErpExportFingerprint(models.Model):
+    """Fingerprint of the last ERP export that was synced without errors."""
+
+    path = models.CharField(max_length=500, unique=True)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    digest = models.CharField(max_length=32)
+    processed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.size} B, digest={self.digest[:8]}...)"
+
+
+class FailedSync(models.Model):
+    """
+    Dead-letter record of a SKU whose last send failed.
+
+    Holds the transformed payload so retry_failed_syncs_task can re-send the
+    product without re-reading the ERP export. The row is deleted as soon as
+    the SKU is synced successfully.
+    """
+
+    sku = models.CharField(max_length=50, unique=True)
+    payload = models.JSONField()
+    content_hash = models.BinaryField(max_length=32)
+    last_error = models.TextField()
+    attempts = models.PositiveIntegerField(default=0)
+    # None once SYNC_RETRY_MAX_ATTEMPTS is reached; only a full run retries it then.
+    next_attempt_at = models.DateTimeField(null=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.sku} (attempts={self.attempts}, next={self.next_attempt_at})"
+
+
+class SyncRun(models.Model):
+    """
+    Progress of one sync run over one ERP export, checkpointed after every chunk.
+
+    `scope` distinguishes the full run from individual shards. A run that did
+    not complete is resumed by the next run of the same scope over the same
+    export (same path, size and mtime), starting after `position` products.
+    """
+
+    scope = models.CharField(max_length=50, db_index=True)
+    path = models.CharField(max_length=500)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    status = models.CharField(max_length=50, default='running')
+    position = models.PositiveBigIntegerField(default=0)  # valid products fully processed
+    sent = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.scope} {self.status} at {self.position} ({self.path})"
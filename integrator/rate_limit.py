@@ -0,0 +1,332 @@
+import asyncio
+import logging
+import time
+from threading import Lock
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from .metrics import observe_learned_rate
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = 5  # requests per second
+REDIS_KEY = 'integrator:eshop-rate-limit'
+
+RATE_LIMITER_KINDS = ('fixed', 'smooth', 'adaptive', 'redis')  # accepted ESHOP_RATE_LIMITER values
+
+ADAPTIVE_INCREASE = 0.1  # req/s added per second's worth of successful requests
+ADAPTIVE_DECREASE = 0.5  # multiplier applied to the rate on a 429
+ADAPTIVE_COOLDOWN = 1.0  # seconds during which further 429s do not cut the rate again
+
+# GCRA (generic cell rate algorithm) evaluated atomically inside Redis.
+# The only state is the "theoretical arrival time" (TAT) of the next request.
+# A request is allowed if it does not arrive earlier than TAT - tolerance;
+# otherwise the script returns how long (in microseconds) the caller must wait.
+# Redis' own clock is used, so the budget is shared correctly by all processes.
+#   KEYS[1] – TAT key
+#   ARGV[1] – emission interval in µs (1 s / rate)
+#   ARGV[2] – burst tolerance in µs ((burst - 1) * interval)
+GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000000 + tonumber(now_parts[2])
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+
+local allow_at = tat - tolerance
+if now < allow_at then
+    return allow_at - now
+end
+
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], string.format('%d', new_tat), 'PX', math.ceil((new_tat - now) / 1000) + 1000)
+return 0
+"""
+
+
+class BaseRateLimiter:
+    """
+    Common interface of all rate limiters.
+
+    The eshop clients report every successful response and every 429 back to
+    the limiter. Static limiters ignore that feedback; AdaptiveRateLimiter
+    uses it to learn the rate the eshop currently accepts.
+    """
+
+    current_rate = None  # learned req/s, only set by adaptive limiters
+
+    def on_success(self):
+        pass
+
+    def on_throttle(self, retry_after: float = None):
+        pass
+
+
+class _AsyncPacing:
+    """
+    Mixin turning a limiter that hands out reservations (_reserve() returns
+    how long the caller must wait) into its asyncio counterpart: the wait
+    happens with asyncio.sleep, so the event loop keeps serving other
+    requests. Only the waiting differs; the pacing logic is shared.
+    """
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RateLimiter(BaseRateLimiter):
+    """
+    Fixed-window rate limiter (thread-safe).
+
+    Allows up to `rate` requests per `period`-second window (1 s by default).
+    The window starts on the first request. While tokens remain, requests
+    proceed immediately. When the bucket is empty, the caller reserves a
+    token of the next window (which starts when the current one expires)
+    and sleeps until then, outside the lock. If no requests arrive before a
+    window expires, the next request simply starts a new window.
+    """
+
+    def __init__(self, rate: int, period: float = 1.0):
+        self._rate = rate
+        self._period = period
+        self._tokens = rate
+        self._window_start = None   # window starts lazily on first request
+        self._lock = Lock()
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+
+            # Start a new window if there is none yet, or the current one expired.
+            if self._window_start is None or (now - self._window_start) >= self._period:
+                self._window_start = now
+                self._tokens = self._rate
+
+            if self._tokens > 0:
+                self._tokens -= 1
+                return 0.0
+            # Take a token of the next window and wait for it to open.
+            self._window_start += self._period
+            self._tokens = self._rate - 1
+            return self._window_start - now
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AsyncRateLimiter(_AsyncPacing, RateLimiter):
+    """asyncio counterpart of RateLimiter with the same fixed-window semantics."""
+
+
+class TokenBucketRateLimiter(BaseRateLimiter):
+    """
+    Smooth token-bucket rate limiter (thread-safe).
+
+    Tokens refill continuously at `rate` per second up to `burst`, so requests
+    are spaced 1/rate apart instead of arriving in window-sized bursts; at
+    most `burst` requests may go back to back after an idle period. A caller
+    that finds the bucket empty reserves the next token (the balance goes
+    negative) and sleeps outside the lock, so concurrent callers queue up at
+    evenly spaced times.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AsyncTokenBucketRateLimiter(_AsyncPacing, TokenBucketRateLimiter):
+    """asyncio counterpart of TokenBucketRateLimiter; waits with asyncio.sleep."""
+
+
+class AdaptiveRateLimiter(TokenBucketRateLimiter):
+    """
+    Token bucket whose rate is learned from eshop feedback (AIMD).
+
+    Every successful response raises the rate by ADAPTIVE_INCREASE / rate, i.e.
+    by about ADAPTIVE_INCREASE req/s per second of clean traffic. A 429 cuts it
+    to rate * ADAPTIVE_DECREASE; 429s arriving within ADAPTIVE_COOLDOWN of a
+    cut were caused by the old rate and are not counted again. A Retry-After
+    value additionally pauses the whole bucket for that long. The rate always
+    stays within [floor, ceiling]. With a `scope` every change of the rate is
+    published as the learned-rate metric of that scope.
+    """
+
+    def __init__(self, rate: float, floor: float, ceiling: float, burst: int = 1, scope: str = None):
+        super().__init__(min(max(rate, floor), ceiling), burst)
+        self._floor = floor
+        self._ceiling = ceiling
+        self._last_cut = None
+        self._scope = scope
+        self._publish()
+
+    @property
+    def current_rate(self) -> float:
+        return self._rate
+
+    def on_success(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = min(self._ceiling, self._rate + ADAPTIVE_INCREASE / self._rate)
+            self._publish()
+
+    def on_throttle(self, retry_after: float = None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if self._last_cut is None or now - self._last_cut >= ADAPTIVE_COOLDOWN:
+                self._last_cut = now
+                self._rate = max(self._floor, self._rate * ADAPTIVE_DECREASE)
+                self._publish()
+                logger.warning("Eshop throttled us – lowering request rate to %.2f req/s.", self._rate)
+
+            if retry_after:
+                # No token becomes available before Retry-After has elapsed.
+                self._tokens = min(self._tokens, -retry_after * self._rate)
+
+    def _publish(self):
+        if self._scope is not None:
+            observe_learned_rate(self._scope, self._rate)
+
+
+class AsyncAdaptiveRateLimiter(_AsyncPacing, AdaptiveRateLimiter):
+    """asyncio counterpart of AdaptiveRateLimiter; waits with asyncio.sleep."""
+
+
+class RedisRateLimiter(BaseRateLimiter):
+    """
+    Distributed GCRA rate limiter shared by every process using the same key.
+
+    All Celery workers and shells talking to the same Redis share one budget
+    of `rate` requests per second, with up to `burst` requests allowed back
+    to back. If Redis is unreachable, requests are paced by the in-process
+    `fallback` limiter instead of failing the sync.
+    """
+
+    local_limiter = RateLimiter  # default fallback
+
+    def __init__(self, client, rate: int, burst: int = 1, key: str = REDIS_KEY, fallback=None):
+        self._interval_us = int(1_000_000 / rate)
+        self._tolerance_us = (burst - 1) * self._interval_us
+        self._key = key
+        self._script = client.register_script(GCRA_SCRIPT)
+        self._fallback = fallback or self.local_limiter(rate)
+
+    def acquire(self):
+        while True:
+            try:
+                wait_us = self._script(keys=[self._key], args=[self._interval_us, self._tolerance_us])
+            except redis.RedisError as exc:
+                logger.warning("Redis rate limiter unavailable (%s) – using in-process limiter.", exc)
+                self._fallback.acquire()
+                return
+            if not wait_us:
+                return
+            time.sleep(wait_us / 1_000_000)
+
+
+class AsyncRedisRateLimiter(RedisRateLimiter):
+    """asyncio counterpart of RedisRateLimiter (same Lua script, same key); `client` is a redis.asyncio one."""
+
+    local_limiter = AsyncRateLimiter
+
+    async def acquire(self):
+        while True:
+            try:
+                wait_us = await self._script(keys=[self._key], args=[self._interval_us, self._tolerance_us])
+            except redis.RedisError as exc:
+                logger.warning("Redis rate limiter unavailable (%s) – using in-process limiter.", exc)
+                await self._fallback.acquire()
+                return
+            if not wait_us:
+                return
+            await asyncio.sleep(wait_us / 1_000_000)
+
+
+def _build_local_rate_limiter(kind: str, burst: int, share: int, asynchronous: bool, scope: str = None):
+    """In-process limiter of the given kind holding 1/share of RATE_LIMIT."""
+    if kind == 'fixed':
+        if share <= 1:
+            return AsyncRateLimiter(RATE_LIMIT) if asynchronous else RateLimiter(RATE_LIMIT)
+        period = share / RATE_LIMIT
+        return AsyncRateLimiter(1, period=period) if asynchronous else RateLimiter(1, period=period)
+
+    share = max(share, 1)
+    rate = RATE_LIMIT / share
+    burst = max(1, min(burst, int(rate) or 1))
+    if kind == 'adaptive':
+        cls = AsyncAdaptiveRateLimiter if asynchronous else AdaptiveRateLimiter
+        return cls(
+            rate,
+            floor=settings.ESHOP_RATE_FLOOR / share,
+            ceiling=settings.ESHOP_RATE_CEILING / share,
+            burst=burst,
+            scope=scope,
+        )
+    return AsyncTokenBucketRateLimiter(rate, burst) if asynchronous else TokenBucketRateLimiter(rate, burst)
+
+
+def build_rate_limiter(share: int = 1, asynchronous: bool = False, scope: str = None):
+    """
+    Return the rate limiter selected by settings.ESHOP_RATE_LIMITER.
+
+      'fixed'  – in-process fixed window (up to RATE_LIMIT requests at once).
+      'smooth' – in-process token bucket pacing requests 1/RATE_LIMIT apart,
+                 with bursts of at most ESHOP_RATE_BURST requests.
+      'adaptive' – like 'smooth', but starting at RATE_LIMIT the rate follows
+                 429 feedback (AIMD) within ESHOP_RATE_FLOOR..ESHOP_RATE_CEILING.
+      'redis'  – one global GCRA budget in Redis shared by all processes,
+                 with the same burst setting; `share` is irrelevant.
+
+    In-process limiters only see the current process, so when the budget is
+    split between `share` independent processes (e.g. shards), each one gets
+    1/share of RATE_LIMIT. An adaptive limiter publishes its learned rate
+    under the metric label `scope` while it runs.
+    """
+    kind = settings.ESHOP_RATE_LIMITER
+    burst = settings.ESHOP_RATE_BURST
+    if kind not in RATE_LIMITER_KINDS:
+        raise ValueError(
+            f"Unknown rate limiter {kind!r}; choose one of {', '.join(RATE_LIMITER_KINDS)}."
+        )
+
+    if kind != 'redis':
+        return _build_local_rate_limiter(kind, burst, share, asynchronous, scope)
+
+    fallback = _build_local_rate_limiter('smooth', burst, share, asynchronous)
+    if asynchronous:
+        client = redis.asyncio.Redis.from_url(settings.ESHOP_RATE_LIMIT_REDIS_URL)
+        return AsyncRedisRateLimiter(client, RATE_LIMIT, burst=burst, fallback=fallback)
+    client = redis.Redis.from_url(settings.ESHOP_RATE_LIMIT_REDIS_URL)
+    return RedisRateLimiter(client, RATE_LIMIT, burst=burst, fallback=fallback)
@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent when a sync run returns, with keyword arguments:
+#   scope  – 'full', 'retry' or 'sharded' (sent once by the chord callback, not per shard)
+#   result – the task result; runs that did any work carry per-stage 'timings'
+#            (see integrator.timing) including the wall-clock 'total'
+# The sender is the name of the task. Receivers run in the worker process; an
+# exception in one is logged and does not fail the run. This is the hook for
+# exporting run metrics.
+sync_finished = Signal()
@@ -0,0 +1,92 @@
+import json
+import random
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator
+
+# Vocabulary the generated products are drawn from, in the style of erp_data.json.
+WAREHOUSES = ('praha', 'brno', 'ostrava', 'plzen', 'olomouc', 'liberec', 'pardubice', 'externi')
+PRODUCT_NAMES = ('Kávovar', 'Mlýnek', 'Hrnek', 'Tablety', 'Filtry', 'Konvice', 'Šálek', 'Odvápňovač')
+PRODUCT_VARIANTS = ('Espresso', 'Deluxe', 'Mini', 'Pro', 'Classic', 'Barista', 'Compact', '')
+COLORS = ('stříbrná', 'černá', 'bílá', 'červená', 'modrá', 'zelená')
+
+DUPLICATE_WINDOW = 1000  # duplicates repeat one of this many most recent SKUs
+NO_ATTRIBUTES_RATE = 0.05  # share of products with "attributes": null or {}
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """
+    Shape of a synthetic ERP export.
+
+    `products` distinct SKUs are generated; on top of them `duplicate_rate`
+    of the rows repeat a recent SKU with a different price (the first
+    occurrence must win). `invalid_price_rate` of the products have a null
+    or negative price and `na_stock_rate` of the stock values are "N/A".
+    Every product is stocked in 1 to `warehouses` warehouses.
+    """
+
+    products: int = 10000
+    warehouses: int = 3
+    duplicate_rate: float = 0.01
+    invalid_price_rate: float = 0.01
+    na_stock_rate: float = 0.01
+    seed: int = 0
+
+
+def _product(rng: random.Random, index: int, spec: ExportSpec) -> dict:
+    if rng.random() < spec.invalid_price_rate:
+        price = None if rng.random() < 0.5 else -round(rng.uniform(1, 500), 2)
+    else:
+        price = round(rng.uniform(10, 50000), 2)
+
+    warehouse_count = rng.randint(1, max(1, min(spec.warehouses, len(WAREHOUSES))))
+    stocks = {
+        warehouse: 'N/A' if rng.random() < spec.na_stock_rate else rng.randint(0, 500)
+        for warehouse in rng.sample(WAREHOUSES, warehouse_count)
+    }
+
+    if rng.random() < NO_ATTRIBUTES_RATE:
+        attributes = rng.choice((None, {}))
+    else:
+        attributes = {'color': rng.choice(COLORS)}
+
+    title = f"{rng.choice(PRODUCT_NAMES)} {rng.choice(PRODUCT_VARIANTS)}".strip()
+    return {
+        'id': f'SKU-{index:07d}',
+        'title': title,
+        'price_vat_excl': price,
+        'stocks': stocks,
+        'attributes': attributes,
+    }
+
+
+def iter_export(spec: ExportSpec) -> Iterator[dict]:
+    """Yield the raw ERP rows of the export described by `spec` (same seed, same rows)."""
+    rng = random.Random(spec.seed)
+    recent = deque(maxlen=DUPLICATE_WINDOW)
+    for index in range(spec.products):
+        product = _product(rng, index, spec)
+        yield product
+        recent.append(product)
+        if rng.random() < spec.duplicate_rate:
+            yield dict(rng.choice(recent), price_vat_excl=round(rng.uniform(10, 50000), 2))
+
+
+def write_export(path, spec: ExportSpec) -> int:
+    """
+    Write the export described by `spec` to `path` as a JSON array.
+
+    Rows are written one per line as they are generated, so memory use does
+    not grow with the size of the export. Returns the number of rows.
+    """
+    rows = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        for product in iter_export(spec):
+            if rows:
+                f.write(',\n')
+            f.write(json.dumps(product, ensure_ascii=False))
+            rows += 1
+        f.write('\n]\n')
+    return rows
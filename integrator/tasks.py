@@ -1,68 +1,755 @@
+import asyncio
+import inspect
 import logging
+import time
+import zlib
+from datetime import timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import islice
 
-from celery import shared_task
+from celery import chord, shared_task
+from celery.exceptions import Ignore
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 
+from .async_client import AsyncEshopClient, send_all_async
+from .checkpoint import finish_run, save_checkpoint, start_run
+from .circuit_breaker import CircuitOpenError
+from .deletion import sync_deletions
 from .eshop_client import EshopClient
-from .models import ProductSyncState
-from .transformer import compute_hash, load_and_transform
+from .fingerprint import ExportFingerprint, check_export, record_export
+from .hashing import changed_fields, field_digests, get_hasher
+from .locking import acquire_run_lock, release_run_lock, single_flight
+from .models import FailedSync, ProductSyncState, SyncRun
+from .rate_limit import build_rate_limiter
+from .signals import sync_finished
+from .timing import DB_LOOKUP, DB_WRITE, HASH, LOAD, StageTimer
+from .transformer import iter_erp_data, transform_and_hash
 
 logger = logging.getLogger(__name__)
 
 
+def _chunked(iterable, size: int):
+    """Yield lists of up to `size` items from any iterable (including generators)."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _prefetch_hashes(skus) -> dict[str, tuple[bytes, str, bytes, bool]]:
+    """
+    Load last synced (digest, algorithm, field digests, has FailedSync row)
+    per SKU with a single `sku__in` query.
+    """
+    rows = ProductSyncState.objects.filter(sku__in=skus).annotate(
+        failed=Exists(FailedSync.objects.filter(sku=OuterRef('sku'))),
+    ).values_list('sku', 'content_hash', 'hash_algorithm', 'field_hashes', 'failed')
+    # Some backends (psycopg) return memoryview for bytea; normalise to bytes.
+    return {
+        sku: (bytes(content_hash), algorithm, bytes(field_hashes), failed)
+        for sku, content_hash, algorithm, field_hashes, failed in rows
+    }
+
+
+def _is_unchanged(product: dict, new_hash: bytes, stored: tuple, algorithm: str) -> bool:
+    """
+    Delta check that also accepts hashes made by a previous algorithm.
+
+    A stored hash from another algorithm is compared against the product
+    hashed with that same algorithm, so switching SYNC_HASH_ALGORITHM does
+    not make every SKU look changed at once.
+    """
+    old_hash, old_algorithm = stored[:2]
+    if old_algorithm == algorithm:
+        return old_hash == new_hash
+    return old_hash == get_hasher(old_algorithm)(product)
+
+
+def _send(client: EshopClient, job: tuple):
+    """Send one (product, hash, is_new, fields) job; return the exception instead of raising."""
+    product, _, is_new, fields = job
+    try:
+        client.send_product(product, is_new=is_new, fields=fields)
+    except Exception as exc:
+        return exc
+    return None
+
+
+def _send_single(client: EshopClient, batch: list) -> list:
+    """Send a one-job batch as a regular request; return [(job, exception_or_None)]."""
+    return [(batch[0], _send(client, batch[0]))]
+
+
+def _send_batch(client: EshopClient, batch: list) -> list:
+    """Send jobs in one bulk request; return [(job, exception_or_None), ...]."""
+    try:
+        results = client.send_products([(product, is_new, fields) for product, _, is_new, fields in batch])
+    except Exception as exc:
+        results = [exc] * len(batch)
+    return list(zip(batch, results))
+
+
+def _send_all(client: EshopClient, jobs: list, executor=None, max_in_flight: int = 1, batch_size: int = 1):
+    """
+    Send jobs and yield (job, exception_or_None) as each request finishes.
+
+    With batch_size > 1 the jobs are grouped into bulk requests of up to that
+    many products (EshopClient.send_products); otherwise each job is its own
+    request. Without an executor the requests are sent one by one in the
+    calling thread. With one, at most `max_in_flight` requests are submitted
+    at a time; the client's RateLimiter is thread-safe, so the global req/s
+    budget still holds. Outcomes are yielded back to the caller's thread,
+    which keeps the accounting and all DB writes single-threaded.
+    """
+    batches = _chunked(jobs, max(1, batch_size))
+    send = _send_batch if batch_size > 1 else _send_single
+
+    if executor is None:
+        for batch in batches:
+            yield from send(client, batch)
+        return
+
+    pending = set()
+    for batch in batches:
+        if len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+        pending.add(executor.submit(send, client, batch))
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from future.result()
+
+
+def shard_of(sku, shard_count: int) -> int:
+    """Stable SKU → shard mapping (crc32, identical in every worker process)."""
+    return zlib.crc32(str(sku).encode('utf-8')) % shard_count
+
+
+def _load_shard(path, shard_index: int, shard_count: int, timer: StageTimer = None):
+    """Stream (product, hash) pairs whose SKU belongs to the given shard."""
+    return transform_and_hash(
+        path,
+        workers=settings.SYNC_TRANSFORM_WORKERS,
+        raw_filter=lambda raw: shard_of(raw.get('id'), shard_count) == shard_index,
+        algorithm=settings.SYNC_HASH_ALGORITHM,
+        timer=timer,
+    )
+
+
+@contextmanager
+def _open_sender(engine: str, workers: int, rate_limiter, batch_size: int = 1, timer: StageTimer = None):
+    """
+    Yield a `send_all(jobs)` callable for the configured SYNC_ENGINE.
+
+    'threads' uses the blocking EshopClient (optionally from a thread pool),
+    'asyncio' drives AsyncEshopClient on one event loop reused across chunks.
+    Either way outcomes are consumed in the task thread. batch_size > 1
+    switches to the eshop's bulk endpoint. The client reports its request,
+    rate-limiter and retry times to `timer`.
+    """
+    if engine == 'asyncio':
+        with asyncio.Runner() as runner:
+            client = AsyncEshopClient(
+                max_connections=workers,
+                rate_limiter=rate_limiter,
+                timer=timer,
+            )
+            try:
+                yield lambda jobs: runner.run(send_all_async(client, jobs, workers, batch_size))
+            finally:
+                runner.run(client.aclose())
+        return
+
+    client = EshopClient(
+        pool_size=workers,
+        rate_limiter=rate_limiter,
+        timer=timer,
+    )
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        yield lambda jobs: _send_all(client, jobs, executor, workers, batch_size)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _StateWriter:
+    """
+    Buffer successfully synced products and persist them in bulk.
+
+    Each flush upserts all pending rows (ON CONFLICT on `sku`) inside a single
+    transaction, so a crash loses at most the products buffered since the
+    last flush – those are simply re-sent on the next run. Unchanged products
+    whose stored digests are outdated (older hash algorithm, no field
+    digests yet) are re-keyed in the same transaction without touching their
+    other fields. Failed sends are recorded as FailedSync rows for
+    retry_failed_syncs_task, and synced SKUs drop theirs. A SKU that was not
+    sent at all because the circuit was open is recorded too, but it keeps
+    its attempts and schedule: the eshop never saw it.
+    """
+
+    def __init__(self, algorithm: str):
+        self._algorithm = algorithm
+        self._pending: dict[str, ProductSyncState] = {}
+        self._rekeyed: dict[str, ProductSyncState] = {}
+        self._failed: dict[str, tuple[dict, bytes, str, bool]] = {}
+        self._resolved: set[str] = set()
+
+    def add(self, sku: str, content_hash: bytes, field_hashes: bytes, is_new: bool):
+        self._pending[sku] = ProductSyncState(
+            sku=sku,
+            content_hash=content_hash,
+            hash_algorithm=self._algorithm,
+            field_hashes=field_hashes,
+            synced_as_new=is_new,
+        )
+
+    def rekey(self, sku: str, content_hash: bytes, field_hashes: bytes):
+        self._rekeyed[sku] = ProductSyncState(
+            sku=sku, content_hash=content_hash, hash_algorithm=self._algorithm, field_hashes=field_hashes,
+        )
+
+    def fail(self, product: dict, content_hash: bytes, error: Exception):
+        self._failed[product['sku']] = (
+            product, content_hash, str(error) or type(error).__name__, not isinstance(error, CircuitOpenError),
+        )
+
+    def resolve(self, sku: str):
+        """Drop the FailedSync row of a SKU found already in sync."""
+        self._resolved.add(sku)
+
+    def flush(self):
+        if not self._pending and not self._rekeyed and not self._failed and not self._resolved:
+            return
+        with transaction.atomic():
+            if self._pending:
+                ProductSyncState.objects.bulk_create(
+                    self._pending.values(),
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=['content_hash', 'hash_algorithm', 'field_hashes', 'synced_as_new', 'last_synced_at'],
+                )
+            if self._pending or self._resolved:
+                FailedSync.objects.filter(sku__in=[*self._pending, *self._resolved]).delete()
+            if self._failed:
+                self._record_failures()
+            if self._rekeyed:
+                ProductSyncState.objects.bulk_create(
+                    self._rekeyed.values(),
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=['content_hash', 'hash_algorithm', 'field_hashes'],
+                )
+        logger.debug(
+            "Persisted sync state for %d SKUs (%d re-keyed, %d failed).",
+            len(self._pending), len(self._rekeyed), len(self._failed),
+        )
+        self._pending.clear()
+        self._rekeyed.clear()
+        self._failed.clear()
+        self._resolved.clear()
+
+    def _record_failures(self):
+        """Upsert FailedSync rows, bumping attempts and scheduling the next re-send of attempted SKUs."""
+        known = {
+            sku: (attempts, next_attempt_at)
+            for sku, attempts, next_attempt_at in FailedSync.objects
+            .filter(sku__in=list(self._failed))
+            .values_list('sku', 'attempts', 'next_attempt_at')
+        }
+        now = timezone.now()
+        rows = []
+        for sku, (product, content_hash, error, attempted) in self._failed.items():
+            attempt, next_attempt_at = known.get(sku, (0, now))
+            if attempted:
+                attempt += 1
+                next_attempt_at = _next_attempt_at(now, attempt)
+            rows.append(FailedSync(
+                sku=sku,
+                payload=product,
+                content_hash=content_hash,
+                last_error=error,
+                attempts=attempt,
+                next_attempt_at=next_attempt_at,
+                updated_at=now,
+            ))
+        FailedSync.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=['payload', 'content_hash', 'last_error', 'attempts', 'next_attempt_at', 'updated_at'],
+        )
+
+
+def _next_attempt_at(now, attempt: int):
+    """When a SKU that has failed `attempt` times is due again (None: give up until the next full run)."""
+    if attempt >= settings.SYNC_RETRY_MAX_ATTEMPTS:
+        return None
+    delay = min(settings.SYNC_RETRY_MAX_DELAY, settings.SYNC_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return now + timedelta(seconds=delay)
+
+
+def _check_export(path):
+    """
+    Return (unchanged_result, fingerprint) for the export at `path`.
+
+    unchanged_result is the task result to return right away when the export
+    is identical to the last fully synced one, otherwise None. fingerprint
+    should be recorded once the run finishes without errors.
+    """
+    if not settings.SYNC_SKIP_UNCHANGED_EXPORT:
+        return None, None
+    unchanged, fingerprint = check_export(path)
+    if unchanged:
+        logger.info("ERP export %s unchanged since the last sync – nothing to do.", path)
+        return {'status': 'unchanged', 'sent': 0, 'skipped': 0, 'errors': 0}, fingerprint
+    return None, fingerprint
+
+
+def _remove_missing(
+    result: dict,
+    export_skus: set,
+    timer: StageTimer = None,
+    rate_limiter=None,
+):
+    """
+    Run the deletion stage after a completed run and merge its outcome into `result`.
+
+    The removals are paced by the run's `rate_limiter`, so they stay within
+    the run's share of the budget (and an adaptive limiter keeps the rate it
+    learned). The deletion stage uses the blocking client; an asyncio run's
+    limiter cannot pace it, so it gets a fresh one with the full budget
+    instead. 'deleted' / 'deletion_blocked' are only reported when non-zero;
+    removal failures count as errors.
+    """
+    if not settings.SYNC_DELETE_MISSING or result['status'] != 'completed':
+        return
+    if rate_limiter is None or inspect.iscoroutinefunction(rate_limiter.acquire):
+        rate_limiter = build_rate_limiter()
+    deletion = sync_deletions(export_skus, timer, rate_limiter)
+    result['errors'] += deletion.get('errors', 0)
+    if deletion.get('circuit_open'):
+        result['status'] = 'aborted: circuit open'
+    if deletion.get('deleted'):
+        result['deleted'] = deletion['deleted']
+    if deletion.get('deletion_blocked'):
+        result['deletion_blocked'] = deletion['deletion_blocked']
+
+
+def _finished(sender: str, scope: str, result: dict, timer: StageTimer = None) -> dict:
+    """Attach the stage timings of `timer` to `result`, announce it via sync_finished and return it."""
+    if timer is not None:
+        result['timings'] = timer.as_dict()
+    for receiver, response in sync_finished.send_robust(sender, scope=scope, result=result):
+        if isinstance(response, Exception):
+            logger.error("sync_finished receiver %r failed: %s", receiver, response)
+    return result
+
+
+def _already_running(lock_name: str) -> dict:
+    logger.info("Lock %r is held by another run – skipping this trigger.", lock_name)
+    return {'status': 'already running', 'sent': 0, 'skipped': 0, 'errors': 0}
+
+
+def _sync_products(
+    hashed_products,
+    shard_count: int = 1,
+    run: SyncRun = None,
+    timer: StageTimer = None,
+    rate_limiter=None,
+) -> dict:
+    """
+    Run the delta sync over an iterable of (product, hash) pairs; return the counts.
+
+    The hashes must have been computed with settings.SYNC_HASH_ALGORITHM.
+    With a `run`, the first run.position pairs are skipped (they were fully
+    processed before an interruption), counting continues from the run's
+    counters, and the run is checkpointed after every chunk in the same
+    transaction as the chunk's sync state. Time spent on the delta check,
+    the database and the eshop requests is added to `timer`. Without a
+    `rate_limiter` one matching SYNC_ENGINE with 1/shard_count of the
+    budget is built.
+    """
+    workers = max(1, settings.SYNC_WORKERS)
+    engine = settings.SYNC_ENGINE
+    if rate_limiter is None:
+        rate_limiter = build_rate_limiter(shard_count, asynchronous=engine == 'asyncio')
+    algorithm = settings.SYNC_HASH_ALGORITHM
+    timer = timer or StageTimer()
+    writer = _StateWriter(algorithm)
+    sent = skipped = errors = 0
+    circuit_open = False
+    start = position = 0
+    if run is not None:
+        start = position = run.position
+        sent, skipped, errors = run.sent, run.skipped, run.errors
+        hashed_products = islice(hashed_products, start, None)
+
+    try:
+        with _open_sender(engine, workers, rate_limiter, settings.ESHOP_BATCH_SIZE, timer) as send_all:
+            for chunk in _chunked(hashed_products, settings.SYNC_CHUNK_SIZE):
+                with timer.measure(DB_LOOKUP):
+                    known_hashes = _prefetch_hashes([product['sku'] for product, _ in chunk])
+
+                jobs = []
+                new_field_hashes = {}
+                hashing_started = time.perf_counter()
+                for product, new_hash in chunk:
+                    sku = product['sku']
+                    stored = known_hashes.get(sku)
+
+                    if stored is not None and _is_unchanged(product, new_hash, stored, algorithm):
+                        logger.debug("SKU %s unchanged – skipping.", sku)
+                        skipped += 1
+                        if stored[1] != algorithm or not stored[2]:
+                            writer.rekey(sku, new_hash, field_digests(product))
+                        if stored[3]:
+                            writer.resolve(sku)
+                        continue
+
+                    digests = new_field_hashes[sku] = field_digests(product)
+                    if stored is None:
+                        jobs.append((product, new_hash, True, None))
+                    else:
+                        # PATCH only what changed (None = whole product).
+                        jobs.append((product, new_hash, False, changed_fields(stored[2], digests)))
+                timer.add(HASH, time.perf_counter() - hashing_started)
+
+                for (product, new_hash, is_new, _), exc in send_all(jobs):
+                    sku = product['sku']
+                    if exc is not None:
+                        errors += 1
+                        writer.fail(product, new_hash, exc)
+                        if isinstance(exc, CircuitOpenError):
+                            circuit_open = True
+                        else:
+                            logger.error("Failed to sync SKU %s: %s", sku, exc)
+                        continue
+
+                    writer.add(sku, new_hash, new_field_hashes[sku], is_new)
+                    sent += 1
+                    logger.info("SKU %s %s successfully.", sku, 'created' if is_new else 'updated')
+
+                position += len(chunk)
+                with timer.measure(DB_WRITE), transaction.atomic():
+                    writer.flush()
+                    if run is not None:
+                        save_checkpoint(run, position, sent, skipped, errors)
+                if circuit_open:
+                    # The eshop is down: stop instead of failing every remaining SKU.
+                    logger.error("Eshop API circuit open – aborting the sync run.")
+                    break
+    finally:
+        # Keep whatever was already sent, even if the run is being aborted.
+        with timer.measure(DB_WRITE):
+            writer.flush()
+
+    logger.info("Processed %d valid products from ERP data.", sent + skipped + errors)
+    status = 'aborted: circuit open' if circuit_open else 'completed'
+    result = {'status': status, 'sent': sent, 'skipped': skipped, 'errors': errors}
+    if run is not None:
+        with timer.measure(DB_WRITE):
+            finish_run(run, status)
+        if start:
+            result['resumed_from'] = start
+    if rate_limiter.current_rate is not None:
+        # Adaptive limiter: report the rate the eshop accepted at the end of the run.
+        result['rate_limit'] = round(rate_limiter.current_rate, 2)
+        logger.info("Learned eshop request rate: %.2f req/s.", rate_limiter.current_rate)
+    return result
+
+
 @shared_task(bind=True, name='integrator.sync_products')
 def sync_products_task(self):
     """
     Synchronise ERP products with the eshop API.
 
     Steps:
-      1. Load and transform products from erp_data.json.
-      2. For each valid product compute a SHA-256 content hash.
-      3. Compare with the last known hash stored in ProductSyncState.
-      4. Send only changed (or new) products to the eshop API.
-      5. Persist the new hash so the next run can skip unchanged products.
+      0. Return {'status': 'unchanged', ...} straight away if erp_data.json is
+         identical to the last export synced without errors.
+      1. Stream and transform products from erp_data.json.
+      2. For each valid product compute a content hash with
+         SYNC_HASH_ALGORITHM (steps 1–2 run in SYNC_TRANSFORM_WORKERS
+         processes when set above 1).
+      3. Compare with the last known hash stored in ProductSyncState
+         (prefetched per chunk of SYNC_CHUNK_SIZE products).
+      4. Send only changed (or new) products to the eshop API – PATCHes
+         carry just the fields whose digests changed – with up to
+         SYNC_WORKERS requests in flight at once (threads or asyncio, see
+         SYNC_ENGINE), in bulk requests of ESHOP_BATCH_SIZE products when
+         that is above 1.
+      5. Persist the new hashes in bulk after every chunk so the next run can
+         skip unchanged products.
+      6. Delete products that are no longer in the export from the eshop
+         (SYNC_DELETE_MISSING), unless more than SYNC_DELETE_MAX_RATIO of
+         the tracked SKUs are missing (reported as 'deletion_blocked').
+
+    If the eshop circuit breaker opens (the API keeps failing), the run stops
+    after the current chunk with status 'aborted: circuit open'. Progress is
+    checkpointed in a SyncRun after every chunk; a run restarted after a
+    crash or an abort continues after the last checkpoint (reported as
+    'resumed_from') as long as the export file has not changed.
+
+    Only one full, retry or sharded run executes at a time: a trigger that
+    arrives while another run holds the Redis 'sync' lock returns
+    {'status': 'already running', ...} without doing anything.
+
+    The result of a run that did any work carries 'timings': seconds spent
+    per stage (see integrator.timing). Every result is also sent through
+    the sync_finished signal.
     """
     logger.info("Starting ERP → eshop sync task.")
 
-    products = load_and_transform(settings.ERP_DATA_PATH)
-    logger.info("Loaded %d valid products from ERP data.", len(products))
+    with single_flight('sync') as acquired:
+        if not acquired:
+            return _finished(self.name, 'full', _already_running('sync'))
 
-    client = EshopClient()
-    sent = skipped = errors = 0
+        path = settings.ERP_DATA_PATH
+        unchanged_result, fingerprint = _check_export(path)
+        if unchanged_result is not None:
+            return _finished(self.name, 'full', unchanged_result)
 
-    for product in products:
-        sku = product['sku']
-        new_hash = compute_hash(product)
+        timer = StageTimer()
+        rate_limiter = build_rate_limiter(asynchronous=settings.SYNC_ENGINE == 'asyncio', scope='full')
+        export_skus = set()
+        result = _sync_products(
+            transform_and_hash(
+                path,
+                workers=settings.SYNC_TRANSFORM_WORKERS,
+                algorithm=settings.SYNC_HASH_ALGORITHM,
+                seen_skus=export_skus,
+                timer=timer,
+            ),
+            run=start_run(path, 'full'),
+            timer=timer,
+            rate_limiter=rate_limiter,
+        )
+        _remove_missing(result, export_skus, timer=timer, rate_limiter=rate_limiter)
 
-        try:
-            try:
-                state = ProductSyncState.objects.get(sku=sku)
-                is_new = False
-            except ProductSyncState.DoesNotExist:
-                state = None
-                is_new = True
-
-            if state is not None and state.content_hash == new_hash:
-                logger.debug("SKU %s unchanged – skipping.", sku)
-                skipped += 1
-                continue
-
-            client.send_product(product, is_new=is_new)
-
-            if state is None:
-                state = ProductSyncState(sku=sku)
-            state.content_hash = new_hash
-            state.synced_as_new = is_new
-            state.save()
-            sent += 1
-            logger.info("SKU %s %s successfully.", sku, 'created' if is_new else 'updated')
-
-        except Exception as exc:
-            errors += 1
-            logger.error("Failed to sync SKU %s: %s", sku, exc)
+        # Only a clean run may mark the export as done; failed SKUs and blocked deletions must be retried.
+        if (
+            fingerprint is not None
+            and result['status'] == 'completed'
+            and result['errors'] == 0
+            and 'deletion_blocked' not in result
+        ):
+            record_export(fingerprint)
+
+    logger.info(
+        "Sync %s. sent=%d, skipped=%d, errors=%d.",
+        result['status'], result['sent'], result['skipped'], result['errors'],
+    )
+    return _finished(self.name, 'full', result, timer)
+
+
+@shared_task(bind=True, name='integrator.retry_failed_syncs')
+def retry_failed_syncs_task(self):
+    """
+    Re-send the SKUs from the FailedSync dead-letter table that are due.
+
+    Scheduled every SYNC_RETRY_INTERVAL seconds by Celery beat. Up to
+    SYNC_RETRY_BATCH_SIZE due rows go through the same pipeline as a full
+    run (delta check, rate limiter, circuit breaker, batching) using their
+    stored payloads, so the export is not read. A success deletes the row;
+    another failure doubles the delay until the next attempt (from
+    SYNC_RETRY_BASE_DELAY up to SYNC_RETRY_MAX_DELAY). After
+    SYNC_RETRY_MAX_ATTEMPTS failures a SKU is left for the next full run.
+
+    It shares the 'sync' lock with sync_products_task and the sharded run,
+    so a failed SKU is never re-sent while a full run may be sending it too.
+    """
+    with single_flight('sync') as acquired:
+        if not acquired:
+            return _finished(self.name, 'retry', _already_running('sync'))
+
+        due = list(
+            FailedSync.objects
+            .filter(next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at')
+            .values_list('payload', flat=True)[:settings.SYNC_RETRY_BATCH_SIZE]
+        )
+        if not due:
+            return _finished(self.name, 'retry', {'status': 'completed', 'sent': 0, 'skipped': 0, 'errors': 0})
 
+        logger.info("Re-sending %d previously failed SKUs.", len(due))
+        timer = StageTimer()
+        hasher = get_hasher(settings.SYNC_HASH_ALGORITHM)
+        with timer.measure(HASH):
+            hashed = [(payload, hasher(payload)) for payload in due]
+        rate_limiter = build_rate_limiter(asynchronous=settings.SYNC_ENGINE == 'asyncio', scope='retry')
+        result = _sync_products(hashed, timer=timer, rate_limiter=rate_limiter)
     logger.info(
-        "Sync complete. sent=%d, skipped=%d, errors=%d.",
-        sent, skipped, errors,
+        "Retry of failed SKUs %s. sent=%d, skipped=%d, errors=%d.",
+        result['status'], result['sent'], result['skipped'], result['errors'],
     )
-    return {'sent': sent, 'skipped': skipped, 'errors': errors}
+    return _finished(self.name, 'retry', result, timer)
+
+
+def _sync_shard(shard_index: int, shard_count: int, scope: str) -> dict:
+    path = settings.ERP_DATA_PATH
+    timer = StageTimer()
+    rate_limiter = build_rate_limiter(shard_count, asynchronous=settings.SYNC_ENGINE == 'asyncio', scope=scope)
+    result = _sync_products(
+        _load_shard(path, shard_index, shard_count, timer=timer),
+        shard_count=shard_count,
+        run=start_run(path, scope),
+        timer=timer,
+        rate_limiter=rate_limiter,
+    )
+    result['timings'] = timer.as_dict()
+    return result
+
+
+@shared_task(bind=True, name='integrator.sync_products_shard')
+def sync_products_shard_task(self, shard_index: int, shard_count: int, lock_token: str = None):
+    """
+    Sync only the SKUs that hash into one shard.
+
+    Each shard streams the export itself (only shard numbers travel through
+    the broker). With the Redis rate limiter all shards draw from the one
+    global budget; with the local one each gets 1/shard_count of it.
+    A shard dispatched by sync_products_fanout_task joins the run's 'sync'
+    lock through `lock_token`; one started on its own takes the lock like
+    a full run. A shard that is already being synced by another task is not
+    started twice. Its result is not sent through sync_finished; the chord
+    callback announces the aggregated run.
+    """
+    logger.info("Starting sync of shard %d/%d.", shard_index + 1, shard_count)
+    scope = f'shard {shard_index}/{shard_count}'
+    lock_name = f'sync:{scope}'
+    with single_flight('sync', lock_token) as run_acquired:
+        if not run_acquired:
+            return _already_running('sync')
+        with single_flight(lock_name) as acquired:
+            if not acquired:
+                return _already_running(lock_name)
+            result = _sync_shard(shard_index, shard_count, scope)
+    logger.info(
+        "Shard %d/%d %s. sent=%d, skipped=%d, errors=%d.",
+        shard_index + 1, shard_count, result['status'], result['sent'], result['skipped'], result['errors'],
+    )
+    return result
+
+
+@shared_task(bind=True, name='integrator.aggregate_sync_results')
+def aggregate_sync_results(
+    self, results: list[dict], fingerprint: dict = None, lock_token: str = None,
+) -> dict:
+    """
+    Chord callback: sum per-shard counts into a single sync result.
+
+    Once every shard has completed, the products that left the export are
+    deleted here, in one pass over the sync state with the full rate budget
+    (the shards only send). `fingerprint` (ExportFingerprint.as_dict()) is
+    recorded when no shard reported errors and the deletions were not
+    blocked. If a shard did not complete (it was aborted or already
+    running), the whole run reports that shard's status and nothing is
+    deleted. Stage timings are summed over the shards; their 'total' is that
+    of the slowest shard, since shards run side by side, plus the deletion
+    stage. The run's 'sync' lock (`lock_token`) is released at the end.
+    """
+    try:
+        totals = _aggregate(results, fingerprint)
+    finally:
+        if lock_token:
+            release_run_lock('sync', lock_token)
+    return _finished(self.name, 'sharded', totals)
+
+
+def _remove_missing_after_shards(totals: dict):
+    """
+    Deletion stage of a sharded run, merged into `totals`.
+
+    The shards do not keep the export's SKUs, so the export is read once
+    more to collect them (no transform or hashing). Its timings are added
+    to the shards'.
+    """
+    if not settings.SYNC_DELETE_MISSING or totals['status'] != 'completed':
+        return
+    timer = StageTimer()
+    export_skus = set()
+    with timer.measure(LOAD):
+        for _ in iter_erp_data(settings.ERP_DATA_PATH, export_skus):
+            pass
+    _remove_missing(totals, export_skus, timer, build_rate_limiter())
+    if 'timings' in totals:
+        deletion = timer.as_dict()
+        totals['timings'] = {
+            stage: round(seconds + deletion.get(stage, 0.0), 3) for stage, seconds in totals['timings'].items()
+        }
+
+
+def _aggregate(results: list[dict], fingerprint: dict = None) -> dict:
+    totals = {'sent': 0, 'skipped': 0, 'errors': 0}
+    for result in results:
+        for key in totals:
+            totals[key] += result[key]
+    aborted = next((r['status'] for r in results if r.get('status', 'completed') != 'completed'), None)
+    totals = {'status': aborted or 'completed', **totals}
+    rates = [result['rate_limit'] for result in results if 'rate_limit' in result]
+    if rates:
+        totals['rate_limit'] = round(sum(rates), 2)
+    timings = [result['timings'] for result in results if 'timings' in result]
+    if timings:
+        totals['timings'] = {
+            stage: round(max(t[stage] for t in timings) if stage == 'total' else sum(t[stage] for t in timings), 3)
+            for stage in timings[0]
+        }
+    _remove_missing_after_shards(totals)
+    if fingerprint is not None and totals['status'] == 'completed' and totals['errors'] == 0 and 'deletion_blocked' not in totals:
+        record_export(ExportFingerprint(**fingerprint))
+    logger.info(
+        "Sharded sync %s. sent=%d, skipped=%d, errors=%d.",
+        totals['status'], totals['sent'], totals['skipped'], totals['errors'],
+    )
+    return totals
+
+
+@shared_task(bind=True, name='integrator.sync_products_fanout')
+def sync_products_fanout_task(self, shard_count: int = None):
+    """
+    Coordinator: fan the sync out to one subtask per SKU-hash shard.
+
+    The shards run as a chord whose callback aggregates their counts; the
+    coordinator replaces itself with that chord, so its result is the same
+    {'status', 'sent', 'skipped', 'errors'} dict that sync_products_task
+    returns. An unchanged export is detected once here, before any shard is
+    dispatched.
+
+    The coordinator takes the 'sync' lock for the whole run: the shards join
+    it while they work and the chord callback releases it, so neither a full
+    run nor a retry run starts until the sharded run is over. If a shard
+    crashes and the callback never runs, the lock expires after
+    SYNC_LOCK_TTL seconds.
+    """
+    lock_token = acquire_run_lock('sync')
+    if lock_token is None:
+        return _finished(self.name, 'sharded', _already_running('sync'))
+    try:
+        unchanged_result, fingerprint = _check_export(settings.ERP_DATA_PATH)
+        if unchanged_result is not None:
+            release_run_lock('sync', lock_token)
+            return _finished(self.name, 'sharded', unchanged_result)
+
+        shard_count = shard_count or settings.SYNC_SHARDS
+        logger.info("Dispatching ERP → eshop sync to %d shards.", shard_count)
+        workflow = chord(
+            (sync_products_shard_task.s(index, shard_count, lock_token=lock_token) for index in range(shard_count)),
+            aggregate_sync_results.s(
+                fingerprint=fingerprint.as_dict() if fingerprint else None,
+                lock_token=lock_token,
+            ),
+        )
+        return self.replace(workflow)
+    except Ignore:
+        # replace() raises Ignore once the chord is dispatched; the lock now belongs to it.
+        raise
+    except Exception:
+        release_run_lock('sync', lock_token)
+        raise
@@ -0,0 +1,58 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+# Stages reported in the 'timings' of a sync result, in pipeline order.
+LOAD = 'load'                        # reading and decoding the export, deduplication
+TRANSFORM = 'transform'              # ERP row -> eshop payload
+HASH = 'hash'                        # content hash and field digests
+DB_LOOKUP = 'db_lookup'              # per-chunk sync state prefetch
+RATE_LIMIT_WAIT = 'rate_limit_wait'  # blocked in the client-side rate limiter
+HTTP = 'http'                        # eshop request round trips
+THROTTLE_SLEEP = 'throttle_sleep'    # waiting after a 429
+RETRY_SLEEP = 'retry_sleep'          # backoff after a 5xx or a transport error
+DB_WRITE = 'db_write'                # sync state, dead-letter and checkpoint writes
+STAGES = (LOAD, TRANSFORM, HASH, DB_LOOKUP, RATE_LIMIT_WAIT, HTTP, THROTTLE_SLEEP, RETRY_SLEEP, DB_WRITE)
+
+
+class Span:
+    """Duration of one StageTimer.measure() block, known once the block exits."""
+
+    seconds = 0.0
+
+
+class StageTimer:
+    """
+    Thread-safe accumulator of the seconds a sync run spends per stage.
+
+    Time spent concurrently (several requests in flight, transform worker
+    processes) is summed, so stages can add up to more than the wall-clock
+    'total'.
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._seconds = defaultdict(float)
+        self._lock = Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._seconds[stage] += seconds
+
+    @contextmanager
+    def measure(self, stage: str):
+        span = Span()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - start
+            self.add(stage, span.seconds)
+
+    def as_dict(self) -> dict:
+        """Seconds per stage (every stage, rounded to ms) plus the wall-clock 'total' so far."""
+        with self._lock:
+            timings = {stage: round(self._seconds.get(stage, 0.0), 3) for stage in STAGES}
+        timings['total'] = round(time.perf_counter() - self._started, 3)
+        return timings
@@ -1,28 +1,120 @@
-import hashlib
 import json
 import logging
+import time
+from collections import deque
+from itertools import islice
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
+
+import billiard
+
+from .hashing import LEGACY_ALGORITHM, get_hasher, sha256_json_hash
+from .timing import HASH, LOAD, TRANSFORM, StageTimer
 
 logger = logging.getLogger(__name__)
 
 VAT_RATE = 0.21
+READ_CHUNK_SIZE = 64 * 1024  # characters read from disk per refill
+TRANSFORM_CHUNK_SIZE = 5000  # raw products per process-pool work item
+TIMING_FLUSH_INTERVAL = 1000  # products between hand-overs of stage times to the timer
 
 
-def load_erp_data(path) -> list[dict]:
-    """Load ERP JSON from disk and deduplicate by SKU (first occurrence wins)."""
+def iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """
+    Incrementally decode a top-level JSON array from a text file object.
+
+    Elements are yielded one at a time as soon as they are fully read, so only
+    the element being decoded (plus at most one read chunk) is held in memory,
+    regardless of the total file size. Malformed input raises
+    json.JSONDecodeError, just like json.load would.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def refill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return
+        # Drop the already consumed prefix so the buffer does not grow unbounded.
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def next_char() -> str:
+        """Skip whitespace and return the next significant char ('' at EOF)."""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ''
+            refill()
+
+    if next_char() != '[':
+        raise json.JSONDecodeError("Expecting '[' at start of ERP export", buffer, pos)
+    pos += 1
+
+    if next_char() == ']':
+        pos += 1
+    else:
+        while True:
+            if not next_char():
+                raise json.JSONDecodeError("Unterminated array", buffer, pos)
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                refill()
+                continue
+            if not eof and (end == len(buffer) or buffer[end] not in ' \t\r\n,]'):
+                # A scalar such as a number may continue in the next chunk.
+                refill()
+                continue
+
+            yield item
+            pos = end
+
+            sep = next_char()
+            if sep == ',':
+                pos += 1
+            elif sep == ']':
+                pos += 1
+                break
+            else:
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+
+    if next_char():
+        raise json.JSONDecodeError("Extra data", buffer, pos)
+
+
+def iter_erp_data(path, seen_skus: Optional[set] = None) -> Iterator[dict]:
+    """
+    Stream raw ERP products from disk, deduplicated by SKU (first occurrence wins).
+
+    Every SKU read – including products that later fail validation – is added
+    to `seen_skus`; pass a set to keep it once the export has been consumed.
+    """
+    if seen_skus is None:
+        seen_skus = set()
     with open(path, encoding='utf-8') as f:
-        raw_list = json.load(f)
+        for item in iter_json_array(f):
+            sku = item.get('id')
+            if sku in seen_skus:
+                logger.warning("Duplicate SKU %s – keeping first occurrence, skipping duplicate.", sku)
+                continue
+            seen_skus.add(sku)
+            yield item
 
-    seen_skus = {}
-    for item in raw_list:
-        sku = item.get('id')
-        if sku in seen_skus:
-            logger.warning("Duplicate SKU %s – keeping first occurrence, skipping duplicate.", sku)
-        else:
-            seen_skus[sku] = item
 
-    return list(seen_skus.values())
+def load_erp_data(path) -> list[dict]:
+    """Load ERP JSON from disk and deduplicate by SKU (first occurrence wins)."""
+    return list(iter_erp_data(path))
 
 
 def _parse_stock_value(value) -> int:
@@ -65,18 +157,142 @@ def transform_product(raw: dict) -> Optional[dict]:
     }
 
 
-def compute_hash(product: dict) -> str:
-    """Compute a stable SHA-256 hash of the product dict for delta sync."""
-    serialized = json.dumps(product, sort_keys=True, ensure_ascii=False)
-    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+def compute_hash(product: dict) -> bytes:
+    """Compute a stable SHA-256 digest of the product dict (the legacy delta-sync hash)."""
+    return sha256_json_hash(product)
 
 
-def load_and_transform(path) -> list[dict]:
-    """Convenience: load ERP data and return only valid transformed products."""
-    raw_products = load_erp_data(path)
+def load_and_transform(path) -> Iterator[dict]:
+    """
+    Stream ERP data and yield only valid transformed products.
+
+    This is a lazy pipeline on top of iter_erp_data(): products are read,
+    deduplicated and transformed one at a time, so peak memory does not depend
+    on the size of the export.
+    """
+    for raw in iter_erp_data(path):
+        transformed = transform_product(raw)
+        if transformed is not None:
+            yield transformed
+
+
+def _transform_and_hash_chunk(raw_products: list[dict], algorithm: str) -> tuple[list[tuple[dict, bytes]], float, float]:
+    """
+    Transform and hash one chunk of raw products (runs in a worker process).
+
+    Returns the (product, hash) pairs and the seconds spent transforming and
+    hashing them.
+    """
+    hasher = get_hasher(algorithm)
     result = []
+    transform_seconds = hash_seconds = 0.0
+    clock = time.perf_counter
     for raw in raw_products:
+        started = clock()
         transformed = transform_product(raw)
+        transformed_at = clock()
+        transform_seconds += transformed_at - started
         if transformed is not None:
-            result.append(transformed)
-    return result
+            result.append((transformed, hasher(transformed)))
+            hash_seconds += clock() - transformed_at
+    return result, transform_seconds, hash_seconds
+
+
+def _timed_transform_and_hash(raw_products, hasher, timer: StageTimer):
+    """Serial transform_and_hash loop that accounts load, transform and hash time to `timer`."""
+    clock = time.perf_counter
+    load_seconds = transform_seconds = hash_seconds = 0.0
+    count = 0
+    try:
+        mark = clock()
+        for raw in raw_products:
+            loaded_at = clock()
+            transformed = transform_product(raw)
+            transformed_at = clock()
+            load_seconds += loaded_at - mark
+            transform_seconds += transformed_at - loaded_at
+            mark = transformed_at
+            if transformed is None:
+                continue
+            content_hash = hasher(transformed)
+            hash_seconds += clock() - transformed_at
+            count += 1
+            if count % TIMING_FLUSH_INTERVAL == 0:
+                timer.add(LOAD, load_seconds)
+                timer.add(TRANSFORM, transform_seconds)
+                timer.add(HASH, hash_seconds)
+                load_seconds = transform_seconds = hash_seconds = 0.0
+            yield transformed, content_hash
+            # Time the consumer spends with the pair is not ours.
+            mark = clock()
+    finally:
+        timer.add(LOAD, load_seconds)
+        timer.add(TRANSFORM, transform_seconds)
+        timer.add(HASH, hash_seconds)
+
+
+def transform_and_hash(
+    path,
+    workers: int = 1,
+    raw_filter: Optional[Callable[[dict], bool]] = None,
+    chunk_size: int = TRANSFORM_CHUNK_SIZE,
+    algorithm: str = LEGACY_ALGORITHM,
+    seen_skus: Optional[set] = None,
+    timer: Optional[StageTimer] = None,
+) -> Iterator[tuple[dict, bytes]]:
+    """
+    Stream (transformed_product, content_hash) pairs for all valid products.
+
+    With workers > 1 the raw products are cut into chunks that are transformed
+    and hashed in a process pool. It is a billiard pool, which – unlike
+    concurrent.futures – may be started from a daemonic Celery prefork
+    worker process. Deduplication happens in this process before
+    chunking and results are yielded in the original order, so the
+    first-occurrence rule of iter_erp_data() still holds. At most 2 * workers
+    chunks are in flight, keeping memory bounded. `raw_filter`, if given,
+    selects which raw products to process at all; `algorithm` names the
+    hashing.HASH_ALGORITHMS entry used for the content hash. `seen_skus`
+    collects every SKU of the export, also those rejected by `raw_filter`
+    (see iter_erp_data). A `timer` receives the load, transform and hash
+    time (worker-process seconds when workers > 1).
+    """
+    raw_products = iter_erp_data(path, seen_skus)
+    if raw_filter is not None:
+        raw_products = filter(raw_filter, raw_products)
+
+    if workers <= 1:
+        hasher = get_hasher(algorithm)
+        if timer is not None:
+            yield from _timed_transform_and_hash(raw_products, hasher, timer)
+            return
+        for raw in raw_products:
+            transformed = transform_product(raw)
+            if transformed is not None:
+                yield transformed, hasher(transformed)
+        return
+
+    pool = billiard.Pool(processes=workers)
+    try:
+        in_flight = deque()
+        while True:
+            while len(in_flight) < 2 * workers:
+                loading_started = time.perf_counter()
+                chunk = list(islice(raw_products, chunk_size))
+                if timer is not None:
+                    timer.add(LOAD, time.perf_counter() - loading_started)
+                if not chunk:
+                    break
+                in_flight.append(pool.apply_async(_transform_and_hash_chunk, (chunk, algorithm)))
+            if not in_flight:
+                break
+            pairs, transform_seconds, hash_seconds = in_flight.popleft().get()
+            if timer is not None:
+                timer.add(TRANSFORM, transform_seconds)
+                timer.add(HASH, hash_seconds)
+            yield from pairs
+    finally:
+        # Let the workers finish the chunks in flight and exit on their own;
+        # terminate() (what the context manager does) signals them and can
+        # block forever joining a worker that did not exit.
+        pool.close()
+        pool.join()
@@ -0,0 +1,9 @@
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from .metrics import exposition
+
+
+def metrics(request):
+    """Prometheus scrape endpoint."""
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE_LATEST)
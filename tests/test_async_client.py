@@ -0,0 +1,266 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from integrator.async_client import AsyncEshopClient, AsyncRateLimiter, send_all_async
+from integrator.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+BASE_URL = 'https://api.fake-eshop.cz/v1'
+PRODUCT = {'sku': 'SKU-001', 'title': 'Kávovar', 'price': 15004.61, 'stock': 8, 'color': 'stříbrná'}
+
+
+@pytest.fixture(autouse=True)
+def override_settings(settings):
+    settings.ESHOP_API_BASE_URL = BASE_URL
+    settings.ESHOP_API_KEY = 'symma-secret-token'
+
+
+def make_client(*responses):
+    """Return (client, recorded_requests) answering with the given responses in order."""
+    requests_seen = []
+    queue = list(responses)
+
+    def handler(request):
+        requests_seen.append(request)
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    return AsyncEshopClient(transport=httpx.MockTransport(handler)), requests_seen
+
+
+async def send(client, product=PRODUCT, is_new=True, fields=None):
+    async with client:
+        return await client.send_product(product, is_new=is_new, fields=fields)
+
+
+# ---------------------------------------------------------------------------
+# POST / PATCH
+# ---------------------------------------------------------------------------
+
+class TestSendProduct:
+    def test_post_new_product(self):
+        client, seen = make_client(httpx.Response(201, json={}))
+        resp = asyncio.run(send(client))
+
+        assert resp.status_code == 201
+        assert seen[0].method == 'POST'
+        assert str(seen[0].url) == f'{BASE_URL}/products/'
+        assert seen[0].headers['X-Api-Key'] == 'symma-secret-token'
+        assert json.loads(seen[0].content) == PRODUCT
+
+    def test_patch_existing_product(self):
+        client, seen = make_client(httpx.Response(200, json={}))
+        asyncio.run(send(client, is_new=False))
+
+        assert seen[0].method == 'PATCH'
+        assert str(seen[0].url) == f"{BASE_URL}/products/{PRODUCT['sku']}/"
+
+    def test_patch_sends_only_requested_fields(self):
+        client, seen = make_client(httpx.Response(200, json={}))
+        asyncio.run(send(client, is_new=False, fields=['stock', 'price']))
+
+        assert json.loads(seen[0].content) == {'stock': 8, 'price': 15004.61}
+
+    def test_non_429_error_raises_immediately(self):
+        client, seen = make_client(httpx.Response(500))
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(send(client))
+        assert len(seen) == 1
+
+
+# ---------------------------------------------------------------------------
+# Retry on 429
+# ---------------------------------------------------------------------------
+
+class TestRetryOn429:
+    def test_retry_after_header_respected(self):
+        client, seen = make_client(
+            httpx.Response(429, headers={'Retry-After': '0'}),
+            httpx.Response(201, json={}),
+        )
+        with patch('integrator.async_client.asyncio.sleep') as mock_sleep:
+            resp = asyncio.run(send(client))
+
+        assert resp.status_code == 201
+        assert len(seen) == 2
+        mock_sleep.assert_called_once_with(0.0)
+
+    def test_exponential_backoff_when_no_retry_after(self):
+        client, _ = make_client(httpx.Response(429), httpx.Response(429), httpx.Response(201, json={}))
+        with patch('integrator.async_client.asyncio.sleep') as mock_sleep, \
+                patch('integrator.eshop_client.random.uniform', side_effect=lambda low, high: high):
+            asyncio.run(send(client))
+
+        assert [call.args[0] for call in mock_sleep.call_args_list] == [1.0, 2.0]
+
+    def test_raises_after_max_retries_exceeded(self):
+        client, _ = make_client(httpx.Response(429))
+        with patch('integrator.async_client.asyncio.sleep'):
+            with pytest.raises(RuntimeError, match='rate limiting'):
+                asyncio.run(send(client))
+
+
+# ---------------------------------------------------------------------------
+# Retry on transient 5xx and transport errors
+# ---------------------------------------------------------------------------
+
+class TestTransientErrors:
+    def test_transient_status_is_retried(self):
+        client, seen = make_client(httpx.Response(503), httpx.Response(201, json={}))
+        with patch('integrator.async_client.asyncio.sleep'):
+            resp = asyncio.run(send(client))
+
+        assert resp.status_code == 201
+        assert len(seen) == 2
+
+    def test_transport_error_is_retried(self):
+        attempts = []
+
+        def handler(request):
+            attempts.append(request)
+            if len(attempts) == 1:
+                raise httpx.ReadTimeout('slow', request=request)
+            return httpx.Response(200, json={})
+
+        client = AsyncEshopClient(transport=httpx.MockTransport(handler))
+        with patch('integrator.async_client.asyncio.sleep'):
+            resp = asyncio.run(send(client, is_new=False))
+
+        assert resp.status_code == 200
+        assert len(attempts) == 2
+
+    def test_existing_sku_is_updated_instead_of_created(self):
+        client, seen = make_client(httpx.Response(409), httpx.Response(200, json={}))
+        resp = asyncio.run(send(client))
+
+        assert resp.status_code == 200
+        assert [request.method for request in seen] == ['POST', 'PATCH']
+
+    def test_read_timeout_is_not_retried_for_post(self):
+        attempts = []
+
+        def handler(request):
+            attempts.append(request)
+            raise httpx.ReadTimeout('slow', request=request)
+
+        client = AsyncEshopClient(transport=httpx.MockTransport(handler))
+        with patch('integrator.async_client.asyncio.sleep'):
+            with pytest.raises(httpx.ReadTimeout):
+                asyncio.run(send(client))
+
+        assert len(attempts) == 1
+
+    def test_transport_error_is_raised_when_attempts_run_out(self):
+        def handler(request):
+            raise httpx.ConnectError('refused', request=request)
+
+        client = AsyncEshopClient(transport=httpx.MockTransport(handler))
+        with patch('integrator.async_client.asyncio.sleep'):
+            with pytest.raises(httpx.ConnectError):
+                asyncio.run(send(client))
+
+    def test_open_circuit_fails_fast(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(503)
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        client = AsyncEshopClient(transport=httpx.MockTransport(handler), circuit_breaker=breaker)
+
+        async def run():
+            async with client:
+                with pytest.raises(httpx.HTTPStatusError):
+                    await client.send_product(PRODUCT, is_new=True)
+                with pytest.raises(CircuitOpenError):
+                    await client.send_product(PRODUCT, is_new=True)
+
+        with patch('integrator.async_client.asyncio.sleep'):
+            asyncio.run(run())
+        assert len(seen) == 2
+
+    def test_cancelled_probe_does_not_leave_circuit_half_open(self):
+        def handler(request):
+            raise httpx.ConnectError('refused', request=request)
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        client = AsyncEshopClient(transport=httpx.MockTransport(handler), circuit_breaker=breaker)
+
+        async def run():
+            async with client:
+                with pytest.raises(httpx.ConnectError):
+                    await client.send_product(PRODUCT, is_new=True)
+                with patch.object(client._client, 'request', side_effect=asyncio.CancelledError):
+                    with pytest.raises(asyncio.CancelledError):
+                        await client.send_product(PRODUCT, is_new=True)
+
+        asyncio.run(run())
+        assert breaker.is_open
+
+    def test_client_has_connect_and_read_timeouts(self, settings):
+        settings.ESHOP_CONNECT_TIMEOUT = 2
+        settings.ESHOP_READ_TIMEOUT = 7
+        client = AsyncEshopClient()
+        timeout = client._client.timeout
+        asyncio.run(client.aclose())
+
+        assert (timeout.connect, timeout.read) == (2, 7)
+
+
+# ---------------------------------------------------------------------------
+# AsyncRateLimiter and driver
+# ---------------------------------------------------------------------------
+
+class TestAsyncRateLimiter:
+    def test_sixth_acquire_waits_for_new_window(self):
+        async def run():
+            limiter = AsyncRateLimiter(rate=5)
+            for _ in range(5):
+                await limiter.acquire()
+            start = time.monotonic()
+            await limiter.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(run()) >= 0.9
+
+
+class TestSendAllAsync:
+    def test_reports_each_job_outcome(self):
+        def handler(request):
+            sku = json.loads(request.content)['sku']
+            return httpx.Response(500 if sku == 'SKU-BAD' else 201, json={})
+
+        jobs = [(dict(PRODUCT, sku=sku), b'hash', True, None) for sku in ('SKU-1', 'SKU-BAD', 'SKU-2')]
+
+        async def run():
+            async with AsyncEshopClient(transport=httpx.MockTransport(handler)) as client:
+                return await send_all_async(client, jobs, max_in_flight=2)
+
+        outcomes = {job[0]['sku']: exc for job, exc in asyncio.run(run())}
+        assert outcomes['SKU-1'] is None and outcomes['SKU-2'] is None
+        assert isinstance(outcomes['SKU-BAD'], httpx.HTTPStatusError)
+
+    def test_batches_jobs_into_bulk_requests(self):
+        seen = []
+
+        def handler(request):
+            operations = json.loads(request.content)['operations']
+            seen.append(len(operations))
+            return httpx.Response(200, json={'results': [
+                {'status': 422 if op['body']['sku'] == 'SKU-BAD' else 201} for op in operations
+            ]})
+
+        jobs = [(dict(PRODUCT, sku=sku), b'hash', True, None) for sku in ('SKU-1', 'SKU-BAD', 'SKU-2', 'SKU-3', 'SKU-4')]
+
+        async def run():
+            async with AsyncEshopClient(transport=httpx.MockTransport(handler)) as client:
+                return await send_all_async(client, jobs, max_in_flight=2, batch_size=2)
+
+        outcomes = {job[0]['sku']: exc for job, exc in asyncio.run(run())}
+        assert sorted(seen) == [1, 2, 2]
+        assert [sku for sku, exc in outcomes.items() if exc is not None] == ['SKU-BAD']
+        assert len(outcomes) == 5
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from integrator.benchmark import format_result, run_benchmark
+from integrator.models import ProductSyncState
+from integrator.synthetic import ExportSpec
+
+STAGES = ['load_and_transform', 'hash (blake2b)', 'sync run']
+
+
+@pytest.mark.django_db
+def test_every_stage_is_measured_per_size():
+    spec = ExportSpec(invalid_price_rate=0, duplicate_rate=0)
+    results = run_benchmark(sizes=[50, 120], spec=spec, client_limit=30)
+
+    assert [(r.size, r.stage) for r in results] == [(size, stage) for size in (50, 120) for stage in STAGES]
+    assert [r.items for r in results if r.size == 120] == [120, 120, 120]
+    assert all(r.seconds > 0 and r.peak_memory > 0 for r in results)
+    assert '/s' in format_result(results[0])
+
+
+@pytest.mark.django_db
+def test_sync_run_sends_new_products_and_times_every_stage():
+    spec = ExportSpec(invalid_price_rate=0, duplicate_rate=0)
+    run = run_benchmark(sizes=[200], spec=spec, memory=False, client_limit=5)[-1]
+
+    assert (run.stage, run.items, run.errors) == ('sync run', 200, 0)
+    assert run.timings['http'] > 0 and run.timings['db_write'] > 0 and run.timings['db_lookup'] > 0
+    assert 'db_write' in format_result(run)
+
+
+@pytest.mark.django_db
+def test_benchmark_leaves_no_sync_state_behind():
+    run_benchmark(sizes=[40], memory=False, client_limit=5)
+
+    assert not ProductSyncState.objects.exists()
+
+
+@pytest.mark.django_db
+def test_benchmark_command_writes_json(tmp_path, capsys):
+    path = tmp_path / 'bench.json'
+
+    call_command('benchmark_sync', '--sizes', '30', '--no-memory', '--client-limit', '5', '--json', str(path))
+
+    results = json.loads(path.read_text(encoding='utf-8'))
+    assert [result['stage'] for result in results] == STAGES
+    assert all(result['peak_memory'] is None and result['throughput'] > 0 for result in results)
+    assert 'sync run' in capsys.readouterr().out
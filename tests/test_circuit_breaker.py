@@ -0,0 +1,85 @@
+import pytest
+
+from integrator.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('integrator.circuit_breaker.time.monotonic', lambda: now[0])
+    return now
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.before_request()
+        breaker.record_failure()
+
+
+# ---------------------------------------------------------------------------
+# Closed → open
+# ---------------------------------------------------------------------------
+
+class TestOpening:
+    def test_opens_after_consecutive_failures(self, clock):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        fail(breaker, 2)
+        assert breaker.state == CLOSED
+
+        fail(breaker, 1)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
+    def test_success_resets_failure_count(self, clock):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        fail(breaker, 2)
+        breaker.record_success()
+        fail(breaker, 2)
+        assert breaker.state == CLOSED
+
+    def test_zero_threshold_disables_breaker(self, clock):
+        breaker = CircuitBreaker(failure_threshold=0, reset_timeout=30)
+        fail(breaker, 100)
+        assert breaker.state == CLOSED
+
+
+# ---------------------------------------------------------------------------
+# Open → half-open probe
+# ---------------------------------------------------------------------------
+
+class TestProbe:
+    def test_single_probe_after_cool_down(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        fail(breaker, 1)
+
+        clock[0] += 29
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+
+        clock[0] += 1
+        breaker.before_request()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()   # only one probe at a time
+
+    def test_successful_probe_closes_circuit(self, clock):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        fail(breaker, 1)
+        clock[0] += 30
+        breaker.before_request()
+        breaker.record_success()
+
+        assert breaker.state == CLOSED
+        breaker.before_request()
+
+    def test_failed_probe_reopens_for_another_cool_down(self, clock):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        fail(breaker, 5)
+        clock[0] += 30
+        fail(breaker, 1)
+
+        assert breaker.state == OPEN
+        clock[0] += 29
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
@@ -1,13 +1,15 @@
 import json
 import threading
 import time
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 import requests
 import responses as responses_lib
 
-from integrator.eshop_client import EshopClient, RateLimiter
+from integrator.circuit_breaker import CircuitBreaker, CircuitOpenError
+from integrator.eshop_client import BatchItemError, EshopClient, RateLimiter, RetryPolicy
+from integrator.timing import StageTimer
 
 BASE_URL = 'https://api.fake-eshop.cz/v1'
 PRODUCT = {'sku': 'SKU-001', 'title': 'Kávovar', 'price': 15004.61, 'stock': 8, 'color': 'stříbrná'}
@@ -62,6 +64,121 @@ class TestPatchExistingProduct:
         client.send_product(PRODUCT, is_new=False)
         assert responses_lib.calls[0].request.headers['X-Api-Key'] == 'symma-secret-token'
 
+    @responses_lib.activate
+    def test_patch_sends_only_requested_fields(self):
+        sku = PRODUCT['sku']
+        responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/{sku}/', json={}, status=200)
+        client = EshopClient()
+        client.send_product(PRODUCT, is_new=False, fields=['stock'])
+        assert json.loads(responses_lib.calls[0].request.body) == {'stock': 8}
+        assert responses_lib.calls[0].request.url == f'{BASE_URL}/products/{sku}/'
+
+    @responses_lib.activate
+    def test_post_ignores_fields(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+        client = EshopClient()
+        client.send_product(PRODUCT, is_new=True, fields=['stock'])
+        assert json.loads(responses_lib.calls[0].request.body) == PRODUCT
+
+
+# ---------------------------------------------------------------------------
+# Bulk upsert – send_products
+# ---------------------------------------------------------------------------
+
+class TestSendProducts:
+    BATCH = [
+        (PRODUCT, True, None),
+        (dict(PRODUCT, sku='SKU-002'), False, ['stock']),
+        (dict(PRODUCT, sku='SKU-003'), False, None),
+    ]
+
+    @responses_lib.activate
+    def test_one_request_carries_all_operations(self):
+        responses_lib.add(
+            responses_lib.POST, f'{BASE_URL}/products/batch/',
+            json={'results': [{'status': 201}, {'status': 200}, {'status': 200}]},
+        )
+        outcomes = EshopClient().send_products(self.BATCH)
+
+        assert outcomes == [None, None, None]
+        assert len(responses_lib.calls) == 1
+        assert json.loads(responses_lib.calls[0].request.body) == {'operations': [
+            {'method': 'POST', 'path': '/products/', 'body': PRODUCT},
+            {'method': 'PATCH', 'path': '/products/SKU-002/', 'body': {'stock': 8}},
+            {'method': 'PATCH', 'path': '/products/SKU-003/', 'body': dict(PRODUCT, sku='SKU-003')},
+        ]}
+
+    @responses_lib.activate
+    def test_partial_failure_is_reported_per_item(self):
+        responses_lib.add(
+            responses_lib.POST, f'{BASE_URL}/products/batch/',
+            json={'results': [{'status': 201}, {'status': 422, 'error': 'negative stock'}, {'status': 200}]},
+        )
+        outcomes = EshopClient().send_products(self.BATCH)
+
+        assert outcomes[0] is None and outcomes[2] is None
+        assert isinstance(outcomes[1], BatchItemError)
+        assert (outcomes[1].sku, outcomes[1].status, outcomes[1].detail) == ('SKU-002', 422, 'negative stock')
+
+    @responses_lib.activate
+    def test_batch_is_retried_as_a_whole_on_429(self):
+        url = f'{BASE_URL}/products/batch/'
+        responses_lib.add(responses_lib.POST, url, status=429, headers={'Retry-After': '0'})
+        responses_lib.add(responses_lib.POST, url, json={'results': [{'status': 201}] * 3})
+
+        with patch('integrator.eshop_client.time.sleep'):
+            outcomes = EshopClient().send_products(self.BATCH)
+
+        assert outcomes == [None, None, None]
+        assert len(responses_lib.calls) == 2
+
+    @responses_lib.activate
+    def test_malformed_response_raises(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/batch/', json={'results': [{'status': 201}]})
+        with pytest.raises(RuntimeError, match='Malformed batch response'):
+            EshopClient().send_products(self.BATCH)
+
+
+# ---------------------------------------------------------------------------
+# DELETE – products that left the ERP export
+# ---------------------------------------------------------------------------
+
+class TestRemoveProducts:
+    @responses_lib.activate
+    def test_delete_sends_to_correct_url(self):
+        responses_lib.add(responses_lib.DELETE, f'{BASE_URL}/products/SKU-001/', status=204)
+        EshopClient().remove_product('SKU-001')
+
+        assert responses_lib.calls[0].request.method == 'DELETE'
+        assert responses_lib.calls[0].request.headers['X-Api-Key'] == 'symma-secret-token'
+
+    @responses_lib.activate
+    def test_already_deleted_product_counts_as_removed(self):
+        responses_lib.add(responses_lib.DELETE, f'{BASE_URL}/products/SKU-001/', status=404)
+        EshopClient().remove_product('SKU-001')
+
+    @responses_lib.activate
+    def test_other_errors_raise(self):
+        responses_lib.add(responses_lib.DELETE, f'{BASE_URL}/products/SKU-001/', status=403)
+        with pytest.raises(requests.HTTPError):
+            EshopClient().remove_product('SKU-001')
+
+    @responses_lib.activate
+    def test_bulk_delete_reports_per_sku(self):
+        responses_lib.add(
+            responses_lib.POST, f'{BASE_URL}/products/batch/',
+            json={'results': [{'status': 204}, {'status': 404}, {'status': 409, 'error': 'has open orders'}]},
+        )
+        outcomes = EshopClient().remove_products(['SKU-001', 'SKU-002', 'SKU-003'])
+
+        assert outcomes[:2] == [None, None]
+        assert (outcomes[2].sku, outcomes[2].status) == ('SKU-003', 409)
+        assert json.loads(responses_lib.calls[0].request.body) == {'operations': [
+            {'method': 'DELETE', 'path': '/products/SKU-001/'},
+            {'method': 'DELETE', 'path': '/products/SKU-002/'},
+            {'method': 'DELETE', 'path': '/products/SKU-003/'},
+        ]}
+
 
 # ---------------------------------------------------------------------------
 # Retry on 429
@@ -93,7 +210,8 @@ class TestRetryOn429:
         responses_lib.add(responses_lib.POST, url, status=429)
         responses_lib.add(responses_lib.POST, url, json={}, status=201)
 
-        with patch('integrator.eshop_client.time.sleep') as mock_sleep:
+        # Full jitter draws from [0, 1 s], then [0, 2 s]; take the upper bounds.
+        with patch('integrator.eshop_client.time.sleep') as mock_sleep, patch('integrator.eshop_client.random.uniform', side_effect=lambda low, high: high):
             client = EshopClient()
             resp = client.send_product(PRODUCT, is_new=True)
 
@@ -113,6 +231,57 @@ class TestRetryOn429:
             with pytest.raises(RuntimeError, match='rate limiting'):
                 client.send_product(PRODUCT, is_new=True)
 
+
+# ---------------------------------------------------------------------------
+# Stage timings
+# ---------------------------------------------------------------------------
+
+class TestStageTimings:
+    @responses_lib.activate
+    def test_requests_and_waits_are_timed_per_stage(self):
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, status=429, headers={'Retry-After': '2'})
+        responses_lib.add(responses_lib.POST, url, status=503, headers={'Retry-After': '3'})
+        responses_lib.add(responses_lib.POST, url, json={}, status=201)
+
+        timer = StageTimer()
+        with patch('integrator.eshop_client.time.sleep'):
+            EshopClient(timer=timer).send_product(PRODUCT, is_new=True)
+
+        timings = timer.as_dict()
+        assert (timings['throttle_sleep'], timings['retry_sleep']) == (2.0, 3.0)
+        assert timings['http'] > 0
+        assert timings['rate_limit_wait'] >= 0
+
+# ---------------------------------------------------------------------------
+# Rate limiter feedback (adaptive rate control)
+# ---------------------------------------------------------------------------
+
+class TestRateLimiterFeedback:
+    @responses_lib.activate
+    def test_429_and_success_are_reported_to_rate_limiter(self):
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, status=429, headers={'Retry-After': '3'})
+        responses_lib.add(responses_lib.POST, url, json={}, status=201)
+        limiter = MagicMock()
+
+        with patch('integrator.eshop_client.time.sleep'):
+            EshopClient(rate_limiter=limiter).send_product(PRODUCT, is_new=True)
+
+        limiter.on_throttle.assert_called_once_with(3.0)
+        limiter.on_success.assert_called_once_with()
+
+    @responses_lib.activate
+    def test_errors_are_not_reported_as_success(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=400)
+        limiter = MagicMock()
+
+        with pytest.raises(requests.HTTPError):
+            EshopClient(rate_limiter=limiter).send_product(PRODUCT, is_new=True)
+
+        limiter.on_success.assert_not_called()
+
+
 # ---------------------------------------------------------------------------
 # Rate limiting – 5 req/s
 # ---------------------------------------------------------------------------
@@ -168,6 +337,205 @@ class TestRateLimiting:
         assert elapsed < 0.1, f"Request in new window should be immediate, got {elapsed:.2f}s"
 
 
+# ---------------------------------------------------------------------------
+# Retry on transient 5xx and transport errors
+# ---------------------------------------------------------------------------
+
+class TestTransientErrors:
+    @pytest.mark.parametrize('status_code', [502, 503, 504])
+    @responses_lib.activate
+    def test_transient_status_is_retried(self, status_code):
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, status=status_code)
+        responses_lib.add(responses_lib.POST, url, json={}, status=201)
+
+        with patch('integrator.eshop_client.time.sleep'):
+            resp = EshopClient().send_product(PRODUCT, is_new=True)
+
+        assert resp.status_code == 201
+        assert len(responses_lib.calls) == 2
+
+    @responses_lib.activate
+    def test_persistent_5xx_raises_http_error_after_max_attempts(self):
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, status=503)
+
+        with patch('integrator.eshop_client.time.sleep'):
+            with pytest.raises(requests.HTTPError):
+                EshopClient().send_product(PRODUCT, is_new=True)
+
+        assert len(responses_lib.calls) == 3
+
+    @responses_lib.activate
+    def test_retry_statuses_are_configurable(self, settings):
+        settings.ESHOP_RETRY_STATUSES = [500]
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, status=500)
+        responses_lib.add(responses_lib.POST, url, json={}, status=201)
+
+        with patch('integrator.eshop_client.time.sleep'):
+            EshopClient().send_product(PRODUCT, is_new=True)
+
+        assert len(responses_lib.calls) == 2
+
+    @pytest.mark.parametrize('error', [requests.ConnectionError('reset'), requests.ConnectTimeout('slow')])
+    @responses_lib.activate
+    def test_transport_errors_are_retried(self, error):
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, body=error)
+        responses_lib.add(responses_lib.POST, url, json={}, status=201)
+
+        with patch('integrator.eshop_client.time.sleep'):
+            resp = EshopClient().send_product(PRODUCT, is_new=True)
+
+        assert resp.status_code == 201
+
+    @responses_lib.activate
+    def test_existing_sku_is_updated_instead_of_created(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=409)
+        responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
+
+        resp = EshopClient().send_product(PRODUCT, is_new=True)
+
+        assert resp.status_code == 200
+        assert json.loads(responses_lib.calls[1].request.body) == PRODUCT
+
+    @responses_lib.activate
+    def test_existing_skus_in_batch_are_updated_instead_of_created(self):
+        url = f'{BASE_URL}/products/batch/'
+        responses_lib.add(responses_lib.POST, url, json={'results': [{'status': 201}, {'status': 409}]})
+        responses_lib.add(responses_lib.POST, url, json={'results': [{'status': 200}]})
+        other = dict(PRODUCT, sku='SKU-002')
+
+        outcomes = EshopClient().send_products([(PRODUCT, True, None), (other, True, None)])
+
+        assert outcomes == [None, None]
+        retry = json.loads(responses_lib.calls[1].request.body)
+        assert retry == {'operations': [{'method': 'PATCH', 'path': '/products/SKU-002/', 'body': other}]}
+
+    @responses_lib.activate
+    def test_read_timeout_is_retried_for_patch(self):
+        url = f'{BASE_URL}/products/SKU-001/'
+        responses_lib.add(responses_lib.PATCH, url, body=requests.ReadTimeout('slow'))
+        responses_lib.add(responses_lib.PATCH, url, json={}, status=200)
+
+        with patch('integrator.eshop_client.time.sleep'):
+            resp = EshopClient().send_product(PRODUCT, is_new=False)
+
+        assert resp.status_code == 200
+
+    @responses_lib.activate
+    def test_read_timeout_is_not_retried_for_post(self):
+        # The eshop may have created the product already; a second POST would only get 409.
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', body=requests.ReadTimeout('slow'))
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/batch/', body=requests.ReadTimeout('slow'))
+
+        with patch('integrator.eshop_client.time.sleep'):
+            with pytest.raises(requests.ReadTimeout):
+                EshopClient().send_product(PRODUCT, is_new=True)
+            with pytest.raises(requests.ReadTimeout):
+                EshopClient().send_products([(PRODUCT, False, None)])
+
+        assert len(responses_lib.calls) == 2
+
+    @responses_lib.activate
+    def test_transport_error_is_raised_when_attempts_run_out(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', body=requests.ConnectTimeout('down'))
+
+        with patch('integrator.eshop_client.time.sleep'):
+            with pytest.raises(requests.ConnectTimeout):
+                EshopClient().send_product(PRODUCT, is_new=True)
+
+        assert len(responses_lib.calls) == 3
+
+    @responses_lib.activate
+    def test_no_retry_past_time_budget(self):
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, status=503, headers={'Retry-After': '10'})
+
+        with patch('integrator.eshop_client.time.sleep') as mock_sleep:
+            with pytest.raises(requests.HTTPError):
+                EshopClient(retry_policy=RetryPolicy(budget=5)).send_product(PRODUCT, is_new=True)
+
+        mock_sleep.assert_not_called()
+        assert len(responses_lib.calls) == 1
+
+    def test_backoff_uses_full_jitter_with_cap(self):
+        policy = RetryPolicy()
+        waits = [policy.backoff(attempt) for attempt in range(1, 10) for _ in range(20)]
+        assert all(0 <= wait <= 30.0 for wait in waits)
+        assert len(set(waits)) > 1
+
+    def test_requests_use_connect_and_read_timeouts(self, settings):
+        settings.ESHOP_CONNECT_TIMEOUT = 2
+        settings.ESHOP_READ_TIMEOUT = 7
+        client = EshopClient()
+        with patch.object(client._session, 'request') as mock_request:
+            mock_request.return_value.status_code = 201
+            client.send_product(PRODUCT, is_new=True)
+
+        assert mock_request.call_args.kwargs['timeout'] == (2, 7)
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+class TestCircuitBreaker:
+    @responses_lib.activate
+    def test_open_circuit_fails_fast_without_request(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=503)
+        client = EshopClient(circuit_breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+
+        with patch('integrator.eshop_client.time.sleep'):
+            with pytest.raises(requests.HTTPError):
+                client.send_product(PRODUCT, is_new=True)
+            with pytest.raises(CircuitOpenError):
+                client.send_product(PRODUCT, is_new=True)
+
+        assert len(responses_lib.calls) == 3
+
+    @responses_lib.activate
+    def test_opening_circuit_stops_retrying(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', body=requests.ConnectionError('down'))
+        client = EshopClient(circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+        with patch('integrator.eshop_client.time.sleep') as mock_sleep:
+            with pytest.raises(requests.ConnectionError):
+                client.send_product(PRODUCT, is_new=True)
+
+        assert len(responses_lib.calls) == 2
+        assert mock_sleep.call_count == 1
+
+    @responses_lib.activate
+    def test_probe_failing_with_other_error_reopens_circuit(self):
+        url = f'{BASE_URL}/products/'
+        responses_lib.add(responses_lib.POST, url, body=requests.ConnectionError('down'))
+        responses_lib.add(responses_lib.POST, url, body=requests.exceptions.ChunkedEncodingError('truncated'))
+        responses_lib.add(responses_lib.POST, url, json={}, status=201)
+        client = EshopClient(circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+
+        with pytest.raises(requests.ConnectionError):
+            client.send_product(PRODUCT, is_new=True)
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            client.send_product(PRODUCT, is_new=True)
+        assert client.circuit_breaker.is_open
+
+        client.send_product(PRODUCT, is_new=True)
+        assert client.circuit_breaker.state == 'closed'
+
+    @responses_lib.activate
+    def test_client_errors_do_not_open_circuit(self):
+        responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=400)
+        client = EshopClient(circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+        for _ in range(3):
+            with pytest.raises(requests.HTTPError):
+                client.send_product(PRODUCT, is_new=True)
+
+        assert not client.circuit_breaker.is_open
+
+
 # ---------------------------------------------------------------------------
 # (1) HTTP chyby mimo 429 – okamžité vyhodenie bez retryu
 # ---------------------------------------------------------------------------
@@ -228,7 +596,7 @@ class TestInvalidRetryAfterHeader:
         )
         responses_lib.add(responses_lib.POST, url, json={}, status=201)
 
-        with patch('integrator.eshop_client.time.sleep') as mock_sleep:
+        with patch('integrator.eshop_client.time.sleep') as mock_sleep, patch('integrator.eshop_client.random.uniform', side_effect=lambda low, high: high):
             client = EshopClient()
             resp = client.send_product(PRODUCT, is_new=True)
 
@@ -0,0 +1,156 @@
+import os
+import time
+import uuid
+
+import pytest
+import redis
+
+from integrator.locking import LOCK_PREFIX, RedisLock, acquire_run_lock, release_run_lock, single_flight
+
+REDIS_URL = os.environ.get('TEST_REDIS_URL', os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+
+
+@pytest.fixture()
+def redis_client():
+    """Client for a local Redis; tests using it are skipped when none is running."""
+    client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip(f"Redis not reachable at {REDIS_URL}")
+    yield client
+    client.close()
+
+
+@pytest.fixture()
+def name(redis_client):
+    name = f'test:{uuid.uuid4().hex}'
+    yield name
+    redis_client.delete(LOCK_PREFIX + name)
+
+
+# ---------------------------------------------------------------------------
+# RedisLock
+# ---------------------------------------------------------------------------
+
+class TestRedisLock:
+    def test_second_owner_is_refused_until_release(self, redis_client, name):
+        first = RedisLock(redis_client, name, ttl=5)
+        second = RedisLock(redis_client, name, ttl=5)
+
+        assert first.acquire()
+        assert not second.acquire()
+        first.release()
+        assert second.acquire()
+        second.release()
+
+    def test_heartbeat_keeps_lock_past_its_ttl(self, redis_client, name):
+        lock = RedisLock(redis_client, name, ttl=0.3)
+        assert lock.acquire()
+        time.sleep(0.8)
+
+        assert redis_client.exists(LOCK_PREFIX + name)
+        lock.release()
+        assert not redis_client.exists(LOCK_PREFIX + name)
+
+    def test_lock_of_dead_owner_expires(self, redis_client, name):
+        # A crashed worker leaves the key without a heartbeat.
+        redis_client.set(LOCK_PREFIX + name, 'dead-owner', px=200)
+        lock = RedisLock(redis_client, name, ttl=5)
+
+        assert not lock.acquire()
+        time.sleep(0.3)
+        assert lock.acquire()
+        lock.release()
+
+    def test_release_does_not_delete_another_owners_lock(self, redis_client, name):
+        lock = RedisLock(redis_client, name, ttl=5)
+        assert lock.acquire()
+        redis_client.set(LOCK_PREFIX + name, 'new-owner')   # ours expired and was taken over
+
+        lock.release()
+
+        assert redis_client.get(LOCK_PREFIX + name) == b'new-owner'
+
+    def test_join_shares_lock_with_same_token_only(self, redis_client, name):
+        owner = RedisLock(redis_client, name, ttl=5)
+        assert owner.acquire()
+        owner.detach()
+
+        shard = RedisLock(redis_client, name, ttl=5, token=owner.token)
+        assert shard.join()
+        assert not RedisLock(redis_client, name, ttl=5).join()
+        shard.detach()
+        assert redis_client.get(LOCK_PREFIX + name) == owner.token.encode()
+        owner.release()
+
+    def test_join_retakes_expired_lock(self, redis_client, name):
+        lock = RedisLock(redis_client, name, ttl=5, token='run-token')
+
+        assert lock.join()
+        assert redis_client.get(LOCK_PREFIX + name) == b'run-token'
+        lock.release()
+
+    def test_unreachable_redis_does_not_block_the_run(self):
+        client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        lock = RedisLock(client, 'unreachable', ttl=5)
+
+        assert lock.acquire()
+        lock.release()
+
+
+# ---------------------------------------------------------------------------
+# single_flight
+# ---------------------------------------------------------------------------
+
+class TestSingleFlight:
+    def test_nested_trigger_is_refused(self, settings, name):
+        settings.SYNC_LOCK_ENABLED = True
+        settings.SYNC_LOCK_REDIS_URL = REDIS_URL
+
+        with single_flight(name) as first:
+            with single_flight(name) as second:
+                assert (first, second) == (True, False)
+        with single_flight(name) as again:
+            assert again
+
+    def test_lock_released_when_run_fails(self, settings, redis_client, name):
+        settings.SYNC_LOCK_ENABLED = True
+        settings.SYNC_LOCK_REDIS_URL = REDIS_URL
+
+        with pytest.raises(RuntimeError):
+            with single_flight(name):
+                raise RuntimeError("boom")
+
+        assert not redis_client.exists(LOCK_PREFIX + name)
+
+    def test_disabled_lock_always_runs(self, settings, name):
+        settings.SYNC_LOCK_ENABLED = False
+
+        with single_flight(name) as first, single_flight(name) as second:
+            assert first and second
+
+
+# ---------------------------------------------------------------------------
+# Run lock spanning several tasks
+# ---------------------------------------------------------------------------
+
+class TestRunLock:
+    def test_tasks_of_the_run_join_and_others_are_refused(self, settings, redis_client, name):
+        settings.SYNC_LOCK_ENABLED = True
+        settings.SYNC_LOCK_REDIS_URL = REDIS_URL
+
+        token = acquire_run_lock(name)
+        assert acquire_run_lock(name) is None
+        with single_flight(name, token) as first, single_flight(name, token) as second:
+            assert first and second
+        with single_flight(name) as other:
+            assert not other
+
+        release_run_lock(name, token)
+        assert not redis_client.exists(LOCK_PREFIX + name)
+
+    def test_disabled_run_lock_always_runs(self, settings, name):
+        settings.SYNC_LOCK_ENABLED = False
+
+        assert acquire_run_lock(name) and acquire_run_lock(name)
@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import responses as responses_lib
+from prometheus_client import REGISTRY
+
+from integrator.eshop_client import EshopClient
+from integrator.metrics import exposition
+from integrator.rate_limit import AdaptiveRateLimiter
+from integrator.signals import sync_finished
+
+BASE_URL = 'https://api.fake-eshop.cz/v1'
+PRODUCT = {'sku': 'SKU-001', 'title': 'Kávovar', 'price': 15004.61, 'stock': 8, 'color': 'stříbrná'}
+RESULT = {
+    'status': 'completed', 'sent': 3, 'skipped': 5, 'errors': 1,
+    'timings': {'http': 1.5, 'rate_limit_wait': 0.5, 'total': 4.0},
+}
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture(autouse=True)
+def override_settings(settings):
+    settings.ESHOP_API_BASE_URL = BASE_URL
+    settings.ESHOP_API_KEY = 'symma-secret-token'
+
+
+# ---------------------------------------------------------------------------
+# Run metrics from the sync_finished signal
+# ---------------------------------------------------------------------------
+
+def test_finished_run_counts_products_stages_and_duration():
+    sent = _value('integrator_products_total', scope='retry', outcome='sent')
+    failed = _value('integrator_products_total', scope='retry', outcome='failed')
+    http = _value('integrator_stage_seconds_total', stage='http')
+    runs = _value('integrator_sync_run_duration_seconds_count', scope='retry')
+
+    sync_finished.send('test', scope='retry', result=RESULT)
+
+    assert _value('integrator_products_total', scope='retry', outcome='sent') == sent + 3
+    assert _value('integrator_products_total', scope='retry', outcome='failed') == failed + 1
+    assert _value('integrator_stage_seconds_total', stage='http') == http + 1.5
+    assert _value('integrator_sync_run_duration_seconds_count', scope='retry') == runs + 1
+
+
+def test_last_success_is_only_set_by_clean_runs():
+    sync_finished.send('test', scope='last-success-test', result=RESULT)
+    assert _value('integrator_last_successful_run_timestamp_seconds', scope='last-success-test') == 0
+
+    sync_finished.send('test', scope='last-success-test', result=dict(RESULT, errors=0))
+    assert _value('integrator_last_successful_run_timestamp_seconds', scope='last-success-test') > 0
+
+
+def test_learned_rate_of_adaptive_limiter_is_exposed():
+    sync_finished.send('test', scope='learned-rate-test', result=dict(RESULT, rate_limit=3.5))
+    assert _value('integrator_eshop_learned_rate', scope='learned-rate-test') == 3.5
+
+    sync_finished.send('test', scope='learned-rate-test', result=dict(RESULT, rate_limit=2.25))
+    assert _value('integrator_eshop_learned_rate', scope='learned-rate-test') == 2.25
+
+
+def test_learned_rate_is_updated_while_the_run_is_in_progress():
+    limiter = AdaptiveRateLimiter(4, floor=1, ceiling=10, scope='live-rate-test')
+    assert _value('integrator_eshop_learned_rate', scope='live-rate-test') == 4
+
+    limiter.on_throttle()
+    assert _value('integrator_eshop_learned_rate', scope='live-rate-test') == 2
+
+    limiter.on_success()
+    assert _value('integrator_eshop_learned_rate', scope='live-rate-test') == pytest.approx(2.05)
+
+
+# ---------------------------------------------------------------------------
+# Eshop request metrics
+# ---------------------------------------------------------------------------
+
+@responses_lib.activate
+def test_requests_are_observed_by_method_and_status(monkeypatch):
+    monkeypatch.setattr('integrator.eshop_client.time.sleep', lambda seconds: None)
+    url = f'{BASE_URL}/products/'
+    responses_lib.add(responses_lib.POST, url, status=429, headers={'Retry-After': '0'})
+    responses_lib.add(responses_lib.POST, url, json={}, status=201)
+    created = _value('integrator_eshop_request_duration_seconds_count', method='POST', status='201')
+    throttled = _value('integrator_eshop_throttled_requests_total')
+    waits = _value('integrator_rate_limit_wait_seconds_count')
+
+    EshopClient().send_product(PRODUCT, is_new=True)
+
+    assert _value('integrator_eshop_request_duration_seconds_count', method='POST', status='201') == created + 1
+    assert _value('integrator_eshop_throttled_requests_total') == throttled + 1
+    assert _value('integrator_rate_limit_wait_seconds_count') == waits + 2
+
+
+# ---------------------------------------------------------------------------
+# /metrics endpoint
+# ---------------------------------------------------------------------------
+
+def test_metrics_endpoint_serves_prometheus_text(client):
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+    assert b'integrator_eshop_request_duration_seconds' in response.content
+
+
+def test_samples_of_all_processes_are_summed(tmp_path, monkeypatch):
+    record = (
+        "from integrator.metrics import record_run; "
+        "record_run('test', scope='full', result={'status': 'completed', 'sent': 2, 'skipped': 0, 'errors': 0})"
+    )
+    for _ in range(2):
+        subprocess.run(
+            [sys.executable, '-c', record],
+            cwd=Path(__file__).resolve().parent.parent,
+            env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path)},
+            check=True,
+        )
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+
+    text = exposition().decode()
+
+    assert 'integrator_products_total{outcome="sent",scope="full"} 4.0' in text
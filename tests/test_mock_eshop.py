@@ -0,0 +1,216 @@
+import socket
+import statistics
+import struct
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from integrator.benchmark import run_benchmark
+from integrator.eshop_client import EshopClient
+from integrator.mock_eshop import MockEshop, MockEshopConfig, MockEshopServer
+from integrator.rate_limit import RateLimiter
+from integrator.synthetic import ExportSpec
+from integrator.tasks import sync_products_task
+
+API_KEY = 'symma-secret-token'
+PRODUCT = {'sku': 'SKU-001', 'title': 'Kávovar', 'price': 15004.61, 'stock': 8, 'color': 'stříbrná'}
+
+
+@pytest.fixture(autouse=True)
+def override_settings(settings):
+    settings.ESHOP_API_KEY = API_KEY
+    settings.SYNC_LOCK_ENABLED = False
+
+
+def _client(server, **kwargs):
+    kwargs.setdefault('rate_limiter', RateLimiter(rate=1000))
+    return EshopClient(base_url=f'{server.url}/v1', **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Catalogue semantics
+# ---------------------------------------------------------------------------
+
+class TestCatalogue:
+    def test_post_patch_delete_round_trip(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=0)) as server:
+            client = _client(server)
+            client.send_product(PRODUCT, is_new=True)
+            client.send_product(dict(PRODUCT, stock=3), is_new=False, fields=['stock'])
+            assert server.eshop.products == {'SKU-001': dict(PRODUCT, stock=3)}
+
+            client.remove_product('SKU-001')
+            assert server.eshop.products == {}
+
+    def test_duplicate_post_is_rejected_and_client_updates_instead(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=0)) as server:
+            client = _client(server)
+            client.send_product(PRODUCT, is_new=True)
+            client.send_product(dict(PRODUCT, stock=1), is_new=True)
+
+            assert server.eshop.products == {'SKU-001': dict(PRODUCT, stock=1)}
+            assert (server.eshop.stats['POST', 409], server.eshop.stats['PATCH', 200]) == (1, 1)
+
+    def test_unknown_patch_is_rejected(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=0)) as server:
+            with pytest.raises(requests.HTTPError, match='404'):
+                _client(server).send_product(dict(PRODUCT, sku='SKU-404'), is_new=False)
+
+    def test_batch_results_per_operation(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=0)) as server:
+            client = _client(server)
+            outcomes = client.send_products([
+                (PRODUCT, True, None),
+                (dict(PRODUCT, sku='SKU-404'), False, None),
+            ])
+
+            assert outcomes[0] is None
+            assert outcomes[1].status == 404
+            assert list(server.eshop.products) == ['SKU-001']
+
+    def test_wrong_api_key_is_unauthorized(self, settings):
+        settings.ESHOP_API_KEY = 'wrong'
+        with MockEshopServer(MockEshopConfig(rate_limit=0)) as server:
+            with pytest.raises(requests.HTTPError, match='401'):
+                _client(server).send_product(PRODUCT, is_new=True)
+
+
+# ---------------------------------------------------------------------------
+# Rate limit, faults and latency
+# ---------------------------------------------------------------------------
+
+class TestFaults:
+    def test_rate_limit_answers_429_with_retry_after(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=2)) as server:
+            responses = [
+                requests.post(f'{server.url}/products/', json=dict(PRODUCT, sku=f'SKU-{i}'), headers={'X-Api-Key': API_KEY})
+                for i in range(3)
+            ]
+
+        assert [r.status_code for r in responses] == [201, 201, 429]
+        assert 0 < float(responses[2].headers['Retry-After']) <= 1
+
+    def test_429_without_retry_after(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=1, retry_after=False)) as server:
+            requests.post(f'{server.url}/products/', json=PRODUCT, headers={'X-Api-Key': API_KEY})
+            response = requests.post(f'{server.url}/products/', json=PRODUCT, headers={'X-Api-Key': API_KEY})
+
+        assert response.status_code == 429
+        assert 'Retry-After' not in response.headers
+
+    def test_client_waits_out_the_server_rate_limit(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=3)) as server:
+            client = _client(server)
+            for i in range(4):
+                client.send_product(dict(PRODUCT, sku=f'SKU-{i}'), is_new=True)
+
+            assert len(server.eshop.products) == 4
+            assert server.eshop.stats['POST', 429] >= 1
+
+    def test_injected_errors_are_retried_then_raised(self):
+        config = MockEshopConfig(rate_limit=0, error_rate=1, error_statuses=(503,))
+        with MockEshopServer(config) as server, patch('integrator.eshop_client.time.sleep'):
+            with pytest.raises(requests.HTTPError, match='503'):
+                _client(server).send_product(PRODUCT, is_new=True)
+
+            assert server.eshop.stats['POST', 503] == 3
+
+    def test_dropped_connections_surface_as_connection_errors(self):
+        with MockEshopServer(MockEshopConfig(rate_limit=0, drop_rate=1)) as server, \
+                patch('integrator.eshop_client.time.sleep'):
+            with pytest.raises(requests.ConnectionError):
+                _client(server).send_product(PRODUCT, is_new=True)
+
+            assert server.eshop.stats['DROP', 'POST'] == 3
+
+    def test_timed_out_create_is_not_posted_twice(self, settings):
+        settings.ESHOP_READ_TIMEOUT = 0.05
+        with MockEshopServer(MockEshopConfig(rate_limit=0, latency=0.2)) as server:
+            with pytest.raises(requests.ReadTimeout):
+                _client(server).send_product(PRODUCT, is_new=True)
+
+            deadline = time.monotonic() + 2
+            while not server.eshop.products and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # The slow first attempt created the product; it was not POSTed again.
+            assert list(server.eshop.products) == ['SKU-001']
+            assert server.eshop.stats['POST', 409] == 0
+
+            # The next run's create finds it there and updates it.
+            settings.ESHOP_READ_TIMEOUT = 5
+            _client(server).send_product(dict(PRODUCT, stock=1), is_new=True)
+            assert server.eshop.products['SKU-001']['stock'] == 1
+
+    def test_client_hanging_up_is_counted_not_raised(self, capfd):
+        with MockEshopServer(MockEshopConfig(rate_limit=0, latency=0.1)) as server:
+            request = (
+                f'POST /products/ HTTP/1.1\r\nHost: x\r\nX-Api-Key: {API_KEY}\r\n'
+                f'Content-Type: application/json\r\nContent-Length: 2\r\n\r\n{{}}'
+            )
+            with socket.create_connection(server.server_address[:2]) as conn:
+                # Close with a reset, as a client giving up on a read timeout may.
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                conn.sendall(request.encode())
+
+            deadline = time.monotonic() + 2
+            while not server.eshop.stats['ABORT', 'POST'] and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            assert server.eshop.stats['ABORT', 'POST'] == 1
+        assert 'Traceback' not in capfd.readouterr().err
+
+    @pytest.mark.parametrize('distribution', ['constant', 'uniform', 'exponential', 'lognormal'])
+    def test_latency_has_configured_scale(self, distribution):
+        eshop = MockEshop(MockEshopConfig(latency=0.05, latency_distribution=distribution, seed=1))
+        samples = [eshop.latency() for _ in range(5000)]
+
+        assert all(sample >= 0 for sample in samples)
+        center = statistics.median(samples) if distribution == 'lognormal' else statistics.mean(samples)
+        assert center == pytest.approx(0.05, rel=0.1)
+
+    def test_unknown_latency_distribution_is_rejected(self):
+        with pytest.raises(ValueError, match='Unknown latency distribution'):
+            MockEshopConfig(latency_distribution='pareto')
+
+
+# ---------------------------------------------------------------------------
+# End to end over real sockets
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+def test_sync_task_against_mock_server(tmp_path, settings):
+    export = tmp_path / 'erp.json'
+    export.write_text(
+        '[{"id": "SKU-001", "title": "Kávovar", "price_vat_excl": 100, "stocks": {"praha": 2}, "attributes": null},'
+        ' {"id": "SKU-002", "title": "Mlýnek", "price_vat_excl": -1, "stocks": {}, "attributes": {}}]',
+        encoding='utf-8',
+    )
+    settings.ERP_DATA_PATH = export
+    with MockEshopServer(MockEshopConfig(rate_limit=0)) as server:
+        settings.ESHOP_API_BASE_URL = server.url
+        result = sync_products_task()
+
+        timings = result.pop('timings')
+        assert result == {'status': 'completed', 'sent': 1, 'skipped': 0, 'errors': 0}
+        assert timings['http'] > 0
+        assert server.eshop.products['SKU-001']['price'] == 121.0
+
+
+@pytest.mark.django_db
+def test_benchmark_sync_run_against_mock_server(settings):
+    settings.ESHOP_RATE_LIMITER = 'smooth'
+    settings.ESHOP_RATE_BURST = 100
+    with MockEshopServer(MockEshopConfig(rate_limit=0)) as server:
+        results = run_benchmark(
+            sizes=[60], spec=ExportSpec(invalid_price_rate=0, duplicate_rate=0), client_limit=4, eshop_url=server.url,
+        )
+
+        run = results[-1]
+        assert (run.stage, run.items) == ('sync run', 60)
+        assert run.errors == 0
+        created = len(server.eshop.products)       # the timed pass created the new products...
+        assert 0 < created <= 4
+        assert server.eshop.stats['POST', 409] == created   # ...the memory pass found them already there
+        assert server.eshop.stats['PATCH', 200] == created  # and updated them instead
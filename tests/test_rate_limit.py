@@ -0,0 +1,284 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+import pytest
+import redis
+import redis.asyncio
+
+from integrator.rate_limit import (
+    ADAPTIVE_COOLDOWN,
+    AdaptiveRateLimiter,
+    AsyncAdaptiveRateLimiter,
+    AsyncRateLimiter,
+    AsyncRedisRateLimiter,
+    AsyncTokenBucketRateLimiter,
+    RateLimiter,
+    RedisRateLimiter,
+    TokenBucketRateLimiter,
+    build_rate_limiter,
+)
+
+REDIS_URL = os.environ.get('TEST_REDIS_URL', os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+
+
+@pytest.fixture()
+def redis_client():
+    """Client for a local Redis; tests using it are skipped when none is running."""
+    client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip(f"Redis not reachable at {REDIS_URL}")
+    yield client
+    client.close()
+
+
+@pytest.fixture()
+def key(redis_client):
+    key = f'test:rate-limit:{uuid.uuid4().hex}'
+    yield key
+    redis_client.delete(key)
+
+
+# ---------------------------------------------------------------------------
+# TokenBucketRateLimiter – smooth pacing
+# ---------------------------------------------------------------------------
+
+class TestTokenBucketRateLimiter:
+    def test_requests_are_spaced_evenly(self):
+        # A fake clock: a real sleep may overshoot, which shortens the next gap.
+        clock = [100.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        stamps = []
+        with patch('integrator.rate_limit.time.monotonic', lambda: clock[0]), \
+                patch('integrator.rate_limit.time.sleep', side_effect=sleep):
+            limiter = TokenBucketRateLimiter(rate=20, burst=1)
+            for _ in range(6):
+                limiter.acquire()
+                stamps.append(clock[0])
+
+        gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+        assert gaps == pytest.approx([0.05] * 5)
+
+    def test_burst_then_steady_rate(self):
+        limiter = TokenBucketRateLimiter(rate=10, burst=3)
+
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        assert time.monotonic() - start < 0.05
+
+        limiter.acquire()
+        assert time.monotonic() - start >= 0.09
+
+    def test_no_window_boundary_burst(self):
+        """Unlike the fixed window, 2x rate requests can never land within a short interval."""
+        limiter = TokenBucketRateLimiter(rate=5, burst=1)
+        with patch('integrator.rate_limit.time.sleep') as mock_sleep:
+            for _ in range(10):
+                limiter.acquire()
+
+        waits = [call.args[0] for call in mock_sleep.call_args_list]
+        # Reserved waits grow by 1/rate per queued caller (time is not advancing here).
+        assert waits == pytest.approx([0.2 * i for i in range(1, 10)], abs=0.01)
+
+    def test_concurrent_callers_queue_at_distinct_times(self):
+        limiter = TokenBucketRateLimiter(rate=50, burst=1)
+        stamps = []
+        lock = threading.Lock()
+
+        def acquire():
+            limiter.acquire()
+            with lock:
+                stamps.append(time.monotonic())
+
+        threads = [threading.Thread(target=acquire) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stamps.sort()
+        assert stamps[-1] - stamps[0] >= 0.15
+
+    def test_async_variant_paces_requests(self):
+        async def run():
+            limiter = AsyncTokenBucketRateLimiter(rate=20, burst=1)
+            start = time.monotonic()
+            for _ in range(5):
+                await limiter.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(run()) >= 0.19
+
+
+# ---------------------------------------------------------------------------
+# AdaptiveRateLimiter – AIMD driven by 429 feedback
+# ---------------------------------------------------------------------------
+
+class TestAdaptiveRateLimiter:
+    def test_rate_grows_slowly_on_success(self):
+        limiter = AdaptiveRateLimiter(rate=5, floor=1, ceiling=10)
+        for _ in range(5):
+            limiter.on_success()
+        # Five successes at ~5 req/s is one second of traffic: roughly +0.1 req/s.
+        assert 5.09 < limiter.current_rate < 5.11
+
+    def test_rate_never_exceeds_ceiling(self):
+        limiter = AdaptiveRateLimiter(rate=5, floor=1, ceiling=5.5)
+        for _ in range(1000):
+            limiter.on_success()
+        assert limiter.current_rate == 5.5
+
+    def test_throttle_halves_rate_down_to_floor(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr('integrator.rate_limit.time.monotonic', lambda: clock[0])
+        limiter = AdaptiveRateLimiter(rate=8, floor=1.5, ceiling=10)
+
+        limiter.on_throttle()
+        assert limiter.current_rate == 4
+        for _ in range(5):
+            clock[0] += ADAPTIVE_COOLDOWN
+            limiter.on_throttle()
+        assert limiter.current_rate == 1.5
+
+    def test_burst_of_429s_cuts_rate_once(self):
+        limiter = AdaptiveRateLimiter(rate=8, floor=1, ceiling=10)
+        for _ in range(4):
+            limiter.on_throttle()
+        assert limiter.current_rate == 4
+
+    def test_retry_after_pauses_the_bucket(self):
+        limiter = AdaptiveRateLimiter(rate=4, floor=1, ceiling=10)
+        limiter.on_throttle(retry_after=2.0)
+
+        with patch('integrator.rate_limit.time.sleep') as mock_sleep:
+            limiter.acquire()
+
+        assert mock_sleep.call_args.args[0] >= 2.0
+
+    def test_async_variant_shares_feedback_logic(self):
+        limiter = AsyncAdaptiveRateLimiter(rate=4, floor=1, ceiling=10)
+        limiter.on_throttle()
+        asyncio.run(limiter.acquire())
+        assert limiter.current_rate == 2
+
+
+# ---------------------------------------------------------------------------
+# RedisRateLimiter – one budget for all processes
+# ---------------------------------------------------------------------------
+
+class TestRedisRateLimiter:
+    def test_limiters_sharing_a_key_share_one_budget(self, redis_client, key):
+        """Two limiters (as in two worker processes) must together stay at `rate` req/s."""
+        first = RedisRateLimiter(redis.Redis.from_url(REDIS_URL), rate=10, key=key)
+        second = RedisRateLimiter(redis.Redis.from_url(REDIS_URL), rate=10, key=key)
+
+        start = time.monotonic()
+        for _ in range(5):
+            first.acquire()
+            second.acquire()
+        elapsed = time.monotonic() - start
+
+        # 10 requests at 10 req/s with burst 1: the 10th is admitted ~0.9 s after the first.
+        assert elapsed >= 0.85, f"Shared budget exceeded, 10 requests took {elapsed:.2f}s"
+
+    def test_burst_is_admitted_immediately(self, redis_client, key):
+        limiter = RedisRateLimiter(redis_client, rate=5, burst=5, key=key)
+
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+
+        assert time.monotonic() - start < 0.1
+
+    def test_separate_keys_do_not_interfere(self, redis_client, key):
+        other_key = key + ':other'
+        limiter = RedisRateLimiter(redis_client, rate=5, key=key)
+        other = RedisRateLimiter(redis_client, rate=5, key=other_key)
+        try:
+            start = time.monotonic()
+            limiter.acquire()
+            other.acquire()
+            assert time.monotonic() - start < 0.1
+        finally:
+            redis_client.delete(other_key)
+
+    def test_async_limiter_uses_same_budget(self, redis_client, key):
+        async def run():
+            client = redis.asyncio.Redis.from_url(REDIS_URL)
+            limiter = AsyncRedisRateLimiter(client, rate=10, key=key)
+            start = time.monotonic()
+            for _ in range(6):
+                await limiter.acquire()
+            elapsed = time.monotonic() - start
+            await client.aclose()
+            return elapsed
+
+        assert asyncio.run(run()) >= 0.45
+
+
+class TestRedisFallback:
+    def test_falls_back_to_local_limiter_when_redis_is_down(self):
+        client = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.1)
+        fallback = RateLimiter(rate=5)
+        limiter = RedisRateLimiter(client, rate=5, fallback=fallback)
+
+        limiter.acquire()
+
+        assert fallback._tokens == 4
+
+
+# ---------------------------------------------------------------------------
+# build_rate_limiter – backend selection
+# ---------------------------------------------------------------------------
+
+class TestBuildRateLimiter:
+    def test_fixed_window_backend(self, settings):
+        settings.ESHOP_RATE_LIMITER = 'fixed'
+        assert isinstance(build_rate_limiter(), RateLimiter)
+        assert isinstance(build_rate_limiter(asynchronous=True), AsyncRateLimiter)
+
+    def test_smooth_backend(self, settings):
+        settings.ESHOP_RATE_LIMITER = 'smooth'
+        settings.ESHOP_RATE_BURST = 2
+        limiter = build_rate_limiter()
+        assert isinstance(limiter, TokenBucketRateLimiter)
+        assert (limiter._rate, limiter._burst) == (5, 2)
+        assert isinstance(build_rate_limiter(asynchronous=True), AsyncTokenBucketRateLimiter)
+
+    def test_adaptive_backend(self, settings):
+        settings.ESHOP_RATE_LIMITER = 'adaptive'
+        settings.ESHOP_RATE_FLOOR = 2
+        settings.ESHOP_RATE_CEILING = 8
+        limiter = build_rate_limiter(2)
+        assert isinstance(limiter, AdaptiveRateLimiter)
+        assert (limiter._floor, limiter._ceiling, limiter.current_rate) == (1, 4, 2.5)
+        assert build_rate_limiter().current_rate == 5
+        assert isinstance(build_rate_limiter(asynchronous=True), AsyncAdaptiveRateLimiter)
+
+    def test_static_limiters_have_no_learned_rate(self, settings):
+        settings.ESHOP_RATE_LIMITER = 'smooth'
+        assert build_rate_limiter().current_rate is None
+
+    def test_unknown_backend_is_rejected(self, settings):
+        settings.ESHOP_RATE_LIMITER = 'smoth'
+        with pytest.raises(ValueError, match="Unknown rate limiter 'smoth'"):
+            build_rate_limiter()
+
+    def test_smooth_backend_split_between_shards(self, settings):
+        settings.ESHOP_RATE_LIMITER = 'smooth'
+        assert build_rate_limiter(4)._rate == pytest.approx(1.25)
+
+    def test_redis_backend(self, settings):
+        settings.ESHOP_RATE_LIMITER = 'redis'
+        settings.ESHOP_RATE_LIMIT_REDIS_URL = REDIS_URL
+        assert isinstance(build_rate_limiter(), RedisRateLimiter)
+        assert isinstance(build_rate_limiter(asynchronous=True), AsyncRedisRateLimiter)
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from integrator.synthetic import ExportSpec, iter_export, write_export
+from integrator.transformer import iter_erp_data, load_and_transform
+
+
+# ---------------------------------------------------------------------------
+# Generator
+# ---------------------------------------------------------------------------
+
+class TestIterExport:
+    def test_same_seed_gives_same_rows(self):
+        spec = ExportSpec(products=200, seed=7)
+        assert list(iter_export(spec)) == list(iter_export(spec))
+
+    def test_different_seed_gives_different_rows(self):
+        assert list(iter_export(ExportSpec(products=50, seed=1))) != list(iter_export(ExportSpec(products=50, seed=2)))
+
+    def test_products_count_distinct_skus(self):
+        rows = list(iter_export(ExportSpec(products=1000, duplicate_rate=0.1)))
+
+        assert len({row['id'] for row in rows}) == 1000
+        assert 50 < len(rows) - 1000 < 150
+
+    def test_duplicates_differ_from_first_occurrence(self):
+        rows = list(iter_export(ExportSpec(products=1000, duplicate_rate=0.1, invalid_price_rate=0)))
+        first = {}
+        for row in rows:
+            if row['id'] in first:
+                assert row['price_vat_excl'] != first[row['id']]['price_vat_excl']
+            else:
+                first[row['id']] = row
+
+    def test_rates_are_respected(self):
+        spec = ExportSpec(products=5000, warehouses=4, invalid_price_rate=0.1, na_stock_rate=0.2)
+        rows = list(iter_export(spec))
+        invalid = sum(1 for row in rows if row['price_vat_excl'] is None or row['price_vat_excl'] < 0)
+        stocks = [value for row in rows for value in row['stocks'].values()]
+
+        assert invalid / len(rows) == pytest.approx(0.1, abs=0.02)
+        assert stocks.count('N/A') / len(stocks) == pytest.approx(0.2, abs=0.02)
+        assert max(len(row['stocks']) for row in rows) == 4
+
+    def test_clean_spec_has_only_valid_products(self):
+        spec = ExportSpec(products=300, duplicate_rate=0, invalid_price_rate=0, na_stock_rate=0)
+        rows = list(iter_export(spec))
+
+        assert all(row['price_vat_excl'] > 0 for row in rows)
+        assert all(isinstance(value, int) for row in rows for value in row['stocks'].values())
+
+
+class TestWriteExport:
+    def test_written_file_is_a_valid_erp_export(self, tmp_path):
+        path = tmp_path / 'erp.json'
+        spec = ExportSpec(products=500, duplicate_rate=0.05, invalid_price_rate=0.02)
+
+        rows = write_export(path, spec)
+
+        assert json.loads(path.read_text(encoding='utf-8')) == list(iter_export(spec))
+        assert rows == len(list(iter_export(spec)))
+        assert len(list(iter_erp_data(path))) == 500
+        assert 0 < len(list(load_and_transform(path))) < 500
+
+    def test_empty_export(self, tmp_path):
+        path = tmp_path / 'erp.json'
+
+        assert write_export(path, ExportSpec(products=0)) == 0
+        assert json.loads(path.read_text(encoding='utf-8')) == []
+
+
+# ---------------------------------------------------------------------------
+# generate_erp_data management command
+# ---------------------------------------------------------------------------
+
+def test_generate_command_writes_export(tmp_path, capsys):
+    path = tmp_path / 'erp.json'
+
+    call_command('generate_erp_data', str(path), '--products', '100', '--seed', '3', '--duplicate-rate', '0')
+
+    assert json.loads(path.read_text(encoding='utf-8')) == list(iter_export(ExportSpec(products=100, seed=3, duplicate_rate=0)))
+    assert 'Wrote 100 rows' in capsys.readouterr().out
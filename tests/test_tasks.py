@@ -1,13 +1,34 @@
 import json
+import os
 import tempfile
+import threading
+import time
+from datetime import timedelta
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 import responses as responses_lib
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from integrator.models import ProductSyncState
-from integrator.tasks import sync_products_task
+from integrator.deletion import sync_deletions
+from integrator.eshop_client import EshopClient
+from integrator.fingerprint import check_export
+from integrator.models import ErpExportFingerprint, FailedSync, ProductSyncState, SyncRun
+from integrator.rate_limit import RATE_LIMIT, build_rate_limiter
+from integrator.signals import sync_finished
+from integrator.tasks import (
+    aggregate_sync_results,
+    retry_failed_syncs_task,
+    shard_of,
+    sync_products_fanout_task,
+    sync_products_shard_task,
+    sync_products_task,
+)
+from integrator.hashing import blake2b_hash, field_digests
+from integrator.timing import STAGES
 from integrator.transformer import compute_hash
 
 BASE_URL = 'https://api.fake-eshop.cz/v1'
@@ -45,11 +66,17 @@ def erp_file(tmp_path):
     return _make
 
 
+def _without_timings(result: dict) -> dict:
+    """Task result without the run-dependent stage 'timings'."""
+    return {key: value for key, value in result.items() if key != 'timings'}
+
+
 
 @pytest.fixture(autouse=True)
 def override_settings(settings):
     settings.ESHOP_API_BASE_URL = BASE_URL
     settings.ESHOP_API_KEY = 'symma-secret-token'
+    settings.SYNC_LOCK_ENABLED = False
 
 # ---------------------------------------------------------------------------
 # New product → POST + ProductSyncState created
@@ -100,6 +127,52 @@ def test_unchanged_product_is_not_sent(erp_file, settings):
     assert len(responses_lib.calls) == 0
 
 
+@pytest.mark.django_db
+@responses_lib.activate
+def test_legacy_hash_is_rekeyed_without_sending(erp_file, settings):
+    """Stav uložený so starým SHA-256 hashom sa pri nezmenenom produkte len prepočíta, neodošle sa."""
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_HASH_ALGORITHM = 'blake2b'
+    transformed = {
+        'sku': 'SKU-001',
+        'title': 'Kávovar Espresso',
+        'price': round(100.0 * 1.21, 2),
+        'stock': 8,
+        'color': 'stříbrná',
+    }
+    ProductSyncState.objects.create(
+        sku='SKU-001',
+        content_hash=compute_hash(transformed),
+        hash_algorithm='sha256',
+        synced_as_new=True,
+    )
+
+    result = sync_products_task()
+
+    assert result['sent'] == 0
+    assert result['skipped'] == 1
+    assert len(responses_lib.calls) == 0
+    state = ProductSyncState.objects.get(sku='SKU-001')
+    assert bytes(state.content_hash) == blake2b_hash(transformed)
+    assert state.hash_algorithm == 'blake2b'
+    assert state.synced_as_new is True
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_changed_product_with_legacy_hash_is_sent(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    ProductSyncState.objects.create(
+        sku='SKU-001', content_hash=b'old-hash-that-does-not-match', hash_algorithm='sha256', synced_as_new=False,
+    )
+    responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
+
+    result = sync_products_task()
+
+    assert result['sent'] == 1
+    assert ProductSyncState.objects.get(sku='SKU-001').hash_algorithm == 'blake2b'
+
+
 # ---------------------------------------------------------------------------
 # Changed product → PATCH
 # ---------------------------------------------------------------------------
@@ -111,7 +184,7 @@ def test_changed_product_sends_patch(erp_file, settings):
 
     ProductSyncState.objects.create(
         sku='SKU-001',
-        content_hash='old-hash-that-does-not-match',
+        content_hash=b'old-hash-that-does-not-match',
         synced_as_new=False,
     )
     responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
@@ -122,6 +195,69 @@ def test_changed_product_sends_patch(erp_file, settings):
     assert responses_lib.calls[0].request.method == 'PATCH'
 
 
+@pytest.mark.django_db
+@responses_lib.activate
+def test_stock_change_patches_only_stock(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    previous = {
+        'sku': 'SKU-001',
+        'title': 'Kávovar Espresso',
+        'price': round(100.0 * 1.21, 2),
+        'stock': 3,
+        'color': 'stříbrná',
+    }
+    ProductSyncState.objects.create(
+        sku='SKU-001',
+        content_hash=blake2b_hash(previous),
+        hash_algorithm='blake2b',
+        field_hashes=field_digests(previous),
+        synced_as_new=False,
+    )
+    responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
+
+    result = sync_products_task()
+
+    assert result['sent'] == 1
+    assert json.loads(responses_lib.calls[0].request.body) == {'stock': 8}
+    state = ProductSyncState.objects.get(sku='SKU-001')
+    assert bytes(state.field_hashes) == field_digests(dict(previous, stock=8))
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_state_without_field_hashes_patches_whole_product(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    ProductSyncState.objects.create(sku='SKU-001', content_hash=b'old-hash', synced_as_new=False)
+    responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
+
+    sync_products_task()
+
+    body = json.loads(responses_lib.calls[0].request.body)
+    assert set(body) == {'sku', 'title', 'price', 'stock', 'color'}
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_unchanged_product_gets_field_hashes_backfilled(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    transformed = {
+        'sku': 'SKU-001',
+        'title': 'Kávovar Espresso',
+        'price': round(100.0 * 1.21, 2),
+        'stock': 8,
+        'color': 'stříbrná',
+    }
+    ProductSyncState.objects.create(
+        sku='SKU-001', content_hash=blake2b_hash(transformed), hash_algorithm='blake2b', synced_as_new=False,
+    )
+
+    result = sync_products_task()
+
+    assert result['skipped'] == 1
+    assert len(responses_lib.calls) == 0
+    assert bytes(ProductSyncState.objects.get(sku='SKU-001').field_hashes) == field_digests(transformed)
+
+
 # ---------------------------------------------------------------------------
 # Invalid products are skipped, task completes normally
 # ---------------------------------------------------------------------------
@@ -178,7 +314,8 @@ def test_correct_hash_persisted_after_post(erp_file, settings):
         'color': 'stříbrná',
     }
     state = ProductSyncState.objects.get(sku='SKU-001')
-    assert state.content_hash == compute_hash(expected_product)
+    assert bytes(state.content_hash) == blake2b_hash(expected_product)
+    assert state.hash_algorithm == 'blake2b'
 
 
 @pytest.mark.django_db
@@ -188,7 +325,7 @@ def test_correct_hash_persisted_after_patch(erp_file, settings):
     settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
     ProductSyncState.objects.create(
         sku='SKU-001',
-        content_hash='old-hash-that-does-not-match',
+        content_hash=b'old-hash-that-does-not-match',
         synced_as_new=False,
     )
     responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
@@ -203,7 +340,8 @@ def test_correct_hash_persisted_after_patch(erp_file, settings):
         'color': 'stříbrná',
     }
     state = ProductSyncState.objects.get(sku='SKU-001')
-    assert state.content_hash == compute_hash(expected_product)
+    assert bytes(state.content_hash) == blake2b_hash(expected_product)
+    assert state.hash_algorithm == 'blake2b'
 
 
 # ---------------------------------------------------------------------------
@@ -230,7 +368,7 @@ def test_synced_as_new_is_false_for_updated_product(erp_file, settings):
     settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
     ProductSyncState.objects.create(
         sku='SKU-001',
-        content_hash='old-hash-that-does-not-match',
+        content_hash=b'old-hash-that-does-not-match',
         synced_as_new=True,
     )
     responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
@@ -262,7 +400,7 @@ def test_hash_not_updated_in_db_after_api_error_on_new_product(erp_file, setting
 def test_hash_not_updated_in_db_after_api_error_on_existing_product(erp_file, settings):
     """Ak PATCH zlyhá, content_hash v DB musí zostať starý – produkt sa skúsi pri ďalšom behu."""
     settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
-    old_hash = 'old-hash-that-does-not-match'
+    old_hash = b'old-hash-that-does-not-match'
     ProductSyncState.objects.create(
         sku='SKU-001',
         content_hash=old_hash,
@@ -273,4 +411,1036 @@ def test_hash_not_updated_in_db_after_api_error_on_existing_product(erp_file, se
     sync_products_task()
 
     state = ProductSyncState.objects.get(sku='SKU-001')
-    assert state.content_hash == old_hash
+    assert bytes(state.content_hash) == old_hash
+
+
+# ---------------------------------------------------------------------------
+# Sync state is prefetched per chunk, not queried per SKU
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_sync_state_prefetched_in_chunks(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(5)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_CHUNK_SIZE = 2
+    settings.SYNC_SKIP_UNCHANGED_EXPORT = False
+    for raw in data:
+        product = {
+            'sku': raw['id'],
+            'title': 'Kávovar Espresso',
+            'price': round(100.0 * 1.21, 2),
+            'stock': 8,
+            'color': 'stříbrná',
+        }
+        ProductSyncState.objects.create(
+            sku=raw['id'],
+            content_hash=blake2b_hash(product),
+            hash_algorithm='blake2b',
+            field_hashes=field_digests(product),
+            synced_as_new=False,
+        )
+
+    with CaptureQueriesContext(connection) as ctx:
+        result = sync_products_task()
+
+    assert result['skipped'] == 5
+    sqls = [query['sql'] for query in ctx.captured_queries]
+    # One sku__in query per chunk of 2, and one checkpoint UPDATE per chunk.
+    assert len([sql for sql in sqls if '"integrator_productsyncstate"."sku" IN (' in sql]) == 3
+    assert len([sql for sql in sqls if sql.startswith('UPDATE "integrator_syncrun" SET "position"')]) == 3
+
+
+# ---------------------------------------------------------------------------
+# Sync state is written in bulk, once per chunk
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_sync_state_written_in_bulk_per_chunk(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(5)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_CHUNK_SIZE = 2
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    with patch.object(
+        ProductSyncState.objects, 'bulk_create', wraps=ProductSyncState.objects.bulk_create,
+    ) as mock_bulk_create:
+        result = sync_products_task()
+
+    assert result['sent'] == 5
+    assert mock_bulk_create.call_count == 3
+    assert ProductSyncState.objects.count() == 5
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_upsert_updates_existing_sync_state(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    ProductSyncState.objects.create(sku='SKU-001', content_hash=b'old-hash', synced_as_new=True)
+    responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    sync_products_task()
+
+    assert ProductSyncState.objects.count() == 2
+    assert bytes(ProductSyncState.objects.get(sku='SKU-001').content_hash) != b'old-hash'
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_aborted_run_keeps_already_sent_products(erp_file, settings):
+    """A crash mid-run loses at most the current chunk; completed sends stay persisted."""
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(5)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_CHUNK_SIZE = 2
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    calls = []
+
+    def send_product(product, is_new, fields=None):
+        calls.append(product['sku'])
+        if len(calls) == 4:
+            raise SystemExit("worker killed")
+
+    with patch('integrator.tasks.EshopClient.send_product', side_effect=send_product):
+        with pytest.raises(SystemExit):
+            sync_products_task()
+
+    assert set(ProductSyncState.objects.values_list('sku', flat=True)) == {'SKU-000', 'SKU-001', 'SKU-002'}
+
+
+# ---------------------------------------------------------------------------
+# Concurrent send pipeline (SYNC_WORKERS > 1)
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+def test_concurrent_mode_keeps_accounting_exact(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(20)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_WORKERS = 4
+    settings.SYNC_CHUNK_SIZE = 7
+
+    def send_product(product, is_new, fields=None):
+        if product['sku'] in ('SKU-003', 'SKU-017'):
+            raise RuntimeError("boom")
+
+    with patch('integrator.tasks.EshopClient.send_product', side_effect=send_product):
+        result = sync_products_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 18, 'skipped': 0, 'errors': 2}
+    synced = set(ProductSyncState.objects.values_list('sku', flat=True))
+    assert len(synced) == 18
+    assert 'SKU-003' not in synced and 'SKU-017' not in synced
+
+
+@pytest.mark.django_db
+def test_concurrent_mode_bounds_requests_in_flight(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(12)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_WORKERS = 3
+
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def send_product(product, is_new, fields=None):
+        with lock:
+            in_flight.append(product['sku'])
+            peak.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.remove(product['sku'])
+
+    with patch('integrator.tasks.EshopClient.send_product', side_effect=send_product):
+        result = sync_products_task()
+
+    assert result['sent'] == 12
+    assert 1 < max(peak) <= 3
+
+
+@pytest.mark.django_db
+def test_asyncio_engine_syncs_products(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_ENGINE = 'asyncio'
+    settings.SYNC_WORKERS = 8
+
+    async def send_product(self, product, is_new, fields=None):
+        if product['sku'] == 'SKU-003':
+            raise RuntimeError("boom")
+
+    with patch('integrator.tasks.AsyncEshopClient.send_product', send_product):
+        result = sync_products_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 1, 'skipped': 0, 'errors': 1}
+    assert list(ProductSyncState.objects.values_list('sku', flat=True)) == ['SKU-001']
+
+
+# ---------------------------------------------------------------------------
+# Bulk endpoint (ESHOP_BATCH_SIZE > 1)
+# ---------------------------------------------------------------------------
+
+def _batch_callback(fail_skus=()):
+    def callback(request):
+        operations = json.loads(request.body)['operations']
+        results = [
+            {'status': 422, 'error': 'rejected'} if op['body'].get('sku') in fail_skus else {'status': 201}
+            for op in operations
+        ]
+        return 200, {}, json.dumps({'results': results})
+    return callback
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_batching_groups_products_into_bulk_requests(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(7)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.ESHOP_BATCH_SIZE = 3
+    responses_lib.add_callback(responses_lib.POST, f'{BASE_URL}/products/batch/', callback=_batch_callback())
+
+    result = sync_products_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 7, 'skipped': 0, 'errors': 0}
+    assert [len(json.loads(call.request.body)['operations']) for call in responses_lib.calls] == [3, 3, 1]
+    assert ProductSyncState.objects.count() == 7
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_batching_partial_failure_counts_per_product(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(4)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.ESHOP_BATCH_SIZE = 10
+    settings.SYNC_WORKERS = 2
+    responses_lib.add_callback(
+        responses_lib.POST, f'{BASE_URL}/products/batch/', callback=_batch_callback(fail_skus={'SKU-002'}),
+    )
+
+    result = sync_products_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 3, 'skipped': 0, 'errors': 1}
+    assert 'SKU-002' not in set(ProductSyncState.objects.values_list('sku', flat=True))
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_failed_batch_request_fails_every_product(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(3)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.ESHOP_BATCH_SIZE = 10
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/batch/', status=500)
+
+    result = sync_products_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 0, 'skipped': 0, 'errors': 3}
+    assert ProductSyncState.objects.count() == 0
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker – dead eshop API aborts the run
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_run_aborts_when_circuit_opens(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(20)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_CHUNK_SIZE = 4
+    settings.ESHOP_CIRCUIT_FAILURES = 3
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=503)
+
+    with patch('integrator.eshop_client.time.sleep'):
+        result = sync_products_task()
+
+    assert result['status'] == 'aborted: circuit open'
+    assert result['sent'] == 0
+    assert result['errors'] == 4   # only the first chunk was attempted
+    assert len(responses_lib.calls) == 3
+    assert not ErpExportFingerprint.objects.exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_skus_failed_fast_by_open_circuit_keep_their_retry_budget(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(4)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.ESHOP_CIRCUIT_FAILURES = 3
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=503)
+    _failed_row(payload=dict(TRANSFORMED_SKU_001, sku='SKU-002'), attempts=2, due_in=-60)
+
+    before = timezone.now()
+    with patch('integrator.eshop_client.time.sleep'):
+        sync_products_task()
+
+    rows = {row.sku: row for row in FailedSync.objects.all()}
+    assert rows['SKU-000'].attempts == 1   # the request that opened the circuit
+    assert (rows['SKU-001'].attempts, rows['SKU-002'].attempts, rows['SKU-003'].attempts) == (0, 2, 0)
+    assert rows['SKU-001'].next_attempt_at <= timezone.now()
+    assert rows['SKU-002'].next_attempt_at < before
+    assert 'circuit is open' in rows['SKU-003'].last_error
+
+
+def test_aborted_shard_marks_whole_run_aborted():
+    totals = aggregate_sync_results([
+        {'status': 'completed', 'sent': 2, 'skipped': 0, 'errors': 0},
+        {'status': 'aborted: circuit open', 'sent': 0, 'skipped': 0, 'errors': 3},
+    ])
+
+    assert totals == {'status': 'aborted: circuit open', 'sent': 2, 'skipped': 0, 'errors': 3}
+
+
+# ---------------------------------------------------------------------------
+# Dead-letter table and targeted re-send of failed SKUs
+# ---------------------------------------------------------------------------
+
+TRANSFORMED_SKU_001 = {
+    'sku': 'SKU-001',
+    'title': 'Kávovar Espresso',
+    'price': round(100.0 * 1.21, 2),
+    'stock': 8,
+    'color': 'stříbrná',
+}
+
+
+def _failed_row(payload=TRANSFORMED_SKU_001, attempts=1, due_in=-1):
+    return FailedSync.objects.create(
+        sku=payload['sku'],
+        payload=payload,
+        content_hash=blake2b_hash(payload),
+        last_error='503 Server Error',
+        attempts=attempts,
+        next_attempt_at=timezone.now() + timedelta(seconds=due_in),
+    )
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_failed_sku_is_recorded_for_retry(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_RETRY_BASE_DELAY = 15
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=500)
+
+    before = timezone.now()
+    sync_products_task()
+
+    failed = FailedSync.objects.get(sku='SKU-001')
+    assert failed.payload == TRANSFORMED_SKU_001
+    assert bytes(failed.content_hash) == blake2b_hash(TRANSFORMED_SKU_001)
+    assert failed.attempts == 1
+    assert '500' in failed.last_error
+    assert before + timedelta(seconds=15) <= failed.next_attempt_at <= timezone.now() + timedelta(seconds=15)
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_repeated_failure_backs_off_exponentially(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_SKIP_UNCHANGED_EXPORT = False
+    settings.SYNC_RETRY_BASE_DELAY = 10
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=500)
+    _failed_row(attempts=2)
+
+    sync_products_task()
+
+    failed = FailedSync.objects.get(sku='SKU-001')
+    assert failed.attempts == 3
+    delay = (failed.next_attempt_at - failed.updated_at).total_seconds()
+    assert delay == pytest.approx(40, abs=1)
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_successful_sync_clears_failed_record(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    _failed_row()
+
+    sync_products_task()
+
+    assert not FailedSync.objects.exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_unchanged_sku_clears_stale_failed_record(erp_file, settings):
+    """If the export went back to what the eshop already has, the failed payload must not be re-sent."""
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    ProductSyncState.objects.create(
+        sku='SKU-001',
+        content_hash=blake2b_hash(TRANSFORMED_SKU_001),
+        hash_algorithm='blake2b',
+        field_hashes=field_digests(TRANSFORMED_SKU_001),
+        synced_as_new=False,
+    )
+    _failed_row(payload=dict(TRANSFORMED_SKU_001, stock=0))
+
+    result = sync_products_task()
+
+    assert result['skipped'] == 1
+    assert not FailedSync.objects.exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_retry_task_resends_only_due_skus(settings, tmp_path):
+    settings.ERP_DATA_PATH = tmp_path / 'missing.json'   # the export is not read
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    _failed_row()
+    _failed_row(payload=dict(TRANSFORMED_SKU_001, sku='SKU-LATER'), due_in=600)
+
+    result = retry_failed_syncs_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 1, 'skipped': 0, 'errors': 0}
+    assert json.loads(responses_lib.calls[0].request.body) == TRANSFORMED_SKU_001
+    assert list(FailedSync.objects.values_list('sku', flat=True)) == ['SKU-LATER']
+    assert ProductSyncState.objects.filter(sku='SKU-001').exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_retry_task_gives_up_after_max_attempts(settings):
+    settings.SYNC_RETRY_MAX_ATTEMPTS = 3
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=500)
+    _failed_row(attempts=2)
+
+    result = retry_failed_syncs_task()
+
+    assert result['errors'] == 1
+    failed = FailedSync.objects.get(sku='SKU-001')
+    assert failed.attempts == 3
+    assert failed.next_attempt_at is None
+    assert retry_failed_syncs_task()['sent'] == 0   # no longer due
+
+
+# ---------------------------------------------------------------------------
+# Fan-out across SKU shards
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_shards_partition_skus_and_aggregate_counts(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(12)] + INVALID_ERP_DATA
+    settings.ERP_DATA_PATH = erp_file(data)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    with patch('integrator.eshop_client.time.sleep'):
+        results = [sync_products_shard_task(index, 3) for index in range(3)]
+    totals = aggregate_sync_results(results)
+
+    assert _without_timings(totals) == {'status': 'completed', 'sent': 12, 'skipped': 0, 'errors': 0}
+    assert all(result['sent'] < 12 for result in results)
+    assert len(responses_lib.calls) == 12
+    assert ProductSyncState.objects.count() == 12
+
+
+def test_shard_of_is_stable_and_in_range():
+    assert shard_of('SKU-001', 4) == shard_of('SKU-001', 4)
+    assert {shard_of(f'SKU-{i}', 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+@pytest.mark.django_db
+def test_fanout_replaces_itself_with_chord_of_shards(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_SHARDS = 3
+
+    with patch.object(sync_products_fanout_task, 'replace') as mock_replace:
+        sync_products_fanout_task()
+
+    workflow = mock_replace.call_args.args[0]
+    assert [task.args for task in workflow.tasks] == [(0, 3), (1, 3), (2, 3)]
+    assert workflow.body.task == 'integrator.aggregate_sync_results'
+
+
+def test_local_shard_rate_limiters_split_global_budget():
+    limiter = build_rate_limiter(4)
+    assert limiter._rate / limiter._period == pytest.approx(RATE_LIMIT / 4)
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_adaptive_mode_reports_learned_rate(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.ESHOP_RATE_LIMITER = 'adaptive'
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=429)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    with patch('integrator.eshop_client.time.sleep'), patch('integrator.rate_limit.time.sleep'):
+        result = sync_products_task()
+
+    assert result['sent'] == 2
+    assert 2.5 <= result['rate_limit'] < 3
+
+
+# ---------------------------------------------------------------------------
+# Unchanged ERP export → whole run skipped
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_unchanged_export_skips_whole_run(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    sync_products_task()
+
+    with patch('integrator.tasks.transform_and_hash') as mock_load:
+        result = sync_products_task()
+
+    assert result == {'status': 'unchanged', 'sent': 0, 'skipped': 0, 'errors': 0}
+    mock_load.assert_not_called()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_touched_export_with_same_bytes_is_unchanged(erp_file, settings):
+    path = erp_file(VALID_ERP_DATA)
+    settings.ERP_DATA_PATH = path
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    sync_products_task()
+
+    path.write_text(path.read_text(encoding='utf-8'), encoding='utf-8')
+    os.utime(path, ns=(1, 1))
+
+    assert sync_products_task()['status'] == 'unchanged'
+    assert ErpExportFingerprint.objects.get().mtime_ns == 1
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_modified_export_is_synced_again(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    sync_products_task()
+
+    changed = [dict(VALID_ERP_DATA[0], price_vat_excl=200.0)]
+    settings.ERP_DATA_PATH = erp_file(changed)
+    responses_lib.add(responses_lib.PATCH, f'{BASE_URL}/products/SKU-001/', json={}, status=200)
+
+    result = sync_products_task()
+
+    assert result['status'] == 'completed'
+    assert result['sent'] == 1
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_fingerprint_not_recorded_after_errors(erp_file, settings):
+    """Failed SKUs must be retried, so a run with errors never marks the export as done."""
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=500)
+    sync_products_task()
+
+    responses_lib.replace(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    result = sync_products_task()
+
+    assert result['status'] == 'completed'
+    assert result['sent'] == 1
+
+
+@pytest.mark.django_db
+def test_sharded_run_records_fingerprint_when_clean(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    _, fingerprint = check_export(settings.ERP_DATA_PATH)
+
+    aggregate_sync_results(
+        [{'sent': 1, 'skipped': 0, 'errors': 0}, {'sent': 1, 'skipped': 0, 'errors': 0}],
+        fingerprint=fingerprint.as_dict(),
+    )
+
+    with patch.object(sync_products_fanout_task, 'replace') as mock_replace:
+        result = sync_products_fanout_task()
+
+    assert result['status'] == 'unchanged'
+    mock_replace.assert_not_called()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_parallel_transform_stage_syncs_same_products(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA + INVALID_ERP_DATA)
+    settings.SYNC_TRANSFORM_WORKERS = 2
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    result = sync_products_task()
+
+    assert result['sent'] == 2
+    assert set(ProductSyncState.objects.values_list('sku', flat=True)) == {'SKU-001', 'SKU-003'}
+
+
+# ---------------------------------------------------------------------------
+# Checkpointed runs – an interrupted run continues where it stopped
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+def test_interrupted_run_resumes_after_last_checkpoint(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(5)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_CHUNK_SIZE = 2
+    calls = []
+
+    def crash_on_fourth(product, is_new, fields=None):
+        calls.append(product['sku'])
+        if len(calls) == 4:
+            raise SystemExit("worker killed")
+
+    with patch('integrator.tasks.EshopClient.send_product', side_effect=crash_on_fourth):
+        with pytest.raises(SystemExit):
+            sync_products_task()
+
+    run = SyncRun.objects.get()
+    assert (run.status, run.position, run.sent) == ('running', 2, 2)
+
+    calls.clear()
+    with patch('integrator.tasks.EshopClient.send_product', side_effect=lambda *a, **kw: calls.append(a[0]['sku'])):
+        result = sync_products_task()
+
+    # SKU-002 was sent before the crash and its state flushed, so it is only compared.
+    assert calls == ['SKU-003', 'SKU-004']
+    assert _without_timings(result) == {'status': 'completed', 'sent': 4, 'skipped': 1, 'errors': 0, 'resumed_from': 2}
+    run.refresh_from_db()
+    assert (run.status, run.position) == ('completed', 5)
+    assert run.finished_at is not None
+
+
+@pytest.mark.django_db
+def test_changed_export_supersedes_unfinished_run(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    old = SyncRun.objects.create(scope='full', path=str(settings.ERP_DATA_PATH), size=1, mtime_ns=1, position=1)
+
+    with patch('integrator.tasks.EshopClient.send_product') as mock_send:
+        result = sync_products_task()
+
+    assert mock_send.call_count == 2
+    assert 'resumed_from' not in result
+    old.refresh_from_db()
+    assert old.status == 'superseded'
+    assert SyncRun.objects.filter(status='completed').count() == 1
+
+
+@pytest.mark.django_db
+def test_completed_run_is_not_resumed(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_SKIP_UNCHANGED_EXPORT = False
+
+    with patch('integrator.tasks.EshopClient.send_product'):
+        sync_products_task()
+        result = sync_products_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 0, 'skipped': 2, 'errors': 0}
+    assert SyncRun.objects.filter(status='completed').count() == 2
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_run_aborted_by_circuit_resumes_after_recovery(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(6)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_CHUNK_SIZE = 3
+    settings.ESHOP_CIRCUIT_FAILURES = 3
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=503)
+
+    with patch('integrator.eshop_client.time.sleep'):
+        sync_products_task()
+
+    assert SyncRun.objects.get().status == 'aborted: circuit open'
+
+    responses_lib.replace(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    result = sync_products_task()
+
+    assert result['resumed_from'] == 3
+    assert (result['sent'], result['errors']) == (3, 3)
+    # The first chunk is left to the dead-letter retry, not re-sent by the resumed run.
+    assert set(FailedSync.objects.values_list('sku', flat=True)) == {'SKU-000', 'SKU-001', 'SKU-002'}
+
+
+# ---------------------------------------------------------------------------
+# Single-flight lock – overlapping triggers do not run twice
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+def test_trigger_while_sync_runs_returns_already_running(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_LOCK_ENABLED = True
+
+    with patch('integrator.locking.RedisLock.acquire', return_value=False), \
+            patch('integrator.tasks.EshopClient.send_product') as mock_send:
+        result = sync_products_task()
+
+    assert result == {'status': 'already running', 'sent': 0, 'skipped': 0, 'errors': 0}
+    mock_send.assert_not_called()
+    assert not SyncRun.objects.exists()
+
+
+@pytest.mark.django_db
+def test_retry_task_waits_for_running_sync(settings):
+    settings.SYNC_LOCK_ENABLED = True
+    _failed_row()
+
+    with patch('integrator.locking.RedisLock.acquire', return_value=False), \
+            patch('integrator.tasks.EshopClient.send_product') as mock_send:
+        result = retry_failed_syncs_task()
+
+    assert result['status'] == 'already running'
+    mock_send.assert_not_called()
+    assert FailedSync.objects.get().attempts == 1
+
+
+@pytest.mark.django_db
+def test_sync_holds_lock_while_running(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_LOCK_ENABLED = True
+    held = []
+
+    with patch('integrator.locking.RedisLock.acquire', return_value=True), \
+            patch('integrator.locking.RedisLock.release') as mock_release, \
+            patch('integrator.tasks.EshopClient.send_product', side_effect=lambda *a, **kw: held.append(mock_release.called)):
+        result = sync_products_task()
+
+    assert result['sent'] == 2
+    assert held == [False, False]
+    mock_release.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_fanout_is_refused_while_sync_runs(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_LOCK_ENABLED = True
+
+    with patch('integrator.locking.RedisLock.acquire', return_value=False), \
+            patch.object(sync_products_fanout_task, 'replace') as mock_replace:
+        result = sync_products_fanout_task()
+
+    assert result['status'] == 'already running'
+    mock_replace.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_fanout_hands_run_lock_to_shards_and_callback(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_LOCK_ENABLED = True
+
+    with patch('integrator.locking.RedisLock.acquire', return_value=True), \
+            patch('integrator.locking.RedisLock.release') as mock_release, \
+            patch.object(sync_products_fanout_task, 'replace') as mock_replace:
+        sync_products_fanout_task(shard_count=2)
+
+    workflow = mock_replace.call_args.args[0]
+    tokens = {task.kwargs['lock_token'] for task in workflow.tasks} | {workflow.body.kwargs['lock_token']}
+    assert len(tokens) == 1 and None not in tokens
+    mock_release.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_fanout_releases_run_lock_when_export_is_unchanged(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_LOCK_ENABLED = True
+
+    with patch('integrator.tasks._check_export', return_value=({'status': 'unchanged'}, None)), \
+            patch('integrator.locking.RedisLock.acquire', return_value=True), \
+            patch('integrator.locking.RedisLock.release') as mock_release:
+        result = sync_products_fanout_task()
+
+    assert result == {'status': 'unchanged'}
+    mock_release.assert_called_once()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('lock_token', [None, 'run-token'])
+def test_shard_is_refused_while_another_run_holds_sync_lock(erp_file, settings, lock_token):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    settings.SYNC_LOCK_ENABLED = True
+
+    with patch('integrator.locking.RedisLock.acquire', return_value=False), \
+            patch('integrator.locking.RedisLock.join', return_value=False), \
+            patch('integrator.tasks.EshopClient.send_product') as mock_send:
+        result = sync_products_shard_task(0, 2, lock_token=lock_token)
+
+    assert result['status'] == 'already running'
+    mock_send.assert_not_called()
+
+
+def test_chord_callback_releases_run_lock(settings):
+    settings.SYNC_LOCK_ENABLED = True
+    settings.SYNC_DELETE_MISSING = False
+
+    with patch('integrator.locking.RedisLock.release') as mock_release:
+        aggregate_sync_results(
+            [{'status': 'completed', 'sent': 1, 'skipped': 0, 'errors': 0}], lock_token='run-token',
+        )
+
+    mock_release.assert_called_once()
+
+
+def test_shard_still_running_marks_run_incomplete():
+    totals = aggregate_sync_results([
+        {'status': 'completed', 'sent': 2, 'skipped': 0, 'errors': 0},
+        {'status': 'already running', 'sent': 0, 'skipped': 0, 'errors': 0},
+    ])
+
+    assert totals['status'] == 'already running'
+
+
+# ---------------------------------------------------------------------------
+# Deletion sync – SKUs that left the export are removed from the eshop
+# ---------------------------------------------------------------------------
+
+def _synced_state(product):
+    return ProductSyncState.objects.create(
+        sku=product['sku'],
+        content_hash=blake2b_hash(product),
+        hash_algorithm='blake2b',
+        field_hashes=field_digests(product),
+        synced_as_new=False,
+    )
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_sku_missing_from_export_is_deleted(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_DELETE_MAX_RATIO = 0.5
+    _synced_state(TRANSFORMED_SKU_001)
+    _synced_state(dict(TRANSFORMED_SKU_001, sku='SKU-GONE'))
+    responses_lib.add(responses_lib.DELETE, f'{BASE_URL}/products/SKU-GONE/', status=204)
+
+    result = sync_products_task()
+
+    assert _without_timings(result) == {'status': 'completed', 'sent': 0, 'skipped': 1, 'errors': 0, 'deleted': 1}
+    assert list(ProductSyncState.objects.values_list('sku', flat=True)) == ['SKU-001']
+    assert ErpExportFingerprint.objects.exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_missing_skus_are_deleted_in_bulk(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_DELETE_MAX_RATIO = 1
+    settings.ESHOP_BATCH_SIZE = 10
+    _synced_state(TRANSFORMED_SKU_001)
+    for sku in ('SKU-GONE-1', 'SKU-GONE-2'):
+        _synced_state(dict(TRANSFORMED_SKU_001, sku=sku))
+    responses_lib.add(
+        responses_lib.POST, f'{BASE_URL}/products/batch/',
+        json={'results': [{'status': 204}, {'status': 500, 'error': 'boom'}]},
+    )
+
+    result = sync_products_task()
+
+    assert (result['deleted'], result['errors']) == (1, 1)
+    assert len(responses_lib.calls) == 1
+    assert set(ProductSyncState.objects.values_list('sku', flat=True)) == {'SKU-001', 'SKU-GONE-2'}
+    assert not ErpExportFingerprint.objects.exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_truncated_export_does_not_wipe_catalogue(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_DELETE_MAX_RATIO = 0.05
+    _synced_state(TRANSFORMED_SKU_001)
+    for i in range(3):
+        _synced_state(dict(TRANSFORMED_SKU_001, sku=f'SKU-GONE-{i}'))
+
+    result = sync_products_task()
+
+    assert result['deletion_blocked'] == 3
+    assert 'deleted' not in result
+    assert len(responses_lib.calls) == 0
+    assert ProductSyncState.objects.count() == 4
+    assert not ErpExportFingerprint.objects.exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_invalid_product_still_in_export_is_not_deleted(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1] + INVALID_ERP_DATA[:1])
+    settings.SYNC_DELETE_MAX_RATIO = 1
+    _synced_state(TRANSFORMED_SKU_001)
+    _synced_state(dict(TRANSFORMED_SKU_001, sku='SKU-BAD-NULL'))
+
+    result = sync_products_task()
+
+    assert 'deleted' not in result
+    assert ProductSyncState.objects.filter(sku='SKU-BAD-NULL').exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_failed_sync_of_sku_that_left_export_is_dropped(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    _synced_state(TRANSFORMED_SKU_001)
+    _failed_row(payload=dict(TRANSFORMED_SKU_001, sku='SKU-GONE'))
+
+    sync_products_task()
+
+    assert not FailedSync.objects.exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_aborted_run_deletes_nothing(erp_file, settings):
+    data = [dict(VALID_ERP_DATA[0], id=f'SKU-{i:03d}') for i in range(8)]
+    settings.ERP_DATA_PATH = erp_file(data)
+    settings.SYNC_CHUNK_SIZE = 4
+    settings.ESHOP_CIRCUIT_FAILURES = 3
+    settings.SYNC_DELETE_MAX_RATIO = 1
+    _synced_state(dict(TRANSFORMED_SKU_001, sku='SKU-GONE'))
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', status=503)
+
+    with patch('integrator.eshop_client.time.sleep'):
+        result = sync_products_task()
+
+    assert result['status'] == 'aborted: circuit open'
+    assert ProductSyncState.objects.filter(sku='SKU-GONE').exists()
+    assert not any(call.request.method == 'DELETE' for call in responses_lib.calls)
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_sharded_run_deletes_missing_skus_once_after_all_shards(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_DELETE_MAX_RATIO = 1
+    gone = [f'SKU-GONE-{i}' for i in range(10)]
+    for sku in gone:
+        _synced_state(dict(TRANSFORMED_SKU_001, sku=sku))
+        responses_lib.add(responses_lib.DELETE, f'{BASE_URL}/products/{sku}/', status=204)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    with patch('integrator.tasks.sync_deletions', wraps=sync_deletions) as mock_deletions:
+        results = [sync_products_shard_task(index, 2) for index in range(2)]
+        assert not any('deleted' in result for result in results)
+        mock_deletions.assert_not_called()
+        totals = aggregate_sync_results(results)
+
+    mock_deletions.assert_called_once()
+    assert totals['deleted'] == len(gone)
+    assert set(ProductSyncState.objects.values_list('sku', flat=True)) == {'SKU-001'}
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_sharded_run_deletions_use_the_full_rate_budget(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_DELETE_MAX_RATIO = 1
+    settings.ESHOP_RATE_LIMITER = 'smooth'
+    _synced_state(dict(TRANSFORMED_SKU_001, sku='SKU-GONE'))
+    responses_lib.add(responses_lib.DELETE, f'{BASE_URL}/products/SKU-GONE/', status=204)
+
+    with patch('integrator.deletion.EshopClient', wraps=EshopClient) as mock_client:
+        totals = aggregate_sync_results([{'status': 'completed', 'sent': 0, 'skipped': 0, 'errors': 0}] * 4)
+
+    assert totals['deleted'] == 1
+    assert mock_client.call_args.kwargs['rate_limiter']._rate == pytest.approx(RATE_LIMIT)
+
+
+@pytest.mark.django_db
+def test_incomplete_sharded_run_deletes_nothing(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    _synced_state(dict(TRANSFORMED_SKU_001, sku='SKU-GONE'))
+
+    totals = aggregate_sync_results([
+        {'status': 'completed', 'sent': 0, 'skipped': 1, 'errors': 0},
+        {'status': 'aborted: circuit open', 'sent': 0, 'skipped': 0, 'errors': 1},
+    ])
+
+    assert 'deleted' not in totals
+    assert ProductSyncState.objects.filter(sku='SKU-GONE').exists()
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_deletions_share_the_runs_rate_limiter(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    settings.SYNC_DELETE_MAX_RATIO = 1
+    settings.ESHOP_RATE_LIMITER = 'adaptive'
+    _synced_state(dict(TRANSFORMED_SKU_001, sku='SKU-GONE'))
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    responses_lib.add(responses_lib.DELETE, f'{BASE_URL}/products/SKU-GONE/', status=204)
+
+    with patch('integrator.deletion.EshopClient', wraps=EshopClient) as mock_client, \
+            patch('integrator.tasks.EshopClient', wraps=EshopClient) as mock_sender:
+        result = sync_products_task()
+
+    assert result['deleted'] == 1
+    assert mock_client.call_args.kwargs['rate_limiter'] is mock_sender.call_args.kwargs['rate_limiter']
+
+
+@pytest.mark.django_db
+def test_blocked_sharded_deletion_does_not_record_fingerprint(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA[:1])
+    for i in range(3):
+        _synced_state(dict(TRANSFORMED_SKU_001, sku=f'SKU-GONE-{i}'))
+    _, fingerprint = check_export(settings.ERP_DATA_PATH)
+
+    totals = aggregate_sync_results(
+        [{'status': 'completed', 'sent': 0, 'skipped': 1, 'errors': 0}], fingerprint=fingerprint.as_dict(),
+    )
+
+    assert totals['deletion_blocked'] == 3
+    assert not ErpExportFingerprint.objects.exists()
+
+
+# ---------------------------------------------------------------------------
+# Stage timings and the sync_finished signal
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_run_reports_time_per_stage(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    timings = sync_products_task()['timings']
+
+    assert set(timings) == set(STAGES) | {'total'}
+    assert timings['http'] > 0
+    assert timings['throttle_sleep'] == timings['retry_sleep'] == 0
+    assert sum(timings[stage] for stage in STAGES) <= timings['total'] + 0.01
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_sync_finished_signal_carries_result(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+    received = []
+
+    def receiver(sender, scope, result, **kwargs):
+        received.append((sender, scope, result))
+
+    sync_finished.connect(receiver)
+    try:
+        result = sync_products_task()
+    finally:
+        sync_finished.disconnect(receiver)
+
+    assert received == [('integrator.sync_products', 'full', result)]
+
+
+@pytest.mark.django_db
+@responses_lib.activate
+def test_failing_signal_receiver_does_not_fail_the_run(erp_file, settings):
+    settings.ERP_DATA_PATH = erp_file(VALID_ERP_DATA)
+    responses_lib.add(responses_lib.POST, f'{BASE_URL}/products/', json={}, status=201)
+
+    def receiver(**kwargs):
+        raise RuntimeError('metrics backend down')
+
+    sync_finished.connect(receiver)
+    try:
+        result = sync_products_task()
+    finally:
+        sync_finished.disconnect(receiver)
+
+    assert result['sent'] == 2
+
+
+def test_shard_timings_are_summed_with_slowest_total(settings):
+    settings.SYNC_DELETE_MISSING = False
+    shard = {'status': 'completed', 'sent': 1, 'skipped': 0, 'errors': 0}
+    totals = aggregate_sync_results([
+        dict(shard, timings={'http': 1.0, 'db_write': 0.25, 'total': 2.0}),
+        dict(shard, timings={'http': 0.5, 'db_write': 0.25, 'total': 3.0}),
+    ])
+
+    assert totals['timings'] == {'http': 1.5, 'db_write': 0.5, 'total': 3.0}
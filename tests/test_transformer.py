@@ -1,13 +1,22 @@
+import io
 import json
 import tempfile
+from itertools import islice
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 
+import billiard
 import pytest
 
+from integrator.hashing import blake2b_hash, canonical_bytes, changed_fields, field_digests, get_hasher
+from integrator.timing import StageTimer
 from integrator.transformer import (
     compute_hash,
+    iter_erp_data,
+    iter_json_array,
     load_and_transform,
     load_erp_data,
+    transform_and_hash,
     transform_product,
 )
 
@@ -179,6 +188,48 @@ class TestLoadErpData:
         result = load_erp_data(path)
         assert result == []
 
+    def test_iter_erp_data_deduplicates_while_streaming(self):
+        data = [
+            {'id': 'SKU-001', 'title': 'First'},
+            {'id': 'SKU-002', 'title': 'Other'},
+            {'id': 'SKU-001', 'title': 'Second'},
+        ]
+        path = self._write_json(data)
+        assert [item['title'] for item in iter_erp_data(path)] == ['First', 'Other']
+
+
+# ---------------------------------------------------------------------------
+# iter_json_array – streaming reader
+# ---------------------------------------------------------------------------
+
+class TestIterJsonArray:
+    def test_yields_same_items_as_json_load(self):
+        data = [
+            {'id': 'SKU-001', 'title': 'Kávovar, "espresso" [x]', 'stocks': {'a': 1}},
+            {'id': 'SKU-002', 'title': 'B', 'attributes': None},
+        ]
+        text = json.dumps(data, indent=4, ensure_ascii=False)
+        # A tiny chunk size forces items to span many refills.
+        assert list(iter_json_array(io.StringIO(text), chunk_size=3)) == data
+
+    def test_scalars_split_across_chunks(self):
+        text = '[12345, 6.75e2, true, null, "abc"]'
+        assert list(iter_json_array(io.StringIO(text), chunk_size=2)) == [12345, 675.0, True, None, 'abc']
+
+    def test_empty_array(self):
+        assert list(iter_json_array(io.StringIO('  [ \n ]  '), chunk_size=1)) == []
+
+    def test_items_are_yielded_before_end_of_file(self):
+        reader = iter_json_array(io.StringIO('[{"id": "A"}, {"id": "B"'), chunk_size=4)
+        assert next(reader) == {'id': 'A'}
+        with pytest.raises(json.JSONDecodeError):
+            next(reader)
+
+    @pytest.mark.parametrize('text', ['{"id": "A"}', '[{"id": "A"} {"id": "B"}]', '[1, 2] 3', ''])
+    def test_malformed_input_raises(self, text):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO(text), chunk_size=4))
+
 
 # ---------------------------------------------------------------------------
 # load_and_transform – filters invalid products
@@ -205,7 +256,7 @@ class TestLoadAndTransform:
         json.dump(data, tmp)
         tmp.close()
 
-        result = load_and_transform(Path(tmp.name))
+        result = list(load_and_transform(Path(tmp.name)))
         assert len(result) == 1
         assert result[0]['sku'] == 'SKU-VALID'
 
@@ -217,9 +268,91 @@ class TestLoadAndTransform:
             {'id': 'SKU-DUP', 'title': 'Good', 'price_vat_excl': 100, 'stocks': {}, 'attributes': {}},
         ]
         path = self._write_json(data)
-        result = load_and_transform(path)
+        result = list(load_and_transform(path))
         assert result == []
 
+    def test_returns_lazy_iterator(self):
+        data = [{'id': 'SKU-001', 'title': 'A', 'price_vat_excl': 10, 'stocks': {}, 'attributes': {}}]
+        path = self._write_json(data)
+        result = load_and_transform(path)
+        assert iter(result) is result
+        assert next(result)['sku'] == 'SKU-001'
+
+
+# ---------------------------------------------------------------------------
+# transform_and_hash – optional process-pool stage
+# ---------------------------------------------------------------------------
+
+class TestTransformAndHash:
+    DATA = (
+        [{'id': f'SKU-{i:03d}', 'title': f'P{i}', 'price_vat_excl': i, 'stocks': {'a': i}, 'attributes': {}}
+         for i in range(40)]
+        + [{'id': 'SKU-005', 'title': 'Duplicate', 'price_vat_excl': 1, 'stocks': {}, 'attributes': {}}]
+        + [{'id': 'SKU-NULL', 'title': 'Null price', 'price_vat_excl': None, 'stocks': {}, 'attributes': {}}]
+    )
+
+    @pytest.fixture()
+    def path(self, tmp_path):
+        p = tmp_path / 'erp.json'
+        p.write_text(json.dumps(self.DATA), encoding='utf-8')
+        return p
+
+    def test_serial_matches_load_and_transform(self, path):
+        pairs = list(transform_and_hash(path))
+        products = list(load_and_transform(path))
+        assert [product for product, _ in pairs] == products
+        assert all(digest == compute_hash(product) for product, digest in pairs)
+
+    def test_parallel_preserves_order_and_first_occurrence(self, path):
+        serial = list(transform_and_hash(path))
+        parallel = list(transform_and_hash(path, workers=3, chunk_size=4))
+        assert parallel == serial
+        assert [p['title'] for p, _ in parallel if p['sku'] == 'SKU-005'] == ['P5']
+
+    def test_raw_filter_selects_products(self, path):
+        pairs = list(transform_and_hash(path, workers=2, chunk_size=4, raw_filter=lambda raw: raw['id'] < 'SKU-003'))
+        assert [p['sku'] for p, _ in pairs] == ['SKU-000', 'SKU-001', 'SKU-002']
+
+    def test_algorithm_selects_hasher(self, path):
+        pairs = list(transform_and_hash(path, workers=2, chunk_size=4, algorithm='blake2b'))
+        assert all(digest == blake2b_hash(product) for product, digest in pairs)
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_timer_receives_load_transform_and_hash_time(self, path, workers):
+        timer = MagicMock(spec=StageTimer)
+        pairs = list(transform_and_hash(path, workers=workers, chunk_size=4, timer=timer))
+        assert pairs == list(transform_and_hash(path))
+        assert {call.args[0] for call in timer.add.call_args_list} == {'load', 'transform', 'hash'}
+        assert all(call.args[1] >= 0 for call in timer.add.call_args_list)
+
+    def test_pool_starts_inside_daemonic_worker_process(self, path):
+        # Celery's prefork pool runs tasks in daemonic processes.
+        results = billiard.Queue()
+        worker = billiard.Process(target=_count_pairs_with_pool, args=(path, results), daemon=True)
+        worker.start()
+        worker.join(timeout=60)
+
+        assert results.get(timeout=1) == len(list(transform_and_hash(path)))
+
+    @pytest.mark.parametrize('consumed', [1, None])
+    def test_pool_is_closed_not_terminated(self, path, consumed):
+        # terminate() can hang joining a worker that did not exit on SIGTERM.
+        with patch('billiard.pool.Pool.terminate') as mock_terminate, \
+                patch('billiard.pool.Pool.join', autospec=True, side_effect=billiard.pool.Pool.join) as mock_join:
+            pairs = transform_and_hash(path, workers=2, chunk_size=4)
+            assert len(list(islice(pairs, consumed))) == (consumed or len(list(transform_and_hash(path))))
+            pairs.close()
+
+        mock_terminate.assert_not_called()
+        mock_join.assert_called_once()
+
+
+def _count_pairs_with_pool(path, results):
+    try:
+        results.put(len(list(transform_and_hash(path, workers=2, chunk_size=4))))
+    except Exception as exc:
+        results.put(repr(exc))
+
 
 # ---------------------------------------------------------------------------
 # compute_hash
@@ -235,11 +368,65 @@ class TestComputeHash:
         p2 = {'sku': 'SKU-001', 'title': 'A', 'price': 121.0, 'stock': 6, 'color': 'N/A'}
         assert compute_hash(p1) != compute_hash(p2)
 
-    def test_hash_is_64_chars(self):
+    def test_hash_is_32_bytes(self):
         product = {'sku': 'X', 'title': 'Y', 'price': 1.0, 'stock': 0, 'color': 'N/A'}
-        assert len(compute_hash(product)) == 64
+        assert len(compute_hash(product)) == 32
 
     def test_key_order_does_not_affect_hash(self):
         p1 = {'sku': 'SKU-001', 'title': 'A', 'price': 121.0, 'stock': 5, 'color': 'N/A'}
         p2 = {'color': 'N/A', 'stock': 5, 'price': 121.0, 'title': 'A', 'sku': 'SKU-001'}
         assert compute_hash(p1) == compute_hash(p2)
+
+
+# ---------------------------------------------------------------------------
+# blake2b_hash – canonical encoding
+# ---------------------------------------------------------------------------
+
+class TestBlake2bHash:
+    def test_hash_is_16_bytes(self):
+        product = {'sku': 'X', 'title': 'Y', 'price': 1.0, 'stock': 0, 'color': 'N/A'}
+        assert len(blake2b_hash(product)) == 16
+
+    def test_key_order_does_not_affect_hash(self):
+        p1 = {'sku': 'SKU-001', 'title': 'A', 'price': 121.0, 'stock': 5, 'color': 'N/A'}
+        p2 = {'color': 'N/A', 'stock': 5, 'price': 121.0, 'title': 'A', 'sku': 'SKU-001'}
+        assert blake2b_hash(p1) == blake2b_hash(p2)
+
+    def test_field_boundaries_are_unambiguous(self):
+        p1 = {'sku': 'AB', 'title': 'C', 'price': 1.0, 'stock': 0, 'color': 'N/A'}
+        p2 = {'sku': 'A', 'title': 'BC', 'price': 1.0, 'stock': 0, 'color': 'N/A'}
+        assert canonical_bytes(p1) != canonical_bytes(p2)
+
+    def test_integer_and_float_price_hash_equally(self):
+        p1 = {'sku': 'X', 'title': 'Y', 'price': 121, 'stock': 0, 'color': 'N/A'}
+        p2 = {'sku': 'X', 'title': 'Y', 'price': 121.0, 'stock': 0, 'color': 'N/A'}
+        assert blake2b_hash(p1) == blake2b_hash(p2)
+
+    def test_unknown_algorithm_raises(self):
+        with pytest.raises(ValueError, match='md5'):
+            get_hasher('md5')
+
+
+# ---------------------------------------------------------------------------
+# field_digests / changed_fields – field-level diff
+# ---------------------------------------------------------------------------
+
+class TestChangedFields:
+    PRODUCT = {'sku': 'SKU-001', 'title': 'A', 'price': 121.0, 'stock': 5, 'color': 'N/A'}
+
+    def test_detects_single_changed_field(self):
+        old = field_digests(self.PRODUCT)
+        new = field_digests(dict(self.PRODUCT, stock=6))
+        assert changed_fields(old, new) == ['stock']
+
+    def test_detects_multiple_changed_fields(self):
+        old = field_digests(self.PRODUCT)
+        new = field_digests(dict(self.PRODUCT, price=99.0, color='red'))
+        assert changed_fields(old, new) == ['price', 'color']
+
+    def test_missing_digests_mean_unknown(self):
+        assert changed_fields(b'', field_digests(self.PRODUCT)) is None
+
+    def test_identical_digests_mean_unknown(self):
+        digests = field_digests(self.PRODUCT)
+        assert changed_fields(digests, digests) is None